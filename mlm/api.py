@@ -13,22 +13,142 @@
 #    under the License.
 
 import datetime as dt
+import json
+import sys
 
-from mlm.app import app
+import six
+
+from mlm.app import events
 from mlm import config
 from mlm import consts
+from mlm import leaderboard
+from mlm import recurrence
+from mlm import schedule
 from mlm.db import api as dbapi
+from mlm.db import migrations
 
 
 class API(object):
 
+    _publisher = None
+    _db = None
+    _schedule = None
+    _meetings_version = None
+    _leaderboard = None
+    _leaderboard_version = None
+
     def __init__(self, config_file):
         self._config = config.Config(config_file)
-        self._db_api = dbapi.DBAPI(self._config)
 
-    def add_member(self, name):
+    @property
+    def _db_api(self):
+        # the database is opened only by commands which need it
+        if self._db is None:
+            self._db = dbapi.DBAPI(self._config)
+            self._check_schema()
+        return self._db
+
+    @_db_api.setter
+    def _db_api(self, value):
+        self._db = value
+
+    def _check_schema(self):
+        # stdout of commands can be data, e.g. exported members
+        version = self._db.get_schema_version()
+        if version < migrations.LATEST_VERSION:
+            sys.stderr.write("Warning: the database schema is outdated "
+                             "(version %s, the latest is %s), run 'mlm db "
+                             "upgrade'.\n" %
+                             (version, migrations.LATEST_VERSION))
+        elif version > migrations.LATEST_VERSION:
+            sys.stderr.write("Warning: the database schema (version %s) is "
+                             "newer than this version of MLM supports "
+                             "(%s).\n" %
+                             (version, migrations.LATEST_VERSION))
+
+    def upgrade_db(self, batch_size=1000, log=None):
+        """Migrate the database to the latest schema.
+
+        :returns: a list of applied migrations
+        """
+        if self._db is None:
+            # the schema is going to be upgraded, so do not warn about it
+            self._db = dbapi.DBAPI(self._config)
+        return self._db.upgrade(batch_size, log)
+
+    def read_only(self):
+        """Obtain API which opens the database read-only, for web workers."""
+        # the database is created by the read-write DBAPI
+        self._db_api
+        ro_api = API.__new__(API)
+        ro_api._config = self._config
+        ro_api._db_api = dbapi.DBAPI(self._config, read_only=True)
+        return ro_api
+
+    def session_scope(self, name=None):
+        """Use one DB session for all calls inside of the block."""
+        return self._db_api.session_scope(name)
+
+    def publish(self, event, **data):
+        """Notify other MLM processes about the change (best-effort)."""
+        if self._publisher is None:
+            self._publisher = events.Publisher(
+                self._config.app.events_socket)
+        self._publisher.publish(event, **data)
+
+    def add_member(self, name, contacts=None):
         """Add new member to team."""
-        self._db_api.add_member(name)
+        self._db_api.add_member(name, contacts)
+        self.publish("members_changed")
+
+    @staticmethod
+    def _parse_member(record):
+        """Obtain name and contacts of a member from an imported record."""
+        record = dict(record)
+        name = record.pop("name", None)
+        if not isinstance(name, six.string_types) or not name.strip():
+            raise ValueError("Name is missing.")
+        if len(name) > 250:
+            raise ValueError("Name is too long.")
+        # contacts are either a nested object or the rest of fields
+        contacts = record.pop("contacts", record)
+        if isinstance(contacts, six.string_types):
+            # CSV files keep the object as JSON
+            try:
+                contacts = json.loads(contacts)
+            except ValueError:
+                pass
+        if not isinstance(contacts, dict):
+            raise ValueError("Contacts should be an object.")
+        email = contacts.get("email")
+        if not isinstance(email, six.string_types) or "@" not in email:
+            raise ValueError("E-mail address is missing or wrong.")
+        return name.strip(), contacts
+
+    def import_members(self, records, batch_size=250):
+        """Add many members at once.
+
+        :param records: an iterable of (key, dict) pairs, where dict has
+            'name' and either 'contacts' object or contacts as other fields
+        :returns: a tuple of the number of added members and a list of
+            (key, reason) of rejected records
+        """
+        failed = []
+
+        def parse():
+            for key, record in records:
+                try:
+                    name, contacts = self._parse_member(record)
+                except ValueError as e:
+                    failed.append((key, str(e)))
+                    continue
+                yield key, name, contacts
+
+        inserted, conflicts = self._db_api.import_members(parse(),
+                                                          batch_size)
+        if inserted:
+            self.publish("members_changed")
+        return inserted, sorted(failed + conflicts, key=lambda f: f[0])
 
     def get_member(self, member_id):
         """Obtain member by ID."""
@@ -38,58 +158,129 @@ class API(object):
         """Obtain all members."""
         return self._db_api.get_members(only_active)
 
+    def get_members_version(self):
+        return self._db_api.get_members_version()
+
     def deactivate_member(self, member_id):
-        return self._db_api.deactivate_member(member_id)
+        member = self._db_api.deactivate_member(member_id)
+        self.publish("members_changed", id=member_id)
+        return member
 
-    def add_meeting(self, weekday, time):
-        date = consts.get_first_monday()
-        if weekday > 0:
-            date = date + dt.timedelta(days=weekday)
+    def add_meeting(self, weekday, time, freq="weekly", interval=1,
+                    start=None, until=None, setpos=None):
+        """Add meeting.
 
+        Plain weekly meetings are not bound to a date. Other meetings start
+        at the first occurrence on or after `start` (today by default).
+        """
         time = dt.datetime.strptime(time, "%H:%M")
-        date = date.replace(hour=time.hour, minute=time.minute)
+        if (freq, interval, start, until, setpos) == ("weekly", 1, None,
+                                                      None, None):
+            date = consts.get_first_monday() + dt.timedelta(days=weekday)
+            date = date.replace(hour=time.hour, minute=time.minute)
+            self._db_api.add_meeting(date)
+        else:
+            start = dt.datetime.combine(start or dt.datetime.utcnow().date(),
+                                        time.time())
+            date = start + dt.timedelta(days=(weekday - start.weekday()) % 7)
+            rule = recurrence.Recurrence(date, freq, interval, until, setpos)
+            # the rule may skip the first days, e.g. till 3rd Tuesday
+            date = next(rule.iter_after(start - dt.timedelta(seconds=1)),
+                        None)
+            if date is None:
+                raise ValueError("The meeting ends before it starts.")
+            rule.dtstart = date
+            self._db_api.add_meeting(date, rule.to_dict())
+        self.publish("meetings_changed")
 
-        self._db_api.add_meeting(date)
+    def skip_meeting(self, meeting_id, day):
+        """Cancel one occurrence of the meeting."""
+        meeting = self._db_api.get_meeting(meeting_id)
+        rule = recurrence.Recurrence.from_event(meeting)
+        if not rule.occurs_on(day):
+            raise ValueError("%s does not take place at %s." %
+                             (meeting, day.isoformat()))
+        if day in rule.exdates:
+            raise ValueError("%s is already skipped at %s." %
+                             (meeting, day.isoformat()))
+        rule.exdates |= {day}
+        extrafield = dict(meeting.extrafield or {},
+                          recurrence=rule.to_dict())
+        self._db_api.update_meeting(meeting_id, extrafield)
+        self.publish("meetings_changed")
 
     def get_meetings(self):
         return sorted(self._db_api.get_meetings(), key=lambda m: m.datetime)
 
-    def get_next_meeting(self):
-        now = dt.datetime.utcnow()
-        current_day = now.weekday()
-
-        meetings = self.get_meetings()
+    def get_meetings_version(self):
+        return self._db_api.get_meetings_version()
 
-        # if there is no meetings after current utcnow(), use first meeting of
-        # the week as a next one.
-        next_meeting = meetings[0]
+    def get_schedule(self):
+        """Obtain index of meetings, rebuild it only if meetings changed."""
+        version = self._db_api.get_meetings_version()
+        if self._schedule is None or version != self._meetings_version:
+            self._schedule = schedule.Schedule(
+                self._db_api.get_meetings())
+            self._meetings_version = version
+        return self._schedule
 
-        for meeting in meetings:
-            if meeting.datetime.weekday() == current_day:
-                if now.time() < meeting.datetime.time():
-                    next_meeting = meeting
-                    break
-            elif current_day < meeting.datetime.weekday():
-                next_meeting = meeting
-                break
+    def get_leaderboard(self):
+        """Obtain ranking of active members, rebuild it only if they changed.
 
-        # find the date of next meeting
-        date = now + dt.timedelta(
-                days=(7 - current_day + next_meeting.datetime.weekday()) % 7)
-        date = date.replace(hour=next_meeting.datetime.hour,
-                            minute=next_meeting.datetime.minute,
-                            second=0, microsecond=0)
+        Members are changed by other processes, e.g. elections are saved by
+        the tasks process, so the ranking is checked on every call.
+        """
+        version = self._db_api.get_leaderboard_version()
+        if self._leaderboard is None or version != self._leaderboard_version:
+            self._leaderboard = leaderboard.Leaderboard(
+                self._db_api.get_top_members())
+            self._leaderboard_version = version
+        return self._leaderboard
 
-        return next_meeting, date
+    def get_next_meeting(self):
+        return self.get_schedule().next_after(dt.datetime.utcnow())
 
     def get_all_elections(self):
         return self._db_api.get_elections()
 
-    def get_last_election(self):
-        return self._db_api.get_last_election()
+    def get_election(self, meeting, date, load=None):
+        return self._db_api.get_election(meeting.id, date, load)
+
+    def get_elections_page(self, limit, before=None, since=None):
+        return self._db_api.get_elections_page(limit, before, since)
+
+    def iter_elections(self, limit=None, before=None, since=None):
+        return self._db_api.iter_elections(limit, before, since)
+
+    def get_elections_after(self, election_id, limit):
+        return self._db_api.get_elections_after(election_id, limit)
+
+    def iter_all_elections(self):
+        return self._db_api.iter_all_elections()
+
+    def iter_members(self):
+        return self._db_api.iter_members()
+
+    def get_members_page(self, limit, after=None, only_active=False):
+        return self._db_api.get_members_page(limit, after, only_active)
+
+    def get_last_election_id(self):
+        return self._db_api.get_last_election_id()
+
+    def get_last_election(self, load=None):
+        return self._db_api.get_last_election(load)
+
+    def get_last_leader(self):
+        return self._db_api.get_last_leader()
 
     def save_election(self, meeting, date, member_id):
-        return self._db_api.save_election(meeting, date, member_id)
+        election = self._db_api.save_election(meeting, date, member_id)
+        self.publish("election_created", id=election.id,
+                     datetime=date.isoformat(), member_id=member_id)
+        return election
 
     def start_app(self):
+        # Flask and friends are not needed by other commands
+        from mlm.app import app
+
         app.start(self, self._config)
@@ -12,25 +12,49 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
 import multiprocessing
 import time
-import threading
 
+from mlm.app import events
 from mlm.app import rest
+from mlm.app import sse
 from mlm.app import tasks
+from mlm.app import wsgi
+from mlm import metrics
 
 
 def start(api, config):
-    should_stop = threading.Event()
+    if config.app.metrics_dir:
+        metrics.remove_snapshots(config.app.metrics_dir)
+    should_stop = multiprocessing.Event()
     tasks_p = multiprocessing.Process(
         name="tasks",
         target=tasks.Tasks(api, config, should_stop))
-    flask_p = multiprocessing.Process(
-        name="flask",
-        target=rest.WebServer(api, config))
+
+    # only the tasks process writes to the database
+    reader_api = api.read_only() if config.db.read_only_web else api
+    web_server = rest.WebServer(reader_api, config)
+    if config.app.workers > 0:
+        web_target = functools.partial(
+            wsgi.serve, web_server.make_app(), "0.0.0.0", config.app.port,
+            workers=config.app.workers,
+            backlog=config.app.backlog,
+            keepalive=config.app.keepalive,
+            max_requests=config.app.max_requests)
+    else:
+        web_target = web_server
+    flask_p = multiprocessing.Process(name="flask", target=web_target)
 
     tasks_p.start()
     flask_p.start()
+    if config.app.sse_port:
+        sse_p = multiprocessing.Process(
+            name="sse",
+            target=sse.EventStream(reader_api, config, should_stop))
+        sse_p.start()
+    # relays notifications about new elections from tasks to webserver
+    events.Broker(config.app.events_socket).start()
     while True:
         try:
             time.sleep(0.5)
@@ -0,0 +1,123 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import hashlib
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+IDENTITY = "identity"
+
+
+def _gzip(data):
+    # 16 + MAX_WBITS produces gzip header and trailer
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+# supported content encodings in order of preference
+COMPRESSORS = collections.OrderedDict()
+if brotli is not None:
+    COMPRESSORS["br"] = brotli.compress
+COMPRESSORS["gzip"] = _gzip
+
+
+class LRUCache(object):
+    """Thread-safe dict-like cache which evicts least recently used items."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            # move the item to the end, so it is evicted the last
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CachedResponse(object):
+    """Rendered response body with its compressed variants.
+
+    Variants are compressed on the first request which accepts them and are
+    served from memory afterwards. ETag of the response is derived from the
+    state which the body was rendered for, so it can be checked without
+    looking at the body.
+    """
+
+    def __init__(self, body, state, mimetype="text/html"):
+        if not isinstance(body, bytes):
+            body = body.encode("utf-8")
+        self.mimetype = mimetype
+        self._etag = hashlib.sha1(repr(state).encode("utf-8")).hexdigest()
+        self._variants = {IDENTITY: body}
+        self._lock = threading.Lock()
+
+    def get_etag(self, encoding=IDENTITY):
+        if encoding == IDENTITY:
+            return self._etag
+        return "%s-%s" % (self._etag, encoding)
+
+    def get_variant(self, accepted):
+        """Pick the smallest variant for accepted content encodings.
+
+        :param accepted: a function which returns True if the encoding is
+            accepted by a client
+        :returns: a tuple of encoding and the body
+        """
+        encoding = IDENTITY
+        for name in COMPRESSORS:
+            if accepted(name):
+                encoding = name
+                break
+        if encoding not in self._variants:
+            with self._lock:
+                if encoding not in self._variants:
+                    compressed = COMPRESSORS[encoding](
+                        self._variants[IDENTITY])
+                    if len(compressed) >= len(self._variants[IDENTITY]):
+                        # there is no sense to compress tiny bodies
+                        compressed = None
+                    self._variants[encoding] = compressed
+        if self._variants[encoding] is None:
+            encoding = IDENTITY
+        return encoding, self._variants[encoding]
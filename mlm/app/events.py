@@ -0,0 +1,268 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Local pub/sub channel between MLM processes.
+
+The broker listens on a Unix socket and relays every newline-delimited JSON
+message which it receives from clients to subscribers, i.e. clients which
+have sent the SUBSCRIBE line after connecting. Publishing is best-effort:
+if there is no broker, events are silently dropped and subscribers should
+fall back to polling the database.
+"""
+
+import json
+import os
+import socket
+import threading
+
+try:
+    import selectors
+except ImportError:
+    # Python 2
+    import selectors2 as selectors
+
+
+SUBSCRIBE = b"SUBSCRIBE"
+
+
+class Broker(object):
+    # drop subscribers which cannot receive an event within this timeout
+    SEND_TIMEOUT = 1
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self._listener = None
+        self._selector = selectors.DefaultSelector()
+        self._buffers = {}
+        self._subscribers = set()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def _bind(self):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except socket.error:
+            # nobody listens on it, so it is a leftover of a dead broker
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        else:
+            raise RuntimeError("Another broker is already listening on %s" %
+                               self.path)
+        finally:
+            probe.close()
+
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        self._listener.listen(64)
+        self._listener.setblocking(False)
+        self._selector.register(self._listener, selectors.EVENT_READ)
+
+    def _drop(self, client):
+        self._selector.unregister(client)
+        self._buffers.pop(client, None)
+        self._subscribers.discard(client)
+        client.close()
+
+    def _relay(self, message, clients=None):
+        for client in list(self._subscribers if clients is None
+                           else clients):
+            try:
+                client.settimeout(self.SEND_TIMEOUT)
+                client.sendall(message)
+            except socket.error:
+                self._drop(client)
+            else:
+                client.setblocking(False)
+
+    def _read(self, client):
+        try:
+            data = client.recv(65536)
+        except socket.error:
+            data = b""
+        if not data:
+            self._drop(client)
+            return
+        buf = self._buffers[client] + data
+        messages, _, self._buffers[client] = buf.rpartition(b"\n")
+        for message in messages.split(b"\n") if messages else []:
+            if message == SUBSCRIBE:
+                self._subscribers.add(client)
+                self._relay(_encode("connected", {}), [client])
+            else:
+                self._relay(message + b"\n")
+
+    def serve(self):
+        while not self._stopped.is_set():
+            for key, _ in self._selector.select(timeout=None):
+                if key.fileobj is self._listener:
+                    try:
+                        client, _ = self._listener.accept()
+                    except socket.error:
+                        continue
+                    client.setblocking(False)
+                    self._buffers[client] = b""
+                    self._selector.register(client, selectors.EVENT_READ)
+                elif key.fileobj in self._buffers:
+                    self._read(key.fileobj)
+
+    def start(self):
+        self._bind()
+        self._thread = threading.Thread(target=self.serve, name="events")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        # wake up the selector
+        publish(self.path, "broker_stopped")
+        self._thread.join()
+        for client in list(self._buffers):
+            self._drop(client)
+        self._selector.close()
+        self._listener.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def _connect(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(os.path.expanduser(path))
+    except socket.error:
+        sock.close()
+        raise
+    return sock
+
+
+def _encode(event, data):
+    data = dict(data, event=event)
+    return (json.dumps(data) + "\n").encode("utf-8")
+
+
+def publish(path, event, **data):
+    """Send one event through a short-lived connection."""
+    try:
+        sock = _connect(path)
+    except socket.error:
+        return False
+    try:
+        sock.sendall(_encode(event, data))
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+class Publisher(object):
+    """Keeps a connection to the broker to publish events.
+
+    The connection belongs to the process which opened it, forked processes
+    open their own ones.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._sock = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def publish(self, event, **data):
+        message = _encode(event, data)
+        with self._lock:
+            for _ in range(2):
+                try:
+                    if self._sock is None or self._pid != os.getpid():
+                        self._sock = _connect(self.path)
+                        self._pid = os.getpid()
+                    self._sock.sendall(message)
+                    return True
+                except socket.error:
+                    # the broker could be restarted, so try to reconnect
+                    self.close()
+            return False
+
+    def close(self):
+        if self._sock is not None and self._pid == os.getpid():
+            self._sock.close()
+        self._sock = None
+
+
+class Subscriber(object):
+    """Receives events in a background thread.
+
+    The callback is called with a dict of each event. When the subscription
+    is (re)established, the callback receives a 'connected' event, since
+    anything could happen while the subscriber was offline.
+    """
+
+    def __init__(self, path, callback, retry_interval=1):
+        self.path = path
+        self.callback = callback
+        self.retry_interval = retry_interval
+        self.pid = os.getpid()
+        self.connected = False
+        self._sock = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _listen(self):
+        self._sock.sendall(SUBSCRIBE + b"\n")
+        buf = b""
+        for data in iter(lambda: self._sock.recv(65536), b""):
+            buf += data
+            messages, _, buf = buf.rpartition(b"\n")
+            for message in messages.split(b"\n") if messages else []:
+                try:
+                    event = json.loads(message.decode("utf-8"))
+                except ValueError:
+                    continue
+                self.callback(event)
+                if event.get("event") == "connected":
+                    # the broker has acknowledged the subscription, so
+                    # nothing is missed anymore
+                    self.connected = True
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self._sock = _connect(self.path)
+                self._listen()
+            except socket.error:
+                pass
+            finally:
+                self.connected = False
+                if self._sock is not None:
+                    self._sock.close()
+                    self._sock = None
+            self._stopped.wait(self.retry_interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="subscriber")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        self._thread.join()
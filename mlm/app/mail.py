@@ -0,0 +1,146 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import smtplib
+import socket
+import time
+import timeit
+
+from mlm import metrics
+
+
+_SEND_SECONDS = metrics.histogram(
+    "mlm_smtp_send_seconds", "Latency of sending one e-mail.")
+_SEND_ERRORS = metrics.counter(
+    "mlm_smtp_errors_total", "Number of failed attempts to send e-mail.",
+    ["kind"])
+
+
+class Mailer(object):
+    """Delivers e-mails through a persistent SMTP connection.
+
+    The connection is opened lazily on the first send and is reused by next
+    ones. A connection which was idle for a while is checked with NOOP
+    before the usage and reopened if server has dropped it. Transient
+    failures are retried with exponential backoff.
+    """
+
+    # seconds of inactivity after which the connection should be checked
+    HEALTH_CHECK_INTERVAL = 30
+
+    def __init__(self, smtp_url, login=None, password=None, use_tls=True,
+                 max_retries=3, retry_interval=1, sleep=time.sleep):
+        self.smtp_url = smtp_url
+        self.login = login
+        self.password = password
+        self.use_tls = use_tls
+        self.max_retries = max_retries
+        self.retry_interval = retry_interval
+        self._sleep = sleep
+        self._server = None
+        self._last_used = None
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """Create mailer from `mail_notification` config section."""
+        return cls(config.smtp_url,
+                   login=config.login,
+                   password=config.password,
+                   use_tls=config.use_tls,
+                   max_retries=config.max_retries,
+                   retry_interval=config.retry_interval,
+                   **kwargs)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.smtp_url)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.login:
+                server.login(self.login, self.password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _is_alive(self):
+        try:
+            return self._server.noop()[0] == 250
+        except (smtplib.SMTPException, socket.error):
+            return False
+
+    def _get_server(self):
+        if (self._server is not None and
+                timeit.default_timer() - self._last_used >
+                self.HEALTH_CHECK_INTERVAL and not self._is_alive()):
+            self.close()
+        if self._server is None:
+            self._server = self._connect()
+            self._last_used = timeit.default_timer()
+        return self._server
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, socket.error):
+                self._server.close()
+            self._server = None
+
+    @staticmethod
+    def _is_permanent(error):
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return True
+        return (isinstance(error, smtplib.SMTPResponseException) and
+                error.smtp_code >= 500)
+
+    def send(self, email_from, email_to, message):
+        """Send one e-mail. Returns True on success."""
+        return not self.send_many([(email_from, email_to, message)])
+
+    def send_many(self, messages):
+        """Send e-mails through one SMTP session.
+
+        :param messages: an iterable of (email_from, email_to, message)
+        :returns: a list of messages which were not delivered
+        """
+        pending = collections.deque(messages)
+        failed = []
+        attempt = 0
+        while pending:
+            try:
+                server = self._get_server()
+                while pending:
+                    started_at = timeit.default_timer()
+                    server.sendmail(*pending[0])
+                    pending.popleft()
+                    self._last_used = timeit.default_timer()
+                    _SEND_SECONDS.observe(self._last_used - started_at)
+            except (smtplib.SMTPException, socket.error) as e:
+                if self._is_permanent(e):
+                    _SEND_ERRORS.labels("permanent").inc()
+                    print("Error: unable to send email to %s: %s" %
+                          (pending[0][1], e))
+                    failed.append(pending.popleft())
+                    continue
+                _SEND_ERRORS.labels("transient").inc()
+                print("Error: unable to send email: %s" % e)
+                self.close()
+                if attempt >= self.max_retries:
+                    failed.extend(pending)
+                    break
+                self._sleep(self.retry_interval * 2 ** attempt)
+                attempt += 1
+        return failed
@@ -0,0 +1,69 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import threading
+
+import jinja2
+
+from mlm import metrics
+
+
+# number of compiled templates to keep in LRU cache of each environment
+TEMPLATE_CACHE_SIZE = 50
+
+_RENDER_SECONDS = metrics.histogram(
+    "mlm_render_seconds", "Time to render a template.", ["template"])
+
+_environments = {}
+_lock = threading.Lock()
+
+
+def get_environment(template_dir, bytecode_cache_dir=None):
+    """Obtain jinja2 environment which is shared within the process.
+
+    Compiled templates are kept in LRU cache and are reloaded only when
+    mtime of the template file is changed. If bytecode_cache_dir is set,
+    compiled templates are stored there as well, so new processes do not
+    need to compile them again.
+    """
+    key = (template_dir, bytecode_cache_dir)
+    with _lock:
+        if key not in _environments:
+            bytecode_cache = None
+            if bytecode_cache_dir:
+                bytecode_cache_dir = os.path.expanduser(bytecode_cache_dir)
+                if not os.path.isdir(bytecode_cache_dir):
+                    os.makedirs(bytecode_cache_dir)
+                bytecode_cache = jinja2.FileSystemBytecodeCache(
+                    bytecode_cache_dir)
+            _environments[key] = jinja2.Environment(
+                loader=jinja2.FileSystemLoader(template_dir),
+                trim_blocks=True,
+                cache_size=TEMPLATE_CACHE_SIZE,
+                auto_reload=True,
+                bytecode_cache=bytecode_cache)
+        return _environments[key]
+
+
+def reset():
+    """Forget all environments with their caches."""
+    with _lock:
+        _environments.clear()
+
+
+def render(template_dir, file_name, bytecode_cache_dir=None, **kwargs):
+    with _RENDER_SECONDS.labels(file_name).time():
+        env = get_environment(template_dir, bytecode_cache_dir)
+        return env.get_template(file_name).render(**kwargs)
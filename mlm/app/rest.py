@@ -12,15 +12,110 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
+import datetime as dt
+import functools
+import json
+import os
+import threading
+import timeit
+
 import flask
 from flask import render_template
+from werkzeug import exceptions
+
+from mlm.app import cache
+from mlm.app import events
+from mlm import consts
+from mlm import metrics
+
+
+MAX_PAGE_SIZE = 500
+
+_REQUEST_SECONDS = metrics.histogram(
+    "mlm_http_request_seconds", "Latency of webserver handlers.",
+    ["handler", "code"])
+_PAGE_RENDER_SECONDS = metrics.histogram(
+    "mlm_page_render_seconds",
+    "Time to render a page which is not found in the cache.", ["page"])
+# pages show the last leader, but not the meeting
+_LEADER_ONLY = {"lucky_man": "joined", "meeting": "raise"}
+
+_DATETIME_FORMATS = ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S",
+                     "%Y-%m-%dT%H:%M", "%Y-%m-%d")
+
+
+def _parse_datetime(value):
+    for datetime_format in _DATETIME_FORMATS:
+        try:
+            return dt.datetime.strptime(value, datetime_format)
+        except ValueError:
+            pass
+    flask.abort(400, "Wrong format of datetime: '%s'." % value)
+
+
+def _encode_cursor(*values):
+    return base64.urlsafe_b64encode(
+        json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(
+            cursor.encode("ascii")).decode("utf-8"))
+    except (TypeError, ValueError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        flask.abort(400, "Wrong cursor.")
+    return values
+
+
+def _stream_template(template_name, **context):
+    app = flask.current_app
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    # do not send each tiny piece of html as a separate chunk
+    stream.enable_buffering(20)
+    return stream
+
+
+class _HistoryPage(object):
+    """Page of elections history which is fetched while it is rendered."""
+
+    def __init__(self, api, page_size, before=None):
+        self.api = api
+        self.page_size = page_size
+        self.before = before
+        self.next_cursor = None
+
+    def __iter__(self):
+        last = None
+        with self.api.session_scope():
+            # one extra row tells whether there is the next page
+            rows = self.api.iter_elections(self.page_size + 1, self.before)
+            for i, row in enumerate(rows):
+                if i == self.page_size:
+                    self.next_cursor = _encode_cursor(
+                        last.datetime.isoformat(), last.id)
+                    break
+                last = row
+                yield {"date": row.datetime.strftime("%d.%m.%y"),
+                       "time": row.datetime.strftime("%H:%M UTC"),
+                       "weekday": consts.WEEKDAYS[row.datetime.weekday()],
+                       "leader": row.lucky_man_name}
 
 
 class WebServer(object):
     def __init__(self, api, config):
         self.api = api
         self.config = config
-        self._cache = {}
+        self._cache = cache.LRUCache(config.app.cache_size)
+        self._subscriber = None
+        # incremented by each event which can change rendered pages
+        self._generation = 0
+        self._state = None
+        self._exporter = None
+        self._exporter_lock = threading.Lock()
 
     def _make_table(self, data, headers, formaters=None):
         table = ["<div class='table'>"]
@@ -52,50 +147,237 @@ class WebServer(object):
 
         return "\n".join(table)
 
+    def _respond(self, name, render, mimetype="text/html"):
+        """Serve cached response, supporting conditional GET."""
+        state = (name, self._get_state_version())
+        response = self._cache.get(state)
+        if response is None:
+            with _PAGE_RENDER_SECONDS.labels(name).time():
+                body = render()
+            response = cache.CachedResponse(body, state, mimetype)
+            self._cache.set(state, response)
+
+        request = flask.request
+        encoding, body = response.get_variant(
+            lambda e: request.accept_encodings[e] > 0)
+        etag = response.get_etag(encoding)
+
+        if request.if_none_match.contains_weak(etag):
+            result = flask.Response(status=304)
+        else:
+            result = flask.Response(body, mimetype=response.mimetype)
+            if encoding != cache.IDENTITY:
+                result.headers["Content-Encoding"] = encoding
+        result.set_etag(etag)
+        result.vary.add("Accept-Encoding")
+        return result
+
+    def _on_event(self, event):
+        self._generation += 1
+
+    def _subscribe(self):
+        # threads do not survive fork, so each worker has own subscriber
+        if self._subscriber is None or self._subscriber.pid != os.getpid():
+            self._subscriber = events.Subscriber(
+                self.config.app.events_socket, self._on_event).start()
+        return self._subscriber
+
+    def _get_state_version(self):
+        """Obtain a key which is changed with each new election or member.
+
+        While the process is subscribed to events, the key is queried only
+        once after each event. Otherwise it is queried on each request.
+        """
+        subscriber = self._subscribe()
+        generation = self._generation
+        if (subscriber.connected and self._state is not None and
+                self._state[0] == generation):
+            return self._state[1]
+        version = (self.api.get_last_election_id(),
+                   self.api.get_members_version())
+        self._state = (generation, version)
+        return version
+
     def last_election(self):
-        return "%s" % str(self.api.get_last_election())[1:-1]
+        return self._respond("last_election", self._render_last_election)
+
+    def _render_last_election(self):
+        return "%s" % str(self.api.get_last_election(_LEADER_ONLY))[1:-1]
 
     def index(self):
-        election = self.api.get_last_election()
-        if election:
-            if election in self._cache:
-                return self._cache[election]
-            else:
-                scores = self._make_table(
-                    sorted(self.api.get_members(only_active=True),
-                           key=lambda o: o.leader_score,
-                           reverse=True),
-                    headers=["Name", "Score"],
-                    formaters={"score": lambda o: o.leader_score})
-
-                elections = self.api.get_all_elections()
-                elections.reverse()
-                history = self._make_table(
-                    elections,
-                    headers=["Date", "Time", "Weekday", "Leader"],
-                    formaters={"leader": lambda o: o.lucky_man.name,
-                               "date": lambda o: o.datetime.strftime(
-                                   "%d.%m.%y"),
-                               "time":
-                                   lambda o: "%s UTC" %
-                                             o.datetime.strftime("%H:%M")})
-
-                return render_template("index.html",
-                                       title=self.config.app.name,
-                                       date=election.date,
-                                       name=election.lucky_man.name,
-                                       scores=scores,
-                                       history=history)
-        else:
+        return self._respond("index", self._render_index)
+
+    def _render_index(self):
+        election = self.api.get_last_election(_LEADER_ONLY)
+        if not election:
             return render_template("default.html")
 
-    def __call__(self):
-        """process worker"""
+        scores = self._make_table(
+            self.api.get_leaderboard().top(),
+            headers=["Name", "Score"],
+            formaters={"score": lambda o: o.leader_score})
+
+        return render_template("index.html",
+                               title=self.config.app.name,
+                               date=election.date,
+                               name=election.lucky_man.name,
+                               scores=scores,
+                               history=_HistoryPage(self.api,
+                                                    self.config.app.page_size))
+
+    def history(self):
+        page = _HistoryPage(self.api, self._get_page_size(),
+                            self._get_elections_cursor())
+        return flask.Response(flask.stream_with_context(
+            _stream_template("history.html",
+                             title=self.config.app.name,
+                             page=page)))
+
+    @staticmethod
+    def _json(data):
+        return flask.Response(json.dumps(data), mimetype="application/json")
+
+    def _get_page_size(self):
+        try:
+            limit = int(flask.request.args.get("limit",
+                                               self.config.app.page_size))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            flask.abort(400, "limit should be in range [1, %s]." %
+                        MAX_PAGE_SIZE)
+        return limit
+
+    @staticmethod
+    def _get_elections_cursor():
+        cursor = flask.request.args.get("cursor")
+        if cursor is None:
+            return None
+        date, election_id = _decode_cursor(cursor, 2)
+        return _parse_datetime(date), election_id
+
+    def api_elections(self):
+        """Elections from the newest to the oldest one."""
+        args = flask.request.args
+        limit = self._get_page_size()
+        before = self._get_elections_cursor()
+        since = _parse_datetime(args["since"]) if "since" in args else None
+
+        # one extra row tells whether there is the next page
+        rows = self.api.get_elections_page(limit + 1, before, since)
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = _encode_cursor(page[-1].datetime.isoformat(),
+                                         page[-1].id)
+        return self._json({
+            "elections": [{"id": row.id,
+                           "datetime": row.datetime.isoformat(),
+                           "leader": row.lucky_man_name,
+                           "meeting_id": row.meeting_id} for row in page],
+            "next_cursor": next_cursor})
+
+    def api_members(self):
+        """Members ordered by id."""
+        args = flask.request.args
+        limit = self._get_page_size()
+        after = None
+        if "cursor" in args:
+            after, = _decode_cursor(args["cursor"], 1)
+        only_active = args.get("active", "").lower() in ("1", "true", "yes")
+
+        rows = self.api.get_members_page(limit + 1, after, only_active)
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = _encode_cursor(page[-1].id)
+        return self._json({
+            "members": [{"id": row.id,
+                         "name": row.name,
+                         "active": row.active,
+                         "leader_score": row.leader_score} for row in page],
+            "next_cursor": next_cursor})
+
+    @staticmethod
+    def _format_entry(entry):
+        return {"rank": entry.rank, "id": entry.id, "name": entry.name,
+                "leader_score": entry.leader_score}
+
+    def api_leaderboard(self):
+        """Active members with the highest scores."""
+        board = self.api.get_leaderboard()
+        entries = board.top(self._get_page_size())
+        return self._json({
+            "members": [self._format_entry(e) for e in entries],
+            "max_score": board.get_max_score(),
+            "total": len(board)})
+
+    def api_member_rank(self, member_id):
+        entry = self.api.get_leaderboard().get_rank(member_id)
+        if entry is None:
+            flask.abort(404, "There is no active member with id '%s'." %
+                        member_id)
+        return self._json(self._format_entry(entry))
+
+    def _get_exporter(self):
+        """Save metrics of every webserver process, including forked ones."""
+        if self._exporter is None or self._exporter.pid != os.getpid():
+            with self._exporter_lock:
+                if (self._exporter is None or
+                        self._exporter.pid != os.getpid()):
+                    exporter = metrics.Exporter(
+                        self.config.app.metrics_dir, "web",
+                        self.config.app.metrics_interval)
+                    if self.config.app.metrics_dir:
+                        exporter.start()
+                    else:
+                        exporter.pid = os.getpid()
+                    self._exporter = exporter
+        return self._exporter
+
+    def metrics(self):
+        snapshot = self._get_exporter().collect()
+        return flask.Response(metrics.format_text(snapshot),
+                              mimetype="text/plain; version=0.0.4")
+
+    def _add_route(self, app, rule, handler):
+        @functools.wraps(handler)
+        def scoped_handler(*args, **kwargs):
+            self._get_exporter()
+            started_at = timeit.default_timer()
+            code = "500"
+            try:
+                # one DB session per request
+                with self.api.session_scope(handler.__name__):
+                    response = handler(*args, **kwargs)
+                code = str(getattr(response, "status_code", 200))
+                return response
+            except exceptions.HTTPException as e:
+                code = str(e.code)
+                raise
+            finally:
+                _REQUEST_SECONDS.labels(handler.__name__, code).observe(
+                    timeit.default_timer() - started_at)
+
+        app.add_url_rule(rule, None, scoped_handler)
+
+    def make_app(self):
         f = flask.Flask(__name__,
                         template_folder='templates',
                         static_folder='static')
 
-        f.add_url_rule("/last_election", None, self.last_election)
-        f.add_url_rule("/", None,  self.index)
+        self._add_route(f, "/last_election", self.last_election)
+        self._add_route(f, "/", self.index)
+        self._add_route(f, "/history", self.history)
+        self._add_route(f, "/api/v1/elections", self.api_elections)
+        self._add_route(f, "/api/v1/members", self.api_members)
+        self._add_route(f, "/api/v1/leaderboard", self.api_leaderboard)
+        self._add_route(f, "/api/v1/members/<int:member_id>/rank",
+                        self.api_member_rank)
+        f.add_url_rule("/metrics", None, self.metrics)
+        return f
 
+    def __call__(self):
+        """process worker"""
+        f = self.make_app()
         f.run(host='0.0.0.0', port=self.config.app.port, threaded=True)
@@ -0,0 +1,105 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import heapq
+import itertools
+import threading
+import traceback
+
+
+class Job(object):
+    def __init__(self, deadline, func, args, kwargs):
+        self.deadline = deadline
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+
+    def __call__(self):
+        return self.func(*self.args, **self.kwargs)
+
+    def __repr__(self):
+        return "<Job %s at %s>" % (getattr(self.func, "__name__", self.func),
+                                   self.deadline)
+
+
+class Scheduler(object):
+    """Heap-based timer scheduler.
+
+    Jobs are kept in a heap ordered by their deadlines (naive UTC datetimes)
+    and the worker thread sleeps on a condition variable until the nearest
+    deadline, a new job which should be executed earlier or the stop call.
+    """
+
+    def __init__(self, clock=datetime.datetime.utcnow):
+        self._clock = clock
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, deadline, func, *args, **kwargs):
+        """Execute func at the deadline."""
+        job = Job(deadline, func, args, kwargs)
+        with self._cond:
+            heapq.heappush(self._heap, (deadline, next(self._counter), job))
+            if self._heap[0][2] is job:
+                # the new job is the nearest one, so the sleeping worker
+                # should recalculate its timeout
+                self._cond.notify()
+        return job
+
+    def cancel(self, job):
+        """Cancel the job. It is removed from the heap once it pops up."""
+        job.cancelled = True
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _pop_ready_job(self):
+        """Wait for the nearest job. Returns None if scheduler is stopped."""
+        with self._cond:
+            while not self._stopped:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                deadline, _, job = self._heap[0]
+                if job.cancelled:
+                    heapq.heappop(self._heap)
+                    continue
+                timeout = (deadline - self._clock()).total_seconds()
+                if timeout > 0:
+                    self._cond.wait(timeout)
+                    continue
+                heapq.heappop(self._heap)
+                return job
+
+    def run(self):
+        """Execute jobs until the scheduler is stopped."""
+        while True:
+            job = self._pop_ready_job()
+            if job is None:
+                return
+            try:
+                job()
+            except Exception:
+                # a failed job should not stop the other ones
+                print("Error: %r failed" % job)
+                traceback.print_exc()
@@ -0,0 +1,325 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Server-Sent Events stream of new elections.
+
+All connections are served by one thread with a selector, so thousands of
+idle clients cost only their sockets. New elections are discovered through
+the events broker (see mlm.app.events) or, while it is unavailable, by
+polling the database. Each event has id of the election, so reconnecting
+clients receive elections which they have missed via Last-Event-ID header.
+"""
+
+import collections
+import errno
+import json
+import socket
+import time
+
+try:
+    import selectors
+except ImportError:
+    # Python 2
+    import selectors2 as selectors
+
+from mlm.app import events
+from mlm import metrics
+
+
+def format_event(row):
+    """Serialize a (id, datetime, lucky_man_name, meeting_id) row."""
+    data = json.dumps({"id": row.id,
+                       "datetime": row.datetime.isoformat(),
+                       "leader": row.lucky_man_name,
+                       "meeting_id": row.meeting_id})
+    return ("id: %s\nevent: election\ndata: %s\n\n" %
+            (row.id, data)).encode("utf-8")
+
+
+def _response(status, headers=()):
+    lines = ["HTTP/1.1 %s" % status] + ["%s: %s" % h for h in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+_STREAM_HEADERS = _response("200 OK", [
+    ("Content-Type", "text/event-stream"),
+    ("Cache-Control", "no-cache"),
+    ("Connection", "keep-alive"),
+    ("Access-Control-Allow-Origin", "*")])
+
+
+class _Client(object):
+    def __init__(self, sock):
+        self.sock = sock
+        self.request = b""
+        self.output = b""
+        self.streaming = False
+        self.closing = False
+        self.dropped = False
+
+
+class EventStream(object):
+    # comment lines keep proxies from dropping idle connections and let
+    # the server notice dead clients
+    HEARTBEAT_INTERVAL = 15
+    # how often to check the database while the broker is unavailable
+    POLL_INTERVAL = 5
+    # number of recent events which are replayed without the database
+    HISTORY_SIZE = 100
+    # number of events which are loaded from the database at once
+    REPLAY_LIMIT = 500
+    # the stream is closed once replayed events reach this size, so the
+    # client reconnects with the last of them and receives the rest
+    MAX_REPLAY_SIZE = 128 * 1024
+    MAX_REQUEST_SIZE = 8192
+    # clients which do not read events are disconnected
+    MAX_OUTPUT_SIZE = 256 * 1024
+
+    def __init__(self, api, config, should_stop=None, host="0.0.0.0",
+                 port=None):
+        self.api = api
+        self.config = config
+        self.should_stop = should_stop
+        self.host = host
+        self.port = config.app.sse_port if port is None else port
+        self._selector = None
+        self._listener = None
+        self._clients = set()
+        self._history = collections.deque()
+        # history contains all elections with greater ids
+        self._history_start = None
+        self._last_id = None
+        self._pending = collections.deque()
+        self._wakeup = None
+        self._subscriber = None
+        self._next_poll = 0
+
+    def _on_event(self, event):
+        # called from the thread of subscriber
+        self._pending.append(event)
+        try:
+            self._wakeup[1].send(b"\0")
+        except socket.error:
+            pass
+
+    def listen(self):
+        self._selector = selectors.DefaultSelector()
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((self.host, self.port))
+        self._listener.listen(self.config.app.backlog)
+        self._listener.setblocking(False)
+        self.port = self._listener.getsockname()[1]
+        self._selector.register(self._listener, selectors.EVENT_READ)
+
+        self._wakeup = socket.socketpair()
+        for sock in self._wakeup:
+            sock.setblocking(False)
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ)
+
+        with self.api.session_scope():
+            self._last_id = self.api.get_last_election_id()
+        self._history_start = self._last_id
+        self._subscriber = events.Subscriber(
+            self.config.app.events_socket, self._on_event).start()
+
+    def close(self):
+        if self._subscriber is not None:
+            self._subscriber.stop()
+        for client in list(self._clients):
+            self._drop(client)
+        for sock in self._wakeup:
+            sock.close()
+        self._selector.close()
+        self._listener.close()
+
+    def _drop(self, client):
+        client.dropped = True
+        self._clients.discard(client)
+        self._selector.unregister(client.sock)
+        client.sock.close()
+
+    def _send(self, client, data):
+        if client.dropped:
+            return
+        if not client.output:
+            self._selector.modify(client.sock, selectors.EVENT_READ |
+                                  selectors.EVENT_WRITE, client)
+        client.output += data
+        if len(client.output) > self.MAX_OUTPUT_SIZE:
+            self._drop(client)
+
+    def _flush(self, client):
+        try:
+            sent = client.sock.send(client.output)
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            self._drop(client)
+            return
+        client.output = client.output[sent:]
+        if not client.output:
+            if client.closing:
+                self._drop(client)
+            else:
+                self._selector.modify(client.sock, selectors.EVENT_READ,
+                                      client)
+
+    def _accept(self):
+        try:
+            sock, _ = self._listener.accept()
+        except socket.error:
+            return
+        sock.setblocking(False)
+        client = _Client(sock)
+        self._clients.add(client)
+        self._selector.register(sock, selectors.EVENT_READ, client)
+
+    def _read(self, client):
+        try:
+            data = client.sock.recv(4096)
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            data = b""
+        if not data:
+            self._drop(client)
+        elif not client.streaming and not client.closing:
+            # anything which is sent after the request is ignored
+            client.request += data
+            if b"\r\n\r\n" in client.request:
+                self._handle_request(client)
+            elif len(client.request) > self.MAX_REQUEST_SIZE:
+                self._reject(client, "431 Request Header Fields Too Large")
+
+    def _reject(self, client, status):
+        client.closing = True
+        self._send(client, _response(status, [("Content-Length", "0"),
+                                              ("Connection", "close")]))
+
+    def _handle_request(self, client):
+        head = client.request.split(b"\r\n\r\n", 1)[0].decode("latin-1")
+        lines = head.split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            return self._reject(client, "400 Bad Request")
+        if target.partition("?")[0] != "/events":
+            return self._reject(client, "404 Not Found")
+        if method != "GET":
+            return self._reject(client, "405 Method Not Allowed")
+
+        last_event_id = None
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "last-event-id":
+                try:
+                    last_event_id = int(value.strip())
+                except ValueError:
+                    pass
+
+        client.streaming = True
+        self._send(client, _STREAM_HEADERS + b"retry: 5000\n\n")
+        if last_event_id is not None:
+            self._replay(client, last_event_id)
+
+    def _replay(self, client, last_event_id):
+        sent = last_event_id
+        # events which are older than the history are loaded page by page
+        while self._history_start is None or sent < self._history_start:
+            with self.api.session_scope():
+                rows = self.api.get_elections_after(sent, self.REPLAY_LIMIT)
+            for row in rows:
+                self._send(client, format_event(row))
+                sent = row.id
+            if len(rows) < self.REPLAY_LIMIT:
+                break
+            if len(client.output) >= self.MAX_REPLAY_SIZE:
+                client.closing = True
+                return
+        for election_id, data in self._history:
+            if election_id > sent:
+                self._send(client, data)
+
+    def _broadcast(self, data):
+        for client in list(self._clients):
+            if client.streaming:
+                self._send(client, data)
+
+    def check_elections(self):
+        """Send elections which were saved since the last check."""
+        with self.api.session_scope():
+            rows = self.api.get_elections_after(self._last_id,
+                                                self.REPLAY_LIMIT)
+        for row in rows:
+            data = format_event(row)
+            self._history.append((row.id, data))
+            if len(self._history) > self.HISTORY_SIZE:
+                self._history_start = self._history.popleft()[0]
+            self._last_id = row.id
+            self._broadcast(data)
+
+    def _process_pending(self):
+        try:
+            while self._wakeup[0].recv(4096):
+                pass
+        except socket.error:
+            pass
+        changed = False
+        while self._pending:
+            event = self._pending.popleft()
+            # after reconnect to the broker something could be missed
+            changed |= event.get("event") in ("election_created",
+                                              "connected")
+        if changed:
+            self.check_elections()
+
+    def serve_once(self, timeout=1):
+        for key, mask in self._selector.select(timeout):
+            if key.fileobj is self._listener:
+                self._accept()
+            elif key.fileobj is self._wakeup[0]:
+                self._process_pending()
+            else:
+                client = key.data
+                if mask & selectors.EVENT_WRITE and not client.dropped:
+                    self._flush(client)
+                if mask & selectors.EVENT_READ and not client.dropped:
+                    self._read(client)
+
+    def run(self):
+        next_heartbeat = time.time() + self.HEARTBEAT_INTERVAL
+        try:
+            while not (self.should_stop and self.should_stop.is_set()):
+                self.serve_once()
+                now = time.time()
+                if not self._subscriber.connected and now >= self._next_poll:
+                    self._next_poll = now + self.POLL_INTERVAL
+                    self.check_elections()
+                if now >= next_heartbeat:
+                    next_heartbeat = now + self.HEARTBEAT_INTERVAL
+                    self._broadcast(b": ping\n\n")
+        finally:
+            self.close()
+
+    def __call__(self):
+        """process worker"""
+        if self.config.app.metrics_dir:
+            metrics.Exporter(self.config.app.metrics_dir, "sse",
+                             self.config.app.metrics_interval).start()
+        self.listen()
+        print("Serving events on http://%s:%s/events" %
+              (self.host, self.port))
+        self.run()
@@ -14,12 +14,24 @@
 
 import collections
 import datetime
-import random
-import time
 import threading
-import smtplib
 
-from jinja2 import Environment, FileSystemLoader
+from mlm.app import mail
+from mlm.app import render
+from mlm.app import scheduler
+from mlm import metrics
+from mlm import selection
+
+
+_ELECTION_SECONDS = metrics.histogram(
+    "mlm_election_seconds",
+    "Duration of a tick of the election loop, including the draw.")
+_QUEUE_DEPTH = metrics.gauge(
+    "mlm_notification_queue_depth",
+    "Number of elections waiting for notification mail.")
+_NO_RELATIONSHIPS = {"lucky_man": "raise", "meeting": "raise"}
+# delay before the next attempt of a failed election
+RETRY_DELAY = datetime.timedelta(minutes=1)
 
 
 class Tasks(object):
@@ -28,80 +40,109 @@ class Tasks(object):
         self.config = config
         self.exit = should_stop
         self.election_queue = collections.deque()
+        self._queue_cond = threading.Condition()
+        self.scheduler = scheduler.Scheduler()
+        self._selector = None
+        self._members_version = None
 
     def _render_html(self, template_dir, file_name, **kwargs):
-        j2_env = Environment(loader=FileSystemLoader(template_dir),
-                             trim_blocks=True)
+        return render.render(
+            template_dir, file_name,
+            bytecode_cache_dir=(
+                self.config.mail_notification.bytecode_cache_dir),
+            **kwargs)
+
+    def _get_selector(self):
+        """Obtain leader selector, rebuild it only if members are changed."""
+        version = self.api.get_members_version()
+        if self._selector is None or version != self._members_version:
+            self._selector = selection.LeaderSelector(
+                self.api.get_members(only_active=True))
+            self._members_version = version
+        return self._selector
+
+    def enqueue_election(self, election):
+        """Put election to the notification queue and wake up notifier."""
+        with self._queue_cond:
+            self.election_queue.append(election)
+            _QUEUE_DEPTH.set(len(self.election_queue))
+            self._queue_cond.notify()
+
+    def elect(self):
+        """Elect a leader for the next meeting and schedule the next run.
+
+        If the election fails, e.g. the database is locked or there are no
+        upcoming meetings, it is retried after RETRY_DELAY.
+        """
+        try:
+            with _ELECTION_SECONDS.time(), self.api.session_scope("election"):
+                date = self._elect()
+        except Exception as e:
+            print("Error: election failed, retrying in %s: %s" % (
+                RETRY_DELAY, e))
+            # the selector may be out of sync with the database
+            self._selector = None
+            self.scheduler.schedule(datetime.datetime.utcnow() + RETRY_DELAY,
+                                    self.elect)
+            return
+
+        # the next meeting can be obtained only when the current one starts
+        self.scheduler.schedule(date + datetime.timedelta(minutes=5),
+                                self.elect)
+
+    def _elect(self):
+        meeting, date = self.api.get_next_meeting()
+
+        # only the existence of the election matters
+        election = self.api.get_election(meeting, date, _NO_RELATIONSHIPS)
+
+        print("Meeting: %s" % meeting)
+        print("Date %s" % date)
+
+        if not election:
+            selector = self._get_selector()
 
-        return j2_env.get_template(file_name).render(**kwargs)
+            # we should elect one person two times in a row
+            previous_leader = self.api.get_last_leader()
+            lucky_man = selector.choose(
+                exclude=previous_leader.id if previous_leader else None)
+            print("New leader: %s" % lucky_man)
+
+            election = self.api.save_election(meeting, date, lucky_man.id)
+            selector.increment(lucky_man.id)
+            count, max_id, total_score = self._members_version
+            self._members_version = (count, max_id, total_score + 1)
+            self.enqueue_election(election)
+
+        return date
 
     def process_elections(self):
-        while not self.exit.isSet():
-            meeting, date = self.api.get_next_meeting()
-
-            elections = self.api.get_all_elections()
-
-            election = [e for e in elections
-                        if e.datetime == date and e.meeting.id == meeting.id]
-
-            print("Meeting: %s" % meeting)
-            print("Date %s" % date)
-
-            if not election:
-                members = self.api.get_members(only_active=True)
-
-                if elections:
-                    # we should elect one person two times in a row
-                    previous_leader = elections[-1].lucky_man
-                    members = [m for m in members
-                               if m.id != previous_leader.id]
-
-                choices = []
-                max_score = max(m.leader_score for m in members) + 1
-                for m in members:
-                    weight = max_score - m.leader_score
-                    # lets increase the difference between weights
-                    weight *= 10
-                    choices.append((m, weight))
-
-                total = sum(w for c, w in choices)
-                r = random.uniform(0, total)
-                upto = 0
-                lucky_man = None
-                for c, w in choices:
-                    if upto + w >= r:
-                        lucky_man = c
-                        break
-                    upto += w
-                print("New leader: %s" % lucky_man)
-
-                election = self.api.save_election(meeting, date, lucky_man.id)
-                self.election_queue.append(election)
-            else:
-
-                # sleep until next meeting starts or should_stop event isSet.
-                while (datetime.datetime.utcnow() <
-                        (date + datetime.timedelta(minutes=5)) and
-                        not self.exit.isSet()):
-                    time.sleep(1)
+        self.scheduler.schedule(datetime.datetime.utcnow(), self.elect)
+        self.scheduler.run()
 
     def notifier(self):
         if not self.config.mail_notification.enabled:
             return
 
         email_from = self.config.mail_notification.email_from
-        smtp_url = self.config.mail_notification.smtp_url
         path, template = self.config.mail_notification.template.rsplit("/", 1)
-        username = self.config.mail_notification.login
-        password = self.config.mail_notification.password
+        mailer = mail.Mailer.from_config(self.config.mail_notification,
+                                         sleep=self.exit.wait)
 
         while not self.exit.isSet():
-            if not len(self.election_queue):
-                time.sleep(1)
-            else:
-                election = self.election_queue.popleft()
+            with self._queue_cond:
+                while not self.election_queue and not self.exit.isSet():
+                    self._queue_cond.wait()
+                if not self.election_queue:
+                    # should_stop event is set
+                    break
+                elections = list(self.election_queue)
+                self.election_queue.clear()
+                _QUEUE_DEPTH.set(0)
+
+            messages = []
+            for election in elections:
                 email_to = election.lucky_man.contacts["email"]
-
                 email_message = self._render_html(
                     path, template,
                     username=election.lucky_man.name,
@@ -109,26 +150,40 @@ class Tasks(object):
                     email_from=email_from,
                     email_to=email_to
                 )
-                try:
-                    server = smtplib.SMTP(smtp_url)
-                    server.starttls()
-                    server.login(username, password)
-
-                    server.sendmail(email_from, email_to, email_message)
-                    print("Successfully sent email")
-                except smtplib.SMTPException as e:
-                    raise e
-                    print("Error: unable to send email")
-                else:
-                    server.quit()
+                messages.append((email_from, email_to, email_message))
+
+            failed = mailer.send_many(messages)
+            print("Successfully sent %s of %s email(s)" % (
+                len(messages) - len(failed), len(messages)))
+
+        mailer.close()
+
+    def stop(self):
+        """Wake up all workers, so they can notice should_stop event."""
+        self.scheduler.stop()
+        with self._queue_cond:
+            self._queue_cond.notify_all()
 
     def __call__(self):
         """worker process"""
+        exporter = None
+        if self.config.app.metrics_dir:
+            exporter = metrics.Exporter(self.config.app.metrics_dir, "tasks",
+                                        self.config.app.metrics_interval)
+            exporter.start()
         elections_t = threading.Thread(target=self.process_elections)
         notification_t = threading.Thread(target=self.notifier)
 
         elections_t.start()
         notification_t.start()
 
+        try:
+            self.exit.wait()
+        except KeyboardInterrupt:
+            self.exit.set()
+        self.stop()
+
         elections_t.join()
         notification_t.join()
+        if exporter is not None:
+            exporter.stop()
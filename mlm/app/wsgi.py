@@ -0,0 +1,381 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Prefork WSGI server built on top of the standard library.
+
+The master process opens the listening socket and forks workers which
+accept connections from it. Each worker serves one connection at a time,
+supports HTTP/1.1 keep-alive and exits after serving `max_requests`
+requests. The master restarts workers which exit.
+"""
+
+import errno
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+import six
+from six.moves import BaseHTTPServer
+from six.moves.urllib import parse as urlparse
+
+
+# signals which stop the master and workers
+_STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+class _Shutdown(Exception):
+    pass
+
+
+def _mask_stop_signals(block):
+    """Block or unblock stop signals.
+
+    Python 2 cannot block signals, so a stop signal which arrives right
+    after fork can be lost there.
+    """
+    if hasattr(signal, "pthread_sigmask"):
+        signal.pthread_sigmask(
+            signal.SIG_BLOCK if block else signal.SIG_UNBLOCK, _STOP_SIGNALS)
+
+
+def _unquote_path(path):
+    # PATH_INFO is a native string of bytes, decoded as latin-1 on Python 3
+    if six.PY2:
+        return urlparse.unquote(path)
+    return urlparse.unquote(path, encoding="latin-1")
+
+
+class _Input(object):
+    """wsgi.input which does not let application read beyond the body."""
+
+    def __init__(self, rfile, length):
+        self._rfile = rfile
+        self._left = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._left:
+            size = self._left
+        data = self._rfile.read(size) if size else b""
+        self._left -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if size is None or size < 0 or size > self._left:
+            size = self._left
+        data = self._rfile.readline(size) if size else b""
+        self._left -= len(data)
+        return data
+
+    def readlines(self, hint=-1):
+        return list(iter(self.readline, b""))
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+    def drain(self):
+        while self.read(65536):
+            pass
+
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "mlm"
+
+    def __getattr__(self, name):
+        # every HTTP method is processed by the WSGI application
+        if name.startswith("do_"):
+            return self.run_wsgi
+        raise AttributeError(name)
+
+    def setup(self):
+        # socket timeout is the keep-alive timeout for idle connections
+        self.timeout = self.server.keepalive or None
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+    def log_error(self, format, *args):
+        if format.startswith("Request timed out"):
+            # the client just keeps an idle keep-alive connection
+            return
+        BaseHTTPServer.BaseHTTPRequestHandler.log_error(self, format, *args)
+
+    def _make_environ(self, body):
+        path, _, query = self.path.partition("?")
+        environ = {
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": body,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": False,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+            "REQUEST_METHOD": self.command,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": _unquote_path(path),
+            "QUERY_STRING": query,
+            "SERVER_NAME": self.server.server_name,
+            "SERVER_PORT": str(self.server.server_port),
+            "SERVER_PROTOCOL": self.request_version,
+            "REMOTE_ADDR": self.client_address[0],
+            "CONTENT_TYPE": self.headers.get("Content-Type", ""),
+            "CONTENT_LENGTH": self.headers.get("Content-Length", ""),
+        }
+        for name, value in self.headers.items():
+            name = name.upper().replace("-", "_")
+            if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                key = "HTTP_%s" % name
+                environ[key] = ("%s,%s" % (environ[key], value)
+                                if key in environ else value)
+        return environ
+
+    def run_wsgi(self):
+        self.server.requests += 1
+        self.server.busy = True
+        self._state = {"status": None, "headers": None, "sent": False,
+                       "chunked": False}
+        try:
+            self._run_wsgi(self._state)
+        except socket.error:
+            raise
+        except Exception:
+            traceback.print_exc()
+            self.close_connection = True
+            if not self._state["sent"]:
+                self.send_error(500)
+        finally:
+            self.server.busy = False
+        if self.server.should_exit():
+            self.close_connection = True
+
+    def _run_wsgi(self, state):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.send_error(400, "Wrong Content-Length")
+            return
+        body = _Input(self.rfile, length)
+
+        def write(data):
+            if not state["sent"]:
+                self._send_headers(state, None)
+            if self.command == "HEAD" or not data:
+                return
+            if state["chunked"]:
+                self.wfile.write(("%x\r\n" % len(data)).encode("ascii"))
+                self.wfile.write(data)
+                self.wfile.write(b"\r\n")
+            else:
+                self.wfile.write(data)
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and state["sent"]:
+                six.reraise(*exc_info)
+            state["status"], state["headers"] = status, headers
+            return write
+
+        result = self.server.app(self._make_environ(body), start_response)
+        try:
+            chunks = iter(result)
+            if not state["sent"]:
+                # try to calculate Content-Length for short responses
+                first = next(chunks, None)
+                if first is None:
+                    self._send_headers(state, 0)
+                else:
+                    nxt = next(chunks, None)
+                    if nxt is None:
+                        self._send_headers(state, len(first))
+                    write(first)
+                    if nxt is not None:
+                        write(nxt)
+            for data in chunks:
+                write(data)
+            if state["chunked"] and self.command != "HEAD":
+                self.wfile.write(b"0\r\n\r\n")
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        body.drain()
+
+    def _send_headers(self, state, content_length):
+        code, _, message = state["status"].partition(" ")
+        self.send_response(int(code), message)
+        names = set()
+        for name, value in state["headers"]:
+            names.add(name.lower())
+            self.send_header(name, value)
+        if "content-length" not in names:
+            if content_length is not None:
+                self.send_header("Content-Length", str(content_length))
+            elif self.request_version == "HTTP/1.1":
+                state["chunked"] = True
+                self.send_header("Transfer-Encoding", "chunked")
+            else:
+                self.close_connection = True
+        if (self.server.should_exit() or not self.server.keepalive or
+                self.close_connection):
+            self.close_connection = True
+            self.send_header("Connection", "close")
+        self.end_headers()
+        state["sent"] = True
+
+
+class _Worker(object):
+    def __init__(self, app, listener, keepalive, max_requests):
+        self.app = app
+        self.listener = listener
+        self.keepalive = keepalive
+        self.max_requests = max_requests
+        self.server_name, self.server_port = listener.getsockname()[:2]
+        self.requests = 0
+        self.busy = False
+        self.stopping = False
+
+    def should_exit(self):
+        return self.stopping or (self.max_requests and
+                                 self.requests >= self.max_requests)
+
+    def _on_sigterm(self, signum, frame):
+        self.stopping = True
+        if not self.busy:
+            raise _Shutdown()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_sigterm)
+        # master process handles Ctrl+C and stops workers gracefully
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        # signals were blocked by the master while forking
+        _mask_stop_signals(False)
+        try:
+            while not self.should_exit():
+                connection, address = self.listener.accept()
+                try:
+                    RequestHandler(connection, address, self)
+                except socket.error:
+                    pass
+                finally:
+                    connection.close()
+        except _Shutdown:
+            pass
+
+
+def listen(host, port, backlog=128):
+    """Open the listening socket which is shared by all workers."""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(backlog)
+    return listener
+
+
+class PreforkServer(object):
+    """Master process which keeps the required number of workers alive."""
+
+    # minimal lifetime of a worker which is not considered as a crash
+    MIN_WORKER_LIFETIME = 1
+
+    def __init__(self, app, listener, workers=2, keepalive=2,
+                 max_requests=0):
+        self.app = app
+        self.listener = listener
+        self.workers = workers
+        self.keepalive = keepalive
+        self.max_requests = max_requests
+        self._children = {}
+        self._stopping = False
+
+    def _spawn(self):
+        # a signal which arrives right after fork is dropped in the child
+        # before it installs own handlers, so delay it until they are set
+        _mask_stop_signals(True)
+        try:
+            pid = os.fork()
+        except OSError:
+            _mask_stop_signals(False)
+            raise
+        if pid:
+            self._children[pid] = time.time()
+            _mask_stop_signals(False)
+            return
+        status = 0
+        try:
+            _Worker(self.app, self.listener, self.keepalive,
+                    self.max_requests).run()
+        except BaseException:
+            status = 1
+            sys.excepthook(*sys.exc_info())
+        finally:
+            os._exit(status)
+
+    def _on_signal(self, signum, frame):
+        if not self._stopping:
+            self._stopping = True
+            raise _Shutdown()
+
+    def stop(self, timeout=30):
+        """Ask workers to finish current requests and wait for them."""
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                self._children.pop(pid)
+        deadline = time.time() + timeout
+        while self._children and time.time() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                self._children.pop(pid, None)
+            else:
+                time.sleep(0.05)
+        for pid in self._children:
+            os.kill(pid, signal.SIGKILL)
+        self._children.clear()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        try:
+            while len(self._children) < self.workers:
+                self._spawn()
+            while True:
+                try:
+                    pid, status = os.wait()
+                except OSError as e:
+                    if e.errno != errno.EINTR:
+                        raise
+                    continue
+                started_at = self._children.pop(pid, None)
+                if started_at is None:
+                    continue
+                if (status and
+                        time.time() - started_at < self.MIN_WORKER_LIFETIME):
+                    # do not fork in a busy loop if workers fail on start
+                    time.sleep(self.MIN_WORKER_LIFETIME)
+                self._spawn()
+        except _Shutdown:
+            pass
+        finally:
+            self.stop()
+            self.listener.close()
+
+
+def serve(app, host, port, workers=2, backlog=128, keepalive=2,
+          max_requests=0):
+    """Serve WSGI application by prefork workers until SIGTERM/SIGINT."""
+    listener = listen(host, port, backlog)
+    print("Serving on http://%s:%s with %s workers" % (host, port, workers))
+    PreforkServer(app, listener, workers=workers, keepalive=keepalive,
+                  max_requests=max_requests).run()
@@ -0,0 +1,38 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import sys
+
+from mlm.commands import utils
+
+
+def _log(line):
+    sys.stderr.write(line + "\n")
+
+
+class Db(utils.BaseCommand):
+    @utils.args("--batch-size", type=int, default=1000, metavar="<rows>",
+                help="Number of rows to change in one transaction.")
+    def upgrade(self, api, args):
+        """Upgrade the database schema to the latest version.
+
+        New indexes and columns are added to the existing database in
+        place, MLM can keep running.
+        """
+        applied = api.upgrade_db(args.batch_size, log=_log)
+        if applied:
+            print("The database is upgraded to version %s." %
+                  applied[-1].version)
+        else:
+            print("The database is up to date.")
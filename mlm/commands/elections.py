@@ -0,0 +1,84 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from mlm.commands import utils
+
+
+def _simulation_row(result):
+    return (str(result.policy), result.members, result.trials,
+            "%.2f" % result.score_variance, "%.2f" % result.score_spread,
+            "%.1f" % result.longest_gap, result.max_gap,
+            "%.3f" % result.repeat_rate, "%.0f" % result.trials_per_second)
+
+
+class Elections(utils.BaseCommand):
+    """History of elections"""
+
+    @utils.export_args
+    def export(self, api, args):
+        """Save all elections to CSV or JSON Lines file."""
+        with api.session_scope():
+            utils.export(args, ["id", "datetime", "leader", "meeting_id"],
+                         api.iter_all_elections())
+
+    @utils.args("--policy", type=str, action="append", metavar="<spec>",
+                dest="policies",
+                help="A selection policy to simulate: score (the one which "
+                     "is used by MLM), uniform or least, with options after "
+                     "a colon, e.g. 'score:power=2' or 'uniform:repeats'. "
+                     "Can be repeated to compare policies.")
+    @utils.args("--members", type=int, nargs="+", default=[10],
+                metavar="<count>",
+                help="Sizes of teams to simulate.")
+    @utils.args("--from-db", action="store_true",
+                help="Start from current scores of active members instead "
+                     "of a new team.")
+    @utils.args("--years", type=int, default=5, metavar="<years>",
+                help="Duration of every trial.")
+    @utils.args("--meetings-per-week", type=int, default=1, metavar="<n>")
+    @utils.args("--trials", type=int, default=1000, metavar="<trials>",
+                help="Number of simulated histories of every team.")
+    @utils.args("--seed", type=int, metavar="<seed>",
+                help="Seed of the random generator to repeat results.")
+    def simulate(self, api, args):
+        """Compare fairness of selection policies by Monte Carlo trials.
+
+        Reports averages over trials of: variance and spread (max - min)
+        of leader scores at the end, the longest number of elections a
+        member waited to be elected (and the maximum of it over trials) and
+        a share of elections which elected the previous leader.
+        """
+        # NumPy is needed only here, so it is not imported by other commands
+        from mlm import simulation
+
+        policies = [simulation.parse_policy(spec)
+                    for spec in args.policies or ["score"]]
+        teams = [(count, None) for count in args.members]
+        if args.from_db:
+            scores = [m.leader_score for m in
+                      api.get_members(only_active=True)]
+            teams = [(len(scores), scores)]
+        elections = args.years * 52 * args.meetings_per_week
+
+        rows = []
+        for policy in policies:
+            for count, scores in teams:
+                rows.append(_simulation_row(simulation.simulate(
+                    policy, count, elections, args.trials, scores,
+                    args.seed)))
+        print(utils.make_table(
+            rows, headers=["Policy", "Members", "Trials", "Score variance",
+                           "Score spread", "Longest gap", "Max gap",
+                           "Repeat rate", "Trials/s"],
+            title="Simulation of %s elections" % elections))
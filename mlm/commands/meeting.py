@@ -12,10 +12,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime as dt
 import re
 
 from mlm.commands import utils
 from mlm import consts
+from mlm import recurrence
+
+
+def _date(value):
+    return dt.datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _setpos(value):
+    return -1 if value == "last" else int(value)
 
 
 class Meeting(utils.BaseCommand):
@@ -24,6 +34,19 @@ class Meeting(utils.BaseCommand):
                      ", ".join(consts.WEEKDAYS))
     @utils.args("--time", type=str, metavar="<time>",
                 help="Time of meeting in UTC. Expected format: 'H:M'.")
+    @utils.args("--monthly", action="store_true",
+                help="Repeat the meeting monthly instead of weekly.")
+    @utils.args("--every", type=int, default=1, metavar="<n>",
+                help="Repeat the meeting every n weeks (or months).")
+    @utils.args("--week", type=_setpos, choices=[1, 2, 3, 4, -1],
+                metavar="{1,2,3,4,last}",
+                help="The week of month of a monthly meeting. By default, "
+                     "it is the week of the first meeting.")
+    @utils.args("--start", type=_date, metavar="<YYYY-MM-DD>",
+                help="The first meeting is at this date or later. "
+                     "Defaults to today for not weekly meetings.")
+    @utils.args("--until", type=_date, metavar="<YYYY-MM-DD>",
+                help="The date of the last meeting.")
     def add(self, api, args):
         """Add meeting."""
         if args.weekday not in consts.WEEKDAYS:
@@ -31,14 +54,31 @@ class Meeting(utils.BaseCommand):
         if not re.match(r"^([0-9]|0[0-9]|1?[0-9]|2[0-3]):[0-5]?[0-9]$",
                         args.time):
             raise ValueError("Wrong format of time.")
-        api.add_meeting(consts.WEEKDAYS.index(args.weekday), args.time)
+        api.add_meeting(consts.WEEKDAYS.index(args.weekday), args.time,
+                        freq="monthly" if args.monthly else "weekly",
+                        interval=args.every, start=args.start,
+                        until=args.until, setpos=args.week)
+
+    @utils.args("id", type=int, metavar="<id>", help="The ID of a meeting.")
+    @utils.args("date", type=_date, metavar="<YYYY-MM-DD>",
+                help="The date of the meeting to cancel.")
+    def skip(self, api, args):
+        """Cancel one meeting without changing the schedule."""
+        api.skip_meeting(args.id, args.date)
 
     def list(self, api, args):
         """Show all meetings"""
         meetings = api.get_meetings()
         if meetings:
-            print(utils.make_table([(m.weekday, m.time) for m in meetings],
-                                   headers=["Weekday", "Time"],
+            rows = []
+            for m in meetings:
+                rule = recurrence.Recurrence.from_event(m)
+                start = (m.datetime.strftime("%Y-%m-%d")
+                         if recurrence.has_rule(m) else "")
+                rows.append((m.id, m.weekday, m.time, rule.describe(),
+                             start))
+            print(utils.make_table(rows, headers=["Id", "Weekday", "Time",
+                                                  "Repeats", "Since"],
                                    title="Available meetings"))
         else:
             print("There is no scheduled meetings.")
@@ -13,16 +13,51 @@
 #    under the License.
 
 from mlm.commands import utils
+from mlm import records
 
 
 class Members(utils.BaseCommand):
     @utils.args("name", type=str, metavar="<name>",
                 help="The name of new member.")
+    @utils.args("--email", type=str, metavar="<email>", required=True,
+                help="E-mail address to send notifications to.")
     def add(self, api, args):
         """Add new member."""
-        api.add_member(args.name)
+        api.add_member(args.name, contacts={"email": args.email})
         print("'%s' is successfully added to team. Congrats!" % args.name)
 
+    @utils.args("file", type=str, metavar="<file>",
+                help="CSV or JSON Lines file with members, '-' for stdin.")
+    @utils.args("--format", type=str, choices=records.FORMATS,
+                help="Format of the file. By default, it is detected by "
+                     "the extension.")
+    @utils.args("--batch-size", type=int, default=250, metavar="<size>",
+                help="Number of members to add in one transaction.")
+    def import_(self, api, args):
+        """Add many members from a file.
+
+        CSV file should have a header with 'name' column, all other columns
+        are contacts, e.g. 'email'. Each line of JSON Lines file should be
+        an object with 'name' and 'contacts' fields. Rows which are wrong or
+        conflict with existing members are reported and skipped.
+        """
+        fmt = records.detect_format(args.file, args.format)
+        errors = []
+        with records.open_input(args.file) as f:
+            inserted, failed = api.import_members(
+                records.read_records(f, fmt, errors), args.batch_size)
+        for line, reason in sorted(errors + failed):
+            print("Line %s: %s" % (line, reason))
+        print("%s members are added, %s rows are skipped." %
+              (inserted, len(errors) + len(failed)))
+
+    @utils.export_args
+    def export(self, api, args):
+        """Save all members to CSV or JSON Lines file."""
+        with api.session_scope():
+            utils.export(args, ["id", "name", "contacts", "active",
+                                "leader_score"], api.iter_members())
+
     def list(self, api, args):
         """Show all members"""
         active_members = []
@@ -12,7 +12,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from tabulate import tabulate
+import sys
+
+from mlm import records
 
 
 class BaseCommand(object):
@@ -28,7 +30,40 @@ def args(*args, **kwargs):
 
 
 def make_table(data, headers=(), title=None):
+    # tabulate takes a while to import, so do not slow down other commands
+    from tabulate import tabulate
+
     table = tabulate(data, headers=headers)
     if title:
         table = "\n    ".join(("%s\n\n%s" % (title, table)).split("\n"))
     return "%s\n" % table
+
+
+def export_args(func):
+    """Arguments of commands which export data."""
+    for arg in (args("--format", type=str, choices=records.FORMATS,
+                     help="Format of the output. By default, it is "
+                          "detected by the extension of the file, JSON "
+                          "Lines is used for stdout."),
+                args("--gzip", action="store_true",
+                     help="Compress the output. It is enabled for files "
+                          "with '.gz' extension."),
+                args("--output", type=str, metavar="<file>", default="-",
+                     help="Path to the file, stdout by default.")):
+        func = arg(func)
+    return func
+
+
+def export(args, fields, rows):
+    """Write rows to the file specified by export_args."""
+    fmt = args.format
+    if not fmt and args.output == "-":
+        fmt = "jsonl"
+    fmt = records.detect_format(args.output, fmt)
+    compress = args.gzip or records.is_compressed(args.output)
+    with records.open_output(args.output, compress) as f:
+        count = records.write_records(f, fmt, fields, rows)
+    if args.output != "-":
+        print("%s rows are saved to %s." % (count, args.output))
+    else:
+        sys.stderr.write("%s rows are exported.\n" % count)
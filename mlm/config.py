@@ -21,6 +21,21 @@ from six.moves import configparser
 
 HOME_DIR = os.path.expanduser("~/.mlm")
 
+
+def _choice(*choices):
+    """Type of string options which take one of the choices.
+
+    Empty value is allowed too and means the default of the consumer.
+    """
+    def _type(value):
+        if value and value.upper() not in choices:
+            raise ValueError("'%s' is not one of: %s" %
+                             (value, ", ".join(choices)))
+        return value
+    _type.__name__ = "str"
+    return _type
+
+
 _OPTIONS = {
     "app": {
         "name": {
@@ -33,12 +48,134 @@ _OPTIONS = {
             "type": int,
             "description": "The port of the webserver."
         },
+        "workers": {
+            "defaults": 0,
+            "type": int,
+            "description": "Number of prefork worker processes of the "
+                           "webserver. Use 0 to run Flask development "
+                           "server instead."
+        },
+        "backlog": {
+            "defaults": 128,
+            "type": int,
+            "description": "Maximum number of pending connections of the "
+                           "webserver socket."
+        },
+        "keepalive": {
+            "defaults": 2,
+            "type": int,
+            "description": "Seconds to wait for the next request on "
+                           "a keep-alive connection. Use 0 to close "
+                           "connections after each response."
+        },
+        "max_requests": {
+            "defaults": 0,
+            "type": int,
+            "description": "Number of requests after which a webserver "
+                           "worker is restarted. Use 0 to never restart "
+                           "workers."
+        },
+        "cache_size": {
+            "defaults": 16,
+            "type": int,
+            "description": "Number of rendered pages to keep in memory of "
+                           "each webserver process."
+        },
+        "page_size": {
+            "defaults": 50,
+            "type": int,
+            "description": "Default number of elections or members on one "
+                           "page of history or API response."
+        },
+        "sse_port": {
+            "defaults": 5001,
+            "type": int,
+            "description": "The port of Server-Sent Events stream which "
+                           "announces new leaders at /events. Use 0 to "
+                           "disable it."
+        },
+        "events_socket": {
+            "defaults": "~/.mlm/events.sock",
+            "type": str,
+            "description": "Path to the Unix socket which is used to notify "
+                           "webserver processes about new elections and "
+                           "changes of members."
+        },
+        "metrics_dir": {
+            "defaults": "~/.mlm/metrics",
+            "type": str,
+            "description": "Directory where MLM processes save their "
+                           "metrics to be served on /metrics of the "
+                           "webserver. Empty value makes /metrics show "
+                           "only the webserver process which serves it."
+        },
+        "metrics_interval": {
+            "defaults": 5,
+            "type": int,
+            "description": "Seconds between saves of metrics."
+        },
     },
     "db": {
         "sqlite_file": {
             "defaults": "~/.mlm/db.sql",
             "type": str,
             "description": "Path to sqlite path to store all data."
+        },
+        "pool_size": {
+            "defaults": 5,
+            "type": int,
+            "description": "Number of database connections to keep open and "
+                           "reuse. Use 0 to open a new connection for each "
+                           "session."
+        },
+        "journal_mode": {
+            "defaults": "WAL",
+            "type": _choice("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL",
+                            "OFF"),
+            "description": "SQLite journal mode (PRAGMA journal_mode). WAL "
+                           "lets readers work concurrently with a writer."
+        },
+        "synchronous": {
+            "defaults": "NORMAL",
+            "type": _choice("OFF", "NORMAL", "FULL", "EXTRA",
+                            "0", "1", "2", "3"),
+            "description": "SQLite synchronous level (PRAGMA synchronous). "
+                           "NORMAL is safe in WAL mode and avoids fsync on "
+                           "each commit."
+        },
+        "cache_size": {
+            "defaults": -16000,
+            "type": int,
+            "description": "SQLite page cache size per connection (PRAGMA "
+                           "cache_size). Negative value is a size in KiB."
+        },
+        "mmap_size": {
+            "defaults": 268435456,
+            "type": int,
+            "description": "Maximum number of bytes of the database file to "
+                           "access through memory-mapped I/O (PRAGMA "
+                           "mmap_size). Use 0 to disable it."
+        },
+        "read_only_web": {
+            "defaults": True,
+            "type": bool,
+            "description": "Open the database read-only in the webserver "
+                           "and SSE processes, so only the tasks process "
+                           "can write to it."
+        },
+        "debug": {
+            "defaults": False,
+            "type": bool,
+            "description": "Count SQL statements of every web request and "
+                           "election and report ones which exceed "
+                           "query_budget or repeat the same statement, "
+                           "which is a sign of N+1 queries."
+        },
+        "query_budget": {
+            "defaults": 10,
+            "type": int,
+            "description": "Maximum number of SQL statements of one web "
+                           "request or election in debug mode."
         }
     },
     "mail_notification": {
@@ -62,6 +199,13 @@ _OPTIONS = {
             "type": str,
             "description": "Template for notification mail."
         },
+        "bytecode_cache_dir": {
+            "defaults": "",
+            "type": str,
+            "description": "Directory to store compiled templates of "
+                           "notification mail. Empty value disables the "
+                           "on-disk cache."
+        },
         "login": {
             "defaults": "username",
             "type": str,
@@ -71,6 +215,23 @@ _OPTIONS = {
             "defaults": "password",
             "type": str,
             "description": "password for authentication"
+        },
+        "use_tls": {
+            "defaults": True,
+            "type": bool,
+            "description": "Upgrade SMTP connection with STARTTLS."
+        },
+        "max_retries": {
+            "defaults": 3,
+            "type": int,
+            "description": "How many times to retry sending of e-mail if SMTP "
+                           "server is unavailable."
+        },
+        "retry_interval": {
+            "defaults": 1,
+            "type": int,
+            "description": "Seconds to wait before the first retry. The "
+                           "interval is doubled on each next one."
         }
     }
 }
@@ -88,10 +249,16 @@ class _Section(object):
                                  "MLM config" % (option, self._name))
         if self._config.has_section(self._name):
             try:
-                # TODO(andreykurilin): decode value by its type from _OPTIONS
-                return self._config.get(self._name, option)
+                if _OPTIONS[self._name][option]["type"] is bool:
+                    return self._config.getboolean(self._name, option)
+                value = self._config.get(self._name, option)
+                return _OPTIONS[self._name][option]["type"](value)
             except configparser.NoOptionError:
                 pass
+            except ValueError as e:
+                raise ValueError("Invalid value of '%s' option in '%s' "
+                                 "section of MLM config: %s" %
+                                 (option, self._name, e))
 
         return _OPTIONS[self._name][option]["defaults"]
 
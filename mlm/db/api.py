@@ -12,44 +12,275 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import contextlib
+import functools
+import itertools
 import os
+import sqlite3
+import threading
+import timeit
 
+import six
+from six.moves.urllib import parse
 import sqlalchemy as sa
 from sqlalchemy import exc
 from sqlalchemy import orm as sa_orm
+from sqlalchemy import pool as sa_pool
 
+from mlm.db import migrations
 from mlm.db import models
+from mlm import metrics
+
+
+SQLITE_PRAGMAS = ("journal_mode", "synchronous", "cache_size", "mmap_size")
+# journal mode is a property of the file and synchronous affects only writes,
+# both are set by read-write connections
+READ_ONLY_PRAGMAS = ("cache_size", "mmap_size")
+
+_QUERY_SECONDS = metrics.histogram(
+    "mlm_db_query_seconds", "Latency of SQL statements.", ["statement"])
+_QUERY_ERRORS = metrics.counter(
+    "mlm_db_query_errors_total", "Number of failed SQL statements.",
+    ["statement"])
+_BUDGET_EXCEEDED = metrics.counter(
+    "mlm_db_query_budget_exceeded_total",
+    "Number of session scopes which exceeded the query budget or repeated "
+    "a statement (only in debug mode).", ["scope", "reason"])
+_STATEMENTS = frozenset(["select", "insert", "update", "delete"])
+
+# strategies of loading relationships which can be chosen per call
+LOADERS = {"joined": sa_orm.joinedload,
+           "selectin": sa_orm.selectinload,
+           "subquery": sa_orm.subqueryload,
+           "lazy": sa_orm.lazyload,
+           "noload": sa_orm.noload,
+           "raise": sa_orm.raiseload}
+
+# elections are used after their session is closed, so relationships are
+# loaded by default, with one query
+ELECTION_LOAD = {"lucky_man": "joined", "meeting": "joined"}
+
+
+def _get_statement_type(statement):
+    keyword = statement.lstrip()[:6].lower()
+    return keyword if keyword in _STATEMENTS else "other"
+
+
+class QueryStats(object):
+    """SQL statements which are executed within a session scope."""
+
+    def __init__(self, name=None):
+        self.name = name
+        self.count = 0
+        self.statements = collections.Counter()
+
+    def add(self, statement):
+        self.count += 1
+        self.statements[statement] += 1
+
+    def get_repeated(self, limit):
+        """Statements which are executed at least `limit` times."""
+        return [(statement, count)
+                for statement, count in self.statements.most_common()
+                if count >= limit]
 
 
 class DBAPI(object):
-    def __init__(self, config):
+    # the same statement executed so many times within one session scope
+    # is most likely a query in a loop, i.e. N+1 queries
+    REPEATED_QUERY_LIMIT = 3
+
+    def __init__(self, config, read_only=False):
+        """Open the database.
+
+        :param read_only: open the database read-only, for processes which
+            never write; it should be created by a read-write DBAPI first
+        """
         self._cfg = config
-        self.connection_str = "sqlite:///%s" % os.path.expanduser(
-            self._cfg.db.sqlite_file)
+        self.read_only = read_only
+        # values are validated by the config, so bad ones fail here rather
+        # than on every connection
+        self._pragmas = [
+            (pragma, getattr(self._cfg.db, pragma))
+            for pragma in (READ_ONLY_PRAGMAS if read_only else SQLITE_PRAGMAS)
+            if getattr(self._cfg.db, pragma) != ""]
+        path = os.path.expanduser(self._cfg.db.sqlite_file)
+        self.connection_str = "sqlite:///%s" % path
 
-        self._db_session = None
-        _db_engine = sa.create_engine(self.connection_str)
-        # db_models.BASE.metadata.bind = _db_engine
-        self._session_factory = sa_orm.sessionmaker(bind=_db_engine,
+        self._local = threading.local()
+        self._engine = self._create_engine()
+        self._session_factory = sa_orm.sessionmaker(bind=self._engine,
                                                     expire_on_commit=False,
                                                     autocommit=True)
 
-        if not os.path.exists(self.connection_str):
+        # existing databases are checked by get_schema_version() and
+        # changed only by upgrade()
+        if not read_only and not os.path.exists(path):
             self.init_db()
 
+    def _create_engine(self):
+        if self._cfg.db.pool_size > 0:
+            kwargs = {"poolclass": sa_pool.QueuePool,
+                      "pool_size": self._cfg.db.pool_size,
+                      # pool hands a connection to only one thread at a time
+                      "connect_args": {"check_same_thread": False}}
+        else:
+            kwargs = {"poolclass": sa_pool.NullPool}
+        if self.read_only and not six.PY2:
+            # SQLAlchemy URLs can not pass a URI filename to sqlite3, which
+            # does not accept them at all on Python 2, so there only
+            # PRAGMA query_only keeps the connection from writing
+            uri = "file:%s?mode=ro" % parse.quote(
+                os.path.expanduser(self._cfg.db.sqlite_file))
+            kwargs["creator"] = functools.partial(
+                sqlite3.connect, uri, uri=True,
+                **kwargs.pop("connect_args", {}))
+            engine = sa.create_engine("sqlite://", **kwargs)
+        else:
+            engine = sa.create_engine(self.connection_str, **kwargs)
+        sa.event.listen(engine, "connect", self._on_connect)
+        sa.event.listen(engine, "checkout", self._on_checkout)
+        sa.event.listen(engine, "before_cursor_execute",
+                        self._before_execute)
+        sa.event.listen(engine, "after_cursor_execute", self._after_execute)
+        sa.event.listen(engine, "handle_error", self._on_error)
+        if self._cfg.db.debug:
+            sa.event.listen(engine, "before_cursor_execute",
+                            self._count_statement)
+        return engine
+
+    def _count_statement(self, conn, cursor, statement, parameters,
+                         context, executemany):
+        stats = getattr(self._local, "stats", None)
+        if stats is not None:
+            stats.add(statement)
+
+    def _check_stats(self, stats):
+        name = stats.name or "session scope"
+        budget = self._cfg.db.query_budget
+        if stats.count > budget:
+            _BUDGET_EXCEEDED.labels(name, "budget").inc()
+            print("Warning: %s executed %s SQL statements, the budget is %s."
+                  % (name, stats.count, budget))
+        for statement, count in stats.get_repeated(self.REPEATED_QUERY_LIMIT):
+            _BUDGET_EXCEEDED.labels(name, "repeated").inc()
+            print("Warning: %s executed the same SQL statement %s times, "
+                  "probably N+1 queries: %s" %
+                  (name, count, " ".join(statement.split())))
+
+    @staticmethod
+    def _before_execute(conn, cursor, statement, parameters, context,
+                        executemany):
+        context._mlm_started_at = timeit.default_timer()
+
+    @staticmethod
+    def _after_execute(conn, cursor, statement, parameters, context,
+                       executemany):
+        _QUERY_SECONDS.labels(_get_statement_type(statement)).observe(
+            timeit.default_timer() - context._mlm_started_at)
+
+    @staticmethod
+    def _on_error(context):
+        _QUERY_ERRORS.labels(
+            _get_statement_type(context.statement or "")).inc()
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        connection_record.info["pid"] = os.getpid()
+        cursor = dbapi_connection.cursor()
+        for pragma, value in self._pragmas:
+            cursor.execute("PRAGMA %s = %s" % (pragma, value))
+        if self.read_only:
+            # also refuses writes to temporary tables
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+    def _on_checkout(self, dbapi_connection, connection_record,
+                     connection_proxy):
+        # app processes are forked after DBAPI is created, so they should
+        # not reuse connections opened by the parent process
+        if connection_record.info["pid"] != os.getpid():
+            connection_record.connection = None
+            connection_proxy.connection = None
+            raise exc.DisconnectionError(
+                "Connection record belongs to pid %s, attempting to check "
+                "out in pid %s" % (connection_record.info["pid"],
+                                   os.getpid()))
+
     def init_db(self):
-        models.BASE.metadata.create_all(self.get_session().bind)
+        """Create tables of the latest schema."""
+        with self._engine.begin() as conn:
+            models.BASE.metadata.create_all(conn)
+            migrations.stamp(conn)
+
+    def get_schema_version(self):
+        """Obtain the version of the schema with one cheap query."""
+        return migrations.get_version(self._engine)
+
+    def upgrade(self, batch_size=1000, log=None):
+        """Migrate the database to the latest schema, see migrations."""
+        return migrations.upgrade(self._engine, batch_size, log)
+
+    @contextlib.contextmanager
+    def session_scope(self, name=None):
+        """Share one session between all DB calls inside of the block.
+
+        It is designed to wrap a processing of a single web request or
+        a single scheduler tick. In debug mode, SQL statements of the block
+        are counted and checked against the query budget.
+
+        :param name: the name of the block to report in debug mode
+        """
+        previous = getattr(self._local, "session", None)
+        session = previous or self._session_factory()
+        self._local.session = session
+        if previous is None and self._cfg.db.debug:
+            self._local.stats = QueryStats(name)
+        try:
+            yield session
+        finally:
+            self._local.session = previous
+            if previous is None:
+                session.close()
+                stats = getattr(self._local, "stats", None)
+                if stats is not None:
+                    self._local.stats = None
+                    self._check_stats(stats)
+
+    def get_query_stats(self):
+        """Statements of the current session scope, in debug mode only."""
+        return getattr(self._local, "stats", None)
 
     def get_session(self):
-        return self._session_factory()
+        session = getattr(self._local, "session", None)
+        return session or self._session_factory()
 
-    def query(self, model, session=None):
+    def query(self, model, session=None, load=None):
+        """Query objects of the model.
+
+        :param load: a dict of names of relationships and strategies of
+            loading them, one of LOADERS
+        """
         session = session or self.get_session()
-        return session.query(model)
+        query = session.query(model)
+        for name, strategy in (load or {}).items():
+            if strategy not in LOADERS:
+                raise ValueError("Unknown loading strategy '%s', use one "
+                                 "of: %s." % (strategy,
+                                              ", ".join(sorted(LOADERS))))
+            relationship = getattr(model, name, None)
+            if not isinstance(getattr(relationship, "property", None),
+                              sa_orm.RelationshipProperty):
+                raise ValueError("%s has no relationship '%s'." %
+                                 (model.__name__, name))
+            query = query.options(LOADERS[strategy](relationship))
+        return query
 
-    def add_member(self, name):
+    def add_member(self, name, contacts=None):
         """Add new member to team."""
-        self.get_session().add(models.Member(name=name))
+        session = self.get_session()
+        with session.begin():
+            session.add(models.Member(name=name, contacts=contacts))
 
     def _get_member(self, member_id, session=None):
         """Obtain member by ID."""
@@ -69,6 +300,68 @@ class DBAPI(object):
             return self.query(models.Member).filter_by(active=True).all()
         return self.query(models.Member).all()
 
+    def get_members_version(self):
+        """Obtain a cheap fingerprint of active members and their scores."""
+        return tuple(self.get_session().query(
+            sa.func.count(models.Member.id),
+            sa.func.max(models.Member.id),
+            sa.func.coalesce(sa.func.sum(models.Member.leader_score), 0)
+        ).filter(models.Member.active == sa.true()).one())
+
+    def get_leaderboard_version(self):
+        """Obtain a fingerprint of active members and their scores.
+
+        Scores change only with new elections and members are never
+        reactivated, so the fingerprint is (the last election id, the
+        maximum member id, the number of inactive members), which takes
+        O(log n) instead of the sum of scores of get_members_version().
+        """
+        member = models.Member
+        return tuple(self.get_session().query(
+            sa.select([sa.func.max(models.Election.id)]).scalar_subquery(),
+            sa.select([sa.func.max(member.id)]).scalar_subquery(),
+            sa.select([sa.func.count(member.id)]).where(
+                member.active == sa.false()).scalar_subquery()).one())
+
+    def get_top_members(self, limit=None):
+        """Obtain active members with the highest scores.
+
+        :returns: (id, name, leader_score) rows ordered by score from the
+            highest one, members with the same score are ordered by id
+        """
+        member = models.Member
+        query = self.get_session().query(
+            member.id, member.name, member.leader_score).filter(
+            member.active == sa.true()).order_by(
+            member.leader_score.desc(), member.id)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def get_max_score(self):
+        """The highest score of active members, None if there are none."""
+        member = models.Member
+        return self.get_session().query(
+            sa.func.max(member.leader_score)).filter(
+            member.active == sa.true()).scalar()
+
+    def get_member_rank(self, member_id):
+        """Obtain the place of an active member in the leaderboard.
+
+        Members with the same score share a rank.
+
+        :returns: the rank, None if the member is not active
+        """
+        member = models.Member
+        session = self.get_session()
+        score = session.query(member.leader_score).filter(
+            member.id == member_id, member.active == sa.true()).scalar()
+        if score is None:
+            return None
+        return 1 + session.query(sa.func.count(member.id)).filter(
+            member.active == sa.true(),
+            member.leader_score > score).scalar()
+
     def deactivate_member(self, member_id):
         session = self.get_session()
         with session.begin():
@@ -80,31 +373,267 @@ class DBAPI(object):
             member.active = False
         return member
 
-    def add_meeting(self, date):
+    def _insert_members(self, rows, failed):
+        """Insert rows in one transaction, or one by one on conflict."""
+        table = models.Member.__table__
+        try:
+            with self._engine.begin() as conn:
+                conn.execute(table.insert(), [values for _, values in rows])
+            return len(rows)
+        except exc.IntegrityError:
+            # somebody has just added a conflicting member
+            pass
+        inserted = 0
+        for key, values in rows:
+            try:
+                with self._engine.begin() as conn:
+                    conn.execute(table.insert(), values)
+                inserted += 1
+            except exc.IntegrityError as e:
+                failed.append((key, str(e.orig)))
+        return inserted
+
+    def import_members(self, rows, batch_size=250):
+        """Insert members in batches with executemany.
+
+        Rows which conflict with existing members or with each other are
+        skipped, all other rows of the batch are inserted anyway.
+
+        :param rows: an iterable of (key, name, contacts) tuples, key
+            identifies the row in error reports, e.g. a line number
+        :param batch_size: number of rows to insert in one transaction
+        :returns: a tuple of the number of inserted members and a list of
+            (key, reason) of rejected rows
+        """
+        table = models.Member.__table__
+        # compare contacts as they are stored
+        encode = functools.partial(table.c.contacts.type.process_bind_param,
+                                   dialect=None)
+        raw_contacts = sa.type_coerce(table.c.contacts, sa.Text)
+        inserted, failed = 0, []
+        rows = iter(rows)
+        for batch in iter(lambda: list(itertools.islice(rows, batch_size)),
+                          []):
+            names = set(name for _, name, _ in batch)
+            contacts = set(encode(c) for _, _, c in batch)
+            with self._engine.connect() as conn:
+                existing = conn.execute(
+                    sa.select([table.c.name, raw_contacts]).where(
+                        sa.or_(table.c.name.in_(names),
+                               raw_contacts.in_(contacts)))).fetchall()
+            taken_names = set(row[0] for row in existing)
+            taken_contacts = set(row[1] for row in existing)
+
+            accepted = []
+            for key, name, member_contacts in batch:
+                encoded = encode(member_contacts)
+                if name in taken_names:
+                    failed.append(
+                        (key, "Member '%s' already exists." % name))
+                elif encoded in taken_contacts:
+                    failed.append((key, "Contacts %s are already used." %
+                                   encoded))
+                else:
+                    taken_names.add(name)
+                    taken_contacts.add(encoded)
+                    accepted.append((key, {"name": name,
+                                           "contacts": member_contacts}))
+            if accepted:
+                inserted += self._insert_members(accepted, failed)
+        return inserted, failed
+
+    def add_meeting(self, date, recurrence=None):
         meeting = models.Event(type="meeting", datetime=date)
+        if recurrence:
+            meeting.extrafield = {"recurrence": recurrence}
+        session = self.get_session()
         try:
-            self.get_session().add(meeting)
+            with session.begin():
+                session.add(meeting)
         except exc.IntegrityError:
             raise ValueError("%s is already exist." % meeting)
+        return meeting
 
     def get_meetings(self):
         return self.query(models.Event).filter_by(
             type="meeting").all()
 
-    def get_elections(self):
-        return self.query(models.Election).all()
+    def get_meeting(self, meeting_id):
+        meeting = self.query(models.Event).filter_by(
+            type="meeting", id=meeting_id).first()
+        if not meeting:
+            raise ValueError("There is no meeting with id '%s'." %
+                             meeting_id)
+        return meeting
+
+    def update_meeting(self, meeting_id, extrafield):
+        session = self.get_session()
+        with session.begin():
+            updated = self.query(models.Event, session).filter_by(
+                type="meeting", id=meeting_id).update(
+                {"extrafield": extrafield}, synchronize_session=False)
+        if not updated:
+            raise ValueError("There is no meeting with id '%s'." %
+                             meeting_id)
+
+    def get_meetings_version(self):
+        """Obtain a key which is changed when meetings are changed."""
+        event = models.Event
+        # rules of meetings are only extended (by exception dates), so
+        # their total length reflects updates
+        return tuple(self.get_session().query(
+            sa.func.count(event.id), sa.func.max(event.id),
+            sa.func.coalesce(sa.func.sum(sa.func.length(
+                sa.type_coerce(event.extrafield, sa.Text))), 0)).filter(
+            event.type == "meeting").one())
+
+    def _query_elections(self, load=None, columns=None):
+        if columns:
+            election = models.Election
+            try:
+                return self.get_session().query(
+                    *[getattr(election.__table__.c, c) for c in columns])
+            except AttributeError as e:
+                raise ValueError("Election has no column: %s" % e)
+        return self.query(models.Election,
+                          load=ELECTION_LOAD if load is None else load)
+
+    def get_elections(self, load=None, columns=None):
+        """Obtain all elections.
+
+        :param load: strategies of loading relationships, see query(),
+            ELECTION_LOAD by default
+        :param columns: names of columns to obtain rows of them instead of
+            elections
+        """
+        return self._query_elections(load, columns).all()
+
+    def get_election(self, meeting_id, date, load=None, columns=None):
+        """Obtain election for the meeting at the given date."""
+        return self._query_elections(load, columns).filter_by(
+            meeting_id=meeting_id, datetime=date).first()
+
+    def _get_elections_query(self, before=None, since=None):
+        election = models.Election
+        query = self.get_session().query(
+            election.id, election.datetime, election.lucky_man_name,
+            election.meeting_id)
+        if since is not None:
+            query = query.filter(election.datetime >= since)
+        if before is not None:
+            date, election_id = before
+            # the first condition lets sqlite use the index for a range scan
+            query = query.filter(
+                election.datetime <= date,
+                sa.or_(election.datetime < date, election.id < election_id))
+        return query.order_by(election.datetime.desc(), election.id.desc())
+
+    def get_elections_page(self, limit, before=None, since=None):
+        """Obtain elections from the newest to the oldest one.
+
+        Rows are selected with keyset pagination, so the cost of a page does
+        not depend on its depth.
+
+        :param limit: maximum number of elections to return
+        :param before: a tuple of datetime and id of the last election from
+            the previous page
+        :param since: return only elections which start at this datetime
+            or later
+        :returns: a list of (id, datetime, lucky_man_name, meeting_id) rows
+        """
+        return self._get_elections_query(before, since).limit(limit).all()
+
+    def iter_elections(self, limit=None, before=None, since=None,
+                       batch_size=100):
+        """Lazily iterate over elections from the newest to the oldest one.
+
+        The same as get_elections_page, but rows are fetched from the
+        database in batches while the caller consumes them.
+        """
+        query = self._get_elections_query(before, since)
+        if limit is not None:
+            query = query.limit(limit)
+        for row in query.yield_per(batch_size):
+            yield row
+
+    def get_elections_after(self, election_id, limit):
+        """Obtain elections which were saved after the given one.
+
+        :returns: a list of (id, datetime, lucky_man_name, meeting_id) rows
+            ordered by id
+        """
+        election = models.Election
+        query = self.get_session().query(
+            election.id, election.datetime, election.lucky_man_name,
+            election.meeting_id)
+        if election_id is not None:
+            query = query.filter(election.id > election_id)
+        return query.order_by(election.id).limit(limit).all()
+
+    def iter_all_elections(self, batch_size=1000):
+        """Lazily iterate over all elections from the oldest one.
+
+        :returns: (id, datetime, lucky_man_name, meeting_id) rows
+        """
+        election = models.Election
+        query = self.get_session().query(
+            election.id, election.datetime, election.lucky_man_name,
+            election.meeting_id).order_by(election.datetime, election.id)
+        for row in query.yield_per(batch_size):
+            yield row
+
+    def iter_members(self, batch_size=1000):
+        """Lazily iterate over all members ordered by id.
+
+        :returns: (id, name, contacts, active, leader_score) rows
+        """
+        member = models.Member
+        query = self.get_session().query(
+            member.id, member.name, member.contacts, member.active,
+            member.leader_score).order_by(member.id)
+        for row in query.yield_per(batch_size):
+            yield row
+
+    def get_members_page(self, limit, after=None, only_active=False):
+        """Obtain members ordered by id using keyset pagination.
+
+        :param limit: maximum number of members to return
+        :param after: id of the last member from the previous page
+        :param only_active: skip inactive members
+        :returns: a list of (id, name, active, leader_score) rows
+        """
+        member = models.Member
+        query = self.get_session().query(
+            member.id, member.name, member.active, member.leader_score)
+        if after is not None:
+            query = query.filter(member.id > after)
+        if only_active:
+            query = query.filter(member.active == sa.true())
+        return query.order_by(member.id).limit(limit).all()
+
+    def get_last_election_id(self):
+        return self.get_session().query(
+            sa.func.max(models.Election.id)).scalar()
+
+    def get_last_election(self, load=None, columns=None):
+        return self._query_elections(load, columns).order_by(
+            models.Election.id.desc()).first()
 
-    def get_last_election(self):
-        return self.query(models.Election).order_by(
+    def get_last_leader(self):
+        """Obtain the member who was elected last time."""
+        return self.query(models.Member).join(
+            models.Election,
+            models.Election.lucky_man_name == models.Member.name).order_by(
             models.Election.id.desc()).first()
 
     def save_election(self, meeting, date, member_id):
         session = self.get_session()
         with session.begin():
             member = self._get_member(member_id, session=session)
+            # the meeting could be loaded by another session and cached
             election = models.Election(datetime=date,
                                        lucky_man=member,
-                                       meeting=meeting)
+                                       meeting_id=meeting.id)
             session.add(election)
             member.leader_score += 1
         return election
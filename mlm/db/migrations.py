@@ -0,0 +1,131 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Versioned migrations of the database schema.
+
+New databases are created with the latest schema and stamped with the
+latest version. Existing ones are upgraded by `mlm db upgrade`, which
+applies migrations newer than the version in the schema_version table.
+Migrations are idempotent and change rows in batches, each batch in its own
+short transaction, so MLM can keep running. SQLite builds an index with one
+statement, which holds the write lock till the index is built, but readers
+are not blocked in WAL mode.
+"""
+
+import collections
+import datetime as dt
+
+import sqlalchemy as sa
+from sqlalchemy import exc
+
+from mlm.db import models
+
+
+Migration = collections.namedtuple("Migration",
+                                   ["version", "description", "func"])
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register func(engine, batch_size) as the migration to the version."""
+    def _decorator(func):
+        if MIGRATIONS and MIGRATIONS[-1].version >= version:
+            raise ValueError("Migrations should be registered in order.")
+        MIGRATIONS.append(Migration(version, description, func))
+        return func
+    return _decorator
+
+
+def _create_indexes(engine, model, *names):
+    for index in model.__table__.indexes:
+        if index.name in names:
+            index.create(engine, checkfirst=True)
+
+
+@migration(1, "Add indexes of elections by meeting and by date")
+def _add_election_indexes(engine, batch_size):
+    try:
+        _create_indexes(engine, models.Election,
+                        "election_meeting_id_datetime_idx",
+                        "election_datetime_id_idx")
+    except exc.IntegrityError:
+        raise ValueError("There are several elections for the same meeting "
+                         "and date, remove duplicates and try again.")
+
+
+@migration(2, "Fill missing activity and leader scores of members")
+def _fill_members(engine, batch_size):
+    # the leaderboard selects members by 'active = 1' and expects scores
+    member = models.Member.__table__
+    max_id = engine.execute(
+        sa.select([sa.func.max(member.c.id)])).scalar() or 0
+    for start in range(0, max_id, batch_size):
+        in_batch = sa.and_(member.c.id > start,
+                           member.c.id <= start + batch_size)
+        with engine.begin() as conn:
+            conn.execute(member.update().where(sa.and_(
+                in_batch, member.c.active.is_(None))).values(active=True))
+            conn.execute(member.update().where(sa.and_(
+                in_batch, member.c.leader_score.is_(None))).values(
+                leader_score=0))
+
+
+@migration(3, "Add the leaderboard index of members")
+def _add_leaderboard_index(engine, batch_size):
+    _create_indexes(engine, models.Member, "member_active_leader_score_idx")
+
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def get_version(engine):
+    """Obtain the version of the schema, 0 for unversioned databases."""
+    table = models.SchemaVersion.__table__
+    try:
+        return engine.execute(
+            sa.select([sa.func.max(table.c.version)])).scalar() or 0
+    except exc.OperationalError:
+        # the table is created by the first upgrade
+        return 0
+
+
+def stamp(conn, version=LATEST_VERSION):
+    """Record that the schema has the version."""
+    conn.execute(models.SchemaVersion.__table__.insert().prefix_with(
+        "OR IGNORE"), version=version, applied_at=dt.datetime.utcnow())
+
+
+def upgrade(engine, batch_size=1000, log=None):
+    """Apply migrations which are newer than the version of the schema.
+
+    :param log: a function to report progress
+    :returns: a list of applied migrations
+    """
+    # tables which are missing, including schema_version, have nothing to
+    # migrate and are created with the latest schema
+    models.BASE.metadata.create_all(engine)
+    version = get_version(engine)
+    applied = []
+    for m in MIGRATIONS:
+        if m.version <= version:
+            continue
+        if log:
+            log("Migrating to version %s: %s" % (m.version, m.description))
+        m.func(engine, batch_size)
+        with engine.begin() as conn:
+            stamp(conn, m.version)
+        applied.append(m)
+    return applied
@@ -25,6 +25,10 @@ BASE = declarative_base()
 
 class Member(BASE):
     __tablename__ = "member"
+    __table_args__ = (
+        # the leaderboard: top members, ranks and the maximum score
+        sa.Index("member_active_leader_score_idx", "active", "leader_score"),
+    )
 
     id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
     name = sa.Column(sa.String(250), unique=True)
@@ -62,13 +66,20 @@ class Event(BASE):
 
 class Election(BASE):
     __tablename__ = "election"
+    __table_args__ = (
+        sa.Index("election_meeting_id_datetime_idx",
+                 "meeting_id", "datetime", unique=True),
+        # keyset pagination of the history
+        sa.Index("election_datetime_id_idx", "datetime", "id"),
+    )
 
     id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
     datetime = sa.Column(sa.DateTime)
     lucky_man_name = sa.Column(sa.String(250), sa.ForeignKey('member.name'))
-    lucky_man = sa_orm.relationship(Member, lazy='subquery')
+    # DBAPI chooses how to load relationships per call
+    lucky_man = sa_orm.relationship(Member, lazy='select')
     meeting_id = sa.Column(sa.Integer, sa.ForeignKey('event.id'))
-    meeting = sa_orm.relationship(Event, lazy='subquery')
+    meeting = sa_orm.relationship(Event, lazy='select')
 
     @property
     def date(self):
@@ -83,3 +94,11 @@ class Election(BASE):
     def __repr__(self):
         return "<Election for meeting %s; leader: %s>" % (
             self.date, self.lucky_man.name)
+
+
+class SchemaVersion(BASE):
+    """Versions of migrations which are applied to the database."""
+    __tablename__ = "schema_version"
+
+    version = sa.Column(sa.Integer, primary_key=True, autoincrement=False)
+    applied_at = sa.Column(sa.DateTime)
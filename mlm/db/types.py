@@ -21,6 +21,8 @@ class JSONEncodedDict(sa_types.TypeDecorator):
     """Represents an immutable structure as a json-encoded string."""
 
     impl = sa_types.Text
+    # the type has no state, so it is safe to cache statements with it
+    cache_ok = True
 
     def process_bind_param(self, value, dialect):
         if value is not None:
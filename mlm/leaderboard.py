@@ -0,0 +1,112 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import collections
+
+from mlm import selection
+
+
+Entry = collections.namedtuple("Entry", ["rank", "id", "name",
+                                         "leader_score"])
+
+
+class Leaderboard(object):
+    """Active members ordered by leader score, from the highest one.
+
+    Members with the same score share a rank, which is one plus the number
+    of members with a higher score. A Fenwick tree of numbers of members
+    per score answers ranks in O(log max_score), distinct scores are kept
+    sorted, so the maximum score is O(1) and top k members are O(k).
+    """
+
+    def __init__(self, members=()):
+        # id -> (name, score)
+        self._members = {}
+        self._counts_tree = selection.FenwickTree()
+        # distinct scores in ascending order and sorted ids of their members
+        self._scores = []
+        self._ids = {}
+
+        for member in members:
+            self.add(member.id, member.name, member.leader_score)
+
+    def __len__(self):
+        return len(self._members)
+
+    def __contains__(self, member_id):
+        return member_id in self._members
+
+    def _track(self, member_id, score, delta):
+        if score < 0:
+            raise ValueError("Leader score should not be negative.")
+        while len(self._counts_tree) <= score:
+            self._counts_tree.append(0)
+        self._counts_tree.add(score, delta)
+        ids = self._ids.get(score)
+        if delta > 0:
+            if ids is None:
+                ids = self._ids[score] = []
+                bisect.insort(self._scores, score)
+            bisect.insort(ids, member_id)
+        else:
+            ids.pop(bisect.bisect_left(ids, member_id))
+            if not ids:
+                del self._ids[score]
+                self._scores.pop(bisect.bisect_left(self._scores, score))
+
+    def add(self, member_id, name, score):
+        if member_id in self._members:
+            raise ValueError("Member %s is already added." % member_id)
+        self._track(member_id, score, 1)
+        self._members[member_id] = (name, score)
+
+    def remove(self, member_id):
+        name, score = self._members.pop(member_id)
+        self._track(member_id, score, -1)
+
+    def increment(self, member_id, delta=1):
+        """Increase leader score of the member."""
+        name, score = self._members[member_id]
+        self._track(member_id, score, -1)
+        self._track(member_id, score + delta, 1)
+        self._members[member_id] = (name, score + delta)
+
+    def get_max_score(self):
+        """The highest score, None if there are no members."""
+        return self._scores[-1] if self._scores else None
+
+    def get_rank(self, member_id):
+        """Obtain Entry of the member, None if the member is not active."""
+        if member_id not in self._members:
+            return None
+        name, score = self._members[member_id]
+        # members with a higher score
+        higher = len(self._members) - self._counts_tree.prefix(score + 1)
+        return Entry(higher + 1, member_id, name, score)
+
+    def top(self, limit=None):
+        """Generate entries of members with the highest scores.
+
+        Members with the same score are ordered by id.
+        """
+        count = 0
+        for score in reversed(self._scores):
+            rank = count + 1
+            for member_id in self._ids[score]:
+                if count == limit:
+                    return
+                yield Entry(rank, member_id, self._members[member_id][0],
+                            score)
+                count += 1
@@ -0,0 +1,419 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Metrics of MLM processes in Prometheus text format.
+
+Every process records metrics into its own registry. Recording is a lock
+and a few arithmetic operations, so instrumentation is always enabled.
+MLM consists of several processes, so each of them periodically saves a
+snapshot of its registry to a directory (see Exporter), and the webserver
+merges snapshots of all processes on /metrics: counters and histograms are
+summed up, gauges are summed up over processes which are alive.
+"""
+
+import bisect
+import contextlib
+import errno
+import fcntl
+import json
+import os
+import threading
+import timeit
+
+
+# seconds, from a cached page to a slow SMTP server
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1, 2.5, 5, 10)
+
+_ARCHIVE = "archive.json"
+
+
+class _Value(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = value
+
+    def reset(self):
+        self.value = 0
+
+    def dump(self):
+        return self.value
+
+
+class _HistogramValue(object):
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        # the last one is +Inf bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextlib.contextmanager
+    def time(self):
+        started_at = timeit.default_timer()
+        try:
+            yield
+        finally:
+            self.observe(timeit.default_timer() - started_at)
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * len(self.counts)
+            self.sum = 0
+
+    def dump(self):
+        with self._lock:
+            return self.counts + [self.sum]
+
+
+class _Metric(object):
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _new_value(self):
+        return _Value()
+
+    def labels(self, *values):
+        """Obtain the value for the given label values."""
+        try:
+            return self._values[values]
+        except KeyError:
+            if len(values) != len(self.labelnames):
+                raise ValueError("%s expects labels: %s." %
+                                 (self.name, ", ".join(self.labelnames)))
+            with self._lock:
+                return self._values.setdefault(
+                    tuple(str(v) for v in values), self._new_value())
+
+    def reset(self):
+        for value in list(self._values.values()):
+            value.reset()
+
+    def describe(self):
+        return {"type": self.type, "help": self.documentation,
+                "labelnames": list(self.labelnames)}
+
+    def dump(self):
+        return [[list(key), value.dump()]
+                for key, value in list(self._values.items())]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        """Observe duration of the block."""
+        return self.labels().time()
+
+    def describe(self):
+        description = super(Histogram, self).describe()
+        description["buckets"] = list(self.buckets)
+        return description
+
+
+class Registry(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif (type(metric) is not cls or
+                  metric.labelnames != tuple(labelnames)):
+                raise ValueError("Metric %s is already registered with "
+                                 "another type or labels." % name)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames,
+                              buckets=buckets)
+
+    def reset(self):
+        """Forget all recorded values, e.g. ones inherited by fork."""
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+    def snapshot(self):
+        """JSON-serializable state of all metrics."""
+        snapshot = {}
+        for name, metric in list(self._metrics.items()):
+            snapshot[name] = metric.describe()
+            snapshot[name]["samples"] = metric.dump()
+        return snapshot
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+def merge(snapshots, gauges=True):
+    """Sum up values of the same metrics and labels of several snapshots.
+
+    :param gauges: whether to keep gauges, which make no sense for
+        processes which are not alive
+    """
+    result = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            if metric["type"] == "gauge" and not gauges:
+                continue
+            merged = result.setdefault(name, dict(metric, samples=[]))
+            if merged["type"] != metric["type"]:
+                continue
+            samples = dict((tuple(labels), value)
+                           for labels, value in merged["samples"])
+            for labels, value in metric["samples"]:
+                labels = tuple(labels)
+                if labels not in samples:
+                    samples[labels] = value
+                elif isinstance(value, list):
+                    samples[labels] = [a + b for a, b in
+                                       zip(samples[labels], value)]
+                else:
+                    samples[labels] += value
+            merged["samples"] = [[list(labels), value]
+                                 for labels, value in samples.items()]
+    return result
+
+
+def _escape(value):
+    return (value.replace("\\", "\\\\").replace("\n", "\\n")
+            .replace('"', '\\"'))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, _escape(value))
+                             for name, value in pairs)
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value)
+    return str(value)
+
+
+def format_text(snapshot):
+    """Serialize a snapshot in Prometheus text exposition format."""
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        lines.append("# HELP %s %s" % (name, metric["help"].replace(
+            "\\", "\\\\").replace("\n", "\\n")))
+        lines.append("# TYPE %s %s" % (name, metric["type"]))
+        names = metric["labelnames"]
+        for labels, value in sorted(metric["samples"]):
+            if metric["type"] != "histogram":
+                lines.append("%s%s %s" % (name, _format_labels(names, labels),
+                                          _format_value(value)))
+                continue
+            cumulative = 0
+            bounds = metric["buckets"] + [float("inf")]
+            for bound, count in zip(bounds, value):
+                cumulative += count
+                lines.append("%s_bucket%s %s" % (
+                    name, _format_labels(names, labels,
+                                         [("le", _format_value(bound))]),
+                    cumulative))
+            lines.append("%s_sum%s %s" % (name, _format_labels(names, labels),
+                                          _format_value(value[-1])))
+            lines.append("%s_count%s %s" % (
+                name, _format_labels(names, labels), cumulative))
+    return "\n".join(lines) + "\n"
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def remove_snapshots(path):
+    """Remove snapshots which are left by the previous run of MLM."""
+    path = os.path.expanduser(path)
+    if os.path.isdir(path):
+        for filename in os.listdir(path):
+            if filename.endswith((".json", ".tmp")):
+                os.unlink(os.path.join(path, filename))
+
+
+class Exporter(object):
+    """Saves snapshots of the registry of the process to a directory.
+
+    :param path: the directory which is shared by all MLM processes
+    :param name: the name of the process, e.g. 'tasks'
+    :param interval: seconds between snapshots
+    """
+
+    def __init__(self, path, name, interval=5, registry=REGISTRY):
+        self.path = os.path.expanduser(path)
+        self.name = name
+        self.interval = interval
+        self.registry = registry
+        self.pid = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def filename(self):
+        return os.path.join(self.path, "%s-%s.json" % (self.name, self.pid))
+
+    def start(self):
+        """Start saving snapshots from the current process.
+
+        Values inherited from the parent process are dropped, since the
+        parent reports them itself.
+        """
+        self.pid = os.getpid()
+        self.registry.reset()
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def save(self):
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"pid": self.pid, "metrics": self.registry.snapshot()},
+                      f)
+        os.rename(tmp, self.filename)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.save()
+            except (IOError, OSError) as e:
+                print("Error: unable to save metrics: %s" % e)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.save()
+
+    def collect(self):
+        """Merge saved snapshots of all processes, including the current one.
+
+        The current snapshot is saved first and is merged from its file like
+        the others, so every process contributes a snapshot which only grows
+        and counters do not go down when scrapes reach different workers.
+        Snapshots of processes which are not alive anymore are merged into
+        one archive file, so restarted workers do not leave files behind.
+        """
+        if not os.path.isdir(self.path):
+            return merge([self.registry.snapshot()])
+        self.save()
+        with open(os.path.join(self.path, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            snapshots = []
+            dead = []
+            archived = False
+            for filename in sorted(os.listdir(self.path)):
+                if not filename.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(self.path, filename)) as f:
+                        data = json.load(f)
+                except (IOError, ValueError):
+                    continue
+                if filename == _ARCHIVE:
+                    dead.append(data["metrics"])
+                    archived = True
+                elif _is_alive(data["pid"]):
+                    snapshots.append(data["metrics"])
+                else:
+                    dead.append(data["metrics"])
+                    os.unlink(os.path.join(self.path, filename))
+            archive = merge(dead, gauges=False)
+            if len(dead) > int(archived):
+                tmp = os.path.join(self.path, _ARCHIVE + ".tmp")
+                with open(tmp, "w") as f:
+                    json.dump({"pid": None, "metrics": archive}, f)
+                os.rename(tmp, os.path.join(self.path, _ARCHIVE))
+        return merge(snapshots + [archive])
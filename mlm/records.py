@@ -0,0 +1,198 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Reading and writing of flat records as CSV and JSON Lines files.
+
+Records are processed one by one, so files of any size can be handled
+without loading them into memory. Files with '.gz' extension are
+compressed with gzip.
+"""
+
+import collections
+import contextlib
+import csv
+import datetime as dt
+import gzip
+import io
+import json
+import sys
+
+import six
+
+
+FORMATS = ("csv", "jsonl")
+
+_EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl",
+               ".json": "jsonl"}
+
+
+def detect_format(path, fmt=None):
+    """Use the given format or guess it by the file extension."""
+    if fmt:
+        if fmt not in FORMATS:
+            raise ValueError("Unsupported format '%s', use one of: %s." %
+                             (fmt, ", ".join(FORMATS)))
+        return fmt
+    path = path.lower()
+    if is_compressed(path):
+        path = path[:-len(".gz")]
+    for extension, fmt in _EXTENSIONS.items():
+        if path.endswith(extension):
+            return fmt
+    raise ValueError("Unable to detect format of '%s', please specify it "
+                     "explicitly." % path)
+
+
+def is_compressed(path):
+    return path.lower().endswith(".gz")
+
+
+def _get_binary(stream, mode):
+    """Binary stream of stdin or stdout."""
+    buf = getattr(stream, "buffer", None)
+    if buf is None:
+        # files of Python 2 can not be wrapped by io.TextIOWrapper
+        buf = io.open(stream.fileno(), mode, closefd=False)
+    return buf
+
+
+def open_input(path):
+    """Open a text file for reading, '-' stands for stdin."""
+    if path == "-":
+        return io.TextIOWrapper(_get_binary(sys.stdin, "rb"),
+                                encoding="utf-8", newline="")
+    if is_compressed(path):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8",
+                                newline="")
+    return io.open(path, encoding="utf-8", newline="")
+
+
+@contextlib.contextmanager
+def open_output(path, compress=False):
+    """Open a text file for writing, '-' stands for stdout."""
+    stdout = _get_binary(sys.stdout, "wb") if path == "-" else None
+    raw = stdout or io.open(path, "wb")
+    try:
+        stream = gzip.GzipFile(fileobj=raw, mode="wb") if compress else raw
+        f = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        yield f
+        f.flush()
+        # do not let the wrapper close stdout
+        f.detach()
+        if compress:
+            stream.close()
+    finally:
+        if raw is stdout:
+            raw.flush()
+        else:
+            raw.close()
+
+
+def _read_csv(fileobj, errors):
+    if six.PY2:
+        # csv of Python 2 reads only bytes
+        fileobj = (line.encode("utf-8") for line in fileobj)
+    reader = csv.DictReader(fileobj)
+    for record in reader:
+        if None in record:
+            errors.append((reader.line_num, "Too many values."))
+            continue
+        # empty cells are the same as missing ones
+        yield reader.line_num, dict(
+            (_to_text(k).strip(), _to_text(v).strip())
+            for k, v in record.items() if v is not None and v.strip())
+
+
+def _read_jsonl(fileobj, errors):
+    for line_num, line in enumerate(fileobj, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            errors.append((line_num, "Malformed JSON: %s" % e))
+            continue
+        if not isinstance(record, dict):
+            errors.append((line_num, "Record should be a JSON object."))
+            continue
+        yield line_num, record
+
+
+def read_records(fileobj, fmt, errors):
+    """Iterate over (line number, dict) pairs.
+
+    :param fileobj: a text file object
+    :param fmt: one of FORMATS
+    :param errors: a list to append (line number, reason) of malformed
+        records to, they are skipped
+    """
+    if fmt == "csv":
+        return _read_csv(fileobj, errors)
+    return _read_jsonl(fileobj, errors)
+
+
+def _to_text(value):
+    # csv and json of Python 2 produce bytes
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+class _TextWriter(object):
+    """Writes bytes of csv of Python 2 to a text file."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    def write(self, data):
+        return self.fileobj.write(_to_text(data))
+
+
+def _encode(value):
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.isoformat()
+    raise TypeError("%r is not JSON serializable" % value)
+
+
+def _to_csv(value):
+    if isinstance(value, dict):
+        return json.dumps(value)
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.isoformat()
+    if six.PY2 and isinstance(value, six.text_type):
+        # csv of Python 2 writes only bytes
+        return value.encode("utf-8")
+    return value
+
+
+def write_records(fileobj, fmt, fields, rows):
+    """Write rows of values of the fields.
+
+    :param fileobj: a text file object
+    :param fmt: one of FORMATS
+    :param fields: names of the fields
+    :param rows: an iterable of tuples of values
+    :returns: the number of written rows
+    """
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(_TextWriter(fileobj) if six.PY2 else fileobj)
+        writer.writerow(fields)
+        for count, row in enumerate(rows, 1):
+            writer.writerow([_to_csv(value) for value in row])
+    else:
+        for count, row in enumerate(rows, 1):
+            record = collections.OrderedDict(zip(fields, row))
+            fileobj.write(_to_text(json.dumps(record, default=_encode)))
+            fileobj.write(u"\n")
+    return count
@@ -0,0 +1,175 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Recurrence rules of meetings.
+
+A rule is stored in the 'recurrence' key of Event.extrafield, for example:
+
+    {"freq": "monthly", "interval": 1, "setpos": -1,
+     "until": "2017-12-31", "exdates": ["2017-01-27"]}
+
+The datetime of the event is the first occurrence. Weekly meetings repeat
+every `interval` weeks, monthly ones repeat on the `setpos`-th (-1 is the
+last) weekday of every `interval`-th month. Occurrences at `exdates` are
+skipped. Events without a rule are weekly meetings.
+"""
+
+import calendar
+import datetime as dt
+
+from mlm import consts
+
+
+FREQUENCIES = ("weekly", "monthly")
+
+_ORDINALS = {1: "1st", 2: "2nd", 3: "3rd", 4: "4th", -1: "last"}
+
+
+def _parse_date(value):
+    if isinstance(value, dt.datetime):
+        return value.date()
+    if isinstance(value, dt.date):
+        return value
+    try:
+        return dt.datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise ValueError("Wrong date '%s', expected format: YYYY-MM-DD." %
+                         value)
+
+
+def get_setpos(date):
+    """Position of the weekday of the date in its month."""
+    setpos = (date.day - 1) // 7 + 1
+    # the 5th weekday exists not in every month
+    return -1 if setpos == 5 else setpos
+
+
+def nth_weekday(year, month, weekday, setpos):
+    """Find the setpos-th (-1 is the last) weekday of the month."""
+    if setpos == -1:
+        last = calendar.monthrange(year, month)[1]
+        date = dt.date(year, month, last)
+        return date - dt.timedelta(days=(date.weekday() - weekday) % 7)
+    date = dt.date(year, month, 1)
+    return date + dt.timedelta(days=(weekday - date.weekday()) % 7 +
+                               7 * (setpos - 1))
+
+
+def has_rule(event):
+    """Whether the event is not a plain weekly meeting."""
+    return bool((event.extrafield or {}).get("recurrence"))
+
+
+class Recurrence(object):
+    def __init__(self, dtstart, freq="weekly", interval=1, until=None,
+                 setpos=None, exdates=()):
+        if freq not in FREQUENCIES:
+            raise ValueError("Wrong frequency '%s', use one of: %s." %
+                             (freq, ", ".join(FREQUENCIES)))
+        if not isinstance(interval, int) or interval < 1:
+            raise ValueError("Interval should be a positive integer.")
+        if freq == "monthly":
+            if setpos is None:
+                setpos = get_setpos(dtstart)
+            if setpos not in _ORDINALS:
+                raise ValueError("Position of weekday should be one of: "
+                                 "1, 2, 3, 4, -1.")
+        elif setpos is not None:
+            raise ValueError("Position of weekday is used only by monthly "
+                             "meetings.")
+        self.dtstart = dtstart
+        self.freq = freq
+        self.interval = interval
+        self.until = None if until is None else _parse_date(until)
+        self.setpos = setpos
+        self.exdates = frozenset(_parse_date(d) for d in exdates)
+
+    @classmethod
+    def from_event(cls, event):
+        rule = dict((event.extrafield or {}).get("recurrence") or {})
+        return cls(event.datetime, **rule)
+
+    def to_dict(self):
+        """Serialize the rule to be stored in Event.extrafield."""
+        rule = {"freq": self.freq, "interval": self.interval}
+        if self.setpos is not None:
+            rule["setpos"] = self.setpos
+        if self.until is not None:
+            rule["until"] = self.until.isoformat()
+        if self.exdates:
+            rule["exdates"] = sorted(d.isoformat() for d in self.exdates)
+        return rule
+
+    def describe(self):
+        if self.freq == "weekly":
+            text = ("weekly" if self.interval == 1 else
+                    "every %s weeks" % self.interval)
+        else:
+            text = "monthly" if self.interval == 1 else (
+                "every %s months" % self.interval)
+            text += ", %s %s" % (_ORDINALS[self.setpos],
+                                 consts.WEEKDAYS[self.dtstart.weekday()])
+        if self.until is not None:
+            text += " until %s" % self.until.isoformat()
+        if self.exdates:
+            text += " (%s skipped)" % len(self.exdates)
+        return text
+
+    def _iter_weekly(self, after):
+        step = dt.timedelta(weeks=self.interval)
+        # skip periods which ended before `after` without iterating them,
+        # days are divided since Python 2 can not divide timedeltas
+        n = max(0, (after - self.dtstart).days // (7 * self.interval))
+        date = self.dtstart + step * n
+        while True:
+            yield date
+            date += step
+
+    def _iter_monthly(self, after):
+        start = self.dtstart.year * 12 + self.dtstart.month - 1
+        n = max(0, (after.year * 12 + after.month - 1 - start) //
+                self.interval)
+        while True:
+            year, month = divmod(start + n * self.interval, 12)
+            day = nth_weekday(year, month + 1, self.dtstart.weekday(),
+                              self.setpos)
+            yield dt.datetime.combine(day, self.dtstart.time())
+            n += 1
+
+    def iter_after(self, after):
+        """Lazily generate occurrences which start after the given moment.
+
+        Only periods which are not earlier than `after` are expanded, so
+        the cost does not depend on the age of the rule.
+        """
+        if self.freq == "weekly":
+            dates = self._iter_weekly(after)
+        else:
+            dates = self._iter_monthly(after)
+        for date in dates:
+            if self.until is not None and date.date() > self.until:
+                return
+            if (date > after and date >= self.dtstart and
+                    date.date() not in self.exdates):
+                yield date
+
+    def occurs_on(self, day):
+        """Whether the rule, ignoring exceptions, has an occurrence at day."""
+        date = dt.datetime.combine(day, self.dtstart.time())
+        rule = Recurrence(self.dtstart, self.freq, self.interval, self.until,
+                          self.setpos)
+        for occurrence in rule.iter_after(date - dt.timedelta(seconds=1)):
+            return occurrence == date
+        return False
@@ -0,0 +1,144 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import datetime as dt
+import heapq
+import itertools
+
+from mlm import recurrence
+
+
+WEEK = dt.timedelta(days=7)
+
+
+def get_week_offset(date):
+    """Time passed since the beginning of the week (Monday 00:00)."""
+    return dt.timedelta(days=date.weekday(), hours=date.hour,
+                        minutes=date.minute)
+
+
+class ScheduleIndex(object):
+    """Weekly meetings ordered by their time of the week.
+
+    Only the weekday, hour and minute of a meeting matter, so the next
+    meeting after any moment is found by a binary search over offsets from
+    the beginning of the week.
+    """
+
+    def __init__(self, meetings=()):
+        meetings = sorted(meetings, key=lambda m: get_week_offset(m.datetime))
+        self._meetings = meetings
+        self._offsets = [get_week_offset(m.datetime) for m in meetings]
+
+    def __len__(self):
+        return len(self._meetings)
+
+    def next_after(self, now):
+        """Find the first meeting which starts after now.
+
+        :returns: a tuple of the meeting and the datetime of its start
+        """
+        if not self._meetings:
+            raise ValueError("There are no meetings.")
+        week_start = dt.datetime.combine(
+            now.date() - dt.timedelta(days=now.weekday()), dt.time())
+        i = bisect.bisect_right(self._offsets, now - week_start)
+        if i == len(self._offsets):
+            # all meetings of this week have already started
+            i = 0
+            week_start += WEEK
+        return self._meetings[i], week_start + self._offsets[i]
+
+
+class Schedule(object):
+    """Upcoming occurrences of all meetings.
+
+    Plain weekly meetings are answered by ScheduleIndex. Occurrences of
+    meetings with other recurrence rules are generated lazily and cached
+    for `horizon` ahead, so consecutive lookups do not expand the rules
+    again.
+    """
+
+    HORIZON = dt.timedelta(days=91)
+
+    def __init__(self, meetings=(), horizon=None):
+        self.horizon = horizon or self.HORIZON
+        weekly = []
+        self._rules = []
+        for meeting in meetings:
+            if recurrence.has_rule(meeting):
+                self._rules.append(
+                    (meeting, recurrence.Recurrence.from_event(meeting)))
+            else:
+                weekly.append(meeting)
+        self._index = ScheduleIndex(weekly)
+        # all occurrences in (_start, _dates[-1]] in order of their dates
+        self._start = None
+        self._dates = []
+        self._meetings = []
+        self._occurrences = None
+
+    def __len__(self):
+        return len(self._index) + len(self._rules)
+
+    def _reset(self, start):
+        self._start = start
+        self._dates = []
+        self._meetings = []
+        # a rule is the tie breaker for simultaneous occurrences, so
+        # meetings themselves are never compared
+        self._occurrences = heapq.merge(*[
+            zip(rule.iter_after(start), itertools.repeat(i),
+                itertools.repeat(meeting))
+            for i, (meeting, rule) in enumerate(self._rules)])
+
+    def _extend(self, until):
+        for date, _, meeting in self._occurrences:
+            self._dates.append(date)
+            self._meetings.append(meeting)
+            if date > until:
+                break
+
+    def _next_occurrence(self, now):
+        if self._occurrences is None or now < self._start:
+            self._reset(now)
+        i = bisect.bisect_right(self._dates, now)
+        if i == len(self._dates):
+            self._extend(now + self.horizon)
+        if i == len(self._dates):
+            return None
+        if i > len(self._dates) // 2:
+            # forget the past, the cache holds no more than the horizon
+            del self._dates[:i], self._meetings[:i]
+            self._start, i = now, 0
+        return self._meetings[i], self._dates[i]
+
+    def next_after(self, now):
+        """Find the first meeting which starts after now.
+
+        :returns: a tuple of the meeting and the datetime of its start
+        """
+        if not len(self):
+            raise ValueError("There are no meetings.")
+        candidates = []
+        if len(self._index):
+            candidates.append(self._index.next_after(now))
+        if self._rules:
+            occurrence = self._next_occurrence(now)
+            if occurrence is not None:
+                candidates.append(occurrence)
+        if not candidates:
+            raise ValueError("There are no upcoming meetings.")
+        return min(candidates, key=lambda c: c[1])
@@ -0,0 +1,175 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import collections
+import random
+
+
+class FenwickTree(object):
+    """Binary indexed tree over a growing list of numbers."""
+
+    def __init__(self):
+        # 1-based, self._tree[0] is unused
+        self._tree = [0]
+
+    def __len__(self):
+        return len(self._tree) - 1
+
+    def __getitem__(self, node):
+        """Sum of the range which is covered by the node (1-based)."""
+        return self._tree[node]
+
+    def append(self, value):
+        i = len(self._tree)
+        # the new node covers range (i - lowbit(i), i]
+        self._tree.append(value + self.prefix(i - 1) -
+                          self.prefix(i - (i & -i)))
+
+    def add(self, index, delta):
+        """Add delta to the value at index (0-based)."""
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, count):
+        """Sum of the first count values."""
+        result = 0
+        while count > 0:
+            result += self._tree[count]
+            count -= count & -count
+        return result
+
+
+class LeaderSelector(object):
+    """Weighted random choice of the meeting leader.
+
+    The weight of a member is `(max_score + 1 - leader_score) * 10`, where
+    max_score is the maximum score among members who can be elected. Since
+    the weight is a linear function of the score, the selector keeps two
+    Fenwick trees (a number of members and a sum of their scores) instead of
+    the weights themselves, which makes sampling and score updates O(log n).
+    """
+
+    WEIGHT_MULTIPLIER = 10
+
+    def __init__(self, members=()):
+        self._members = []
+        self._positions = {}
+        self._scores = []
+        self._counts_tree = FenwickTree()
+        self._scores_tree = FenwickTree()
+        # distinct scores in ascending order and number of members with them
+        self._distinct_scores = []
+        self._score_counts = collections.Counter()
+
+        for member in members:
+            self.add(member)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, member_id):
+        return member_id in self._positions
+
+    def _track_score(self, score, delta):
+        self._score_counts[score] += delta
+        if delta > 0 and self._score_counts[score] == delta:
+            bisect.insort(self._distinct_scores, score)
+        elif self._score_counts[score] == 0:
+            del self._score_counts[score]
+            self._distinct_scores.pop(
+                bisect.bisect_left(self._distinct_scores, score))
+
+    def add(self, member):
+        if member.id in self._positions:
+            raise ValueError("%s is already added." % member)
+        self._positions[member.id] = len(self._members)
+        self._members.append(member)
+        self._scores.append(member.leader_score)
+        self._counts_tree.append(1)
+        self._scores_tree.append(member.leader_score)
+        self._track_score(member.leader_score, 1)
+
+    def remove(self, member_id):
+        position = self._positions.pop(member_id)
+        score = self._scores[position]
+        self._members[position] = None
+        self._counts_tree.add(position, -1)
+        self._scores_tree.add(position, -score)
+        self._track_score(score, -1)
+
+    def increment(self, member_id, delta=1):
+        """Increase leader score of the member."""
+        position = self._positions[member_id]
+        score = self._scores[position]
+        self._scores[position] = score + delta
+        self._scores_tree.add(position, delta)
+        self._track_score(score, -1)
+        self._track_score(score + delta, 1)
+
+    def get_max_score(self, exclude=None):
+        """Maximum score among members except the excluded one."""
+        scores = self._distinct_scores
+        if exclude in self._positions:
+            score = self._scores[self._positions[exclude]]
+            if score == scores[-1] and self._score_counts[score] == 1:
+                scores = scores[:-1]
+        if not scores:
+            raise ValueError("There are no members to elect.")
+        return scores[-1]
+
+    def _search(self, threshold, max_score):
+        """Find the first member whose cumulative weight reaches threshold."""
+        position, cumulative = 0, 0
+        step = 1 << (len(self._counts_tree).bit_length() - 1)
+        while step:
+            node = position + step
+            if node <= len(self._counts_tree):
+                weight = (self._counts_tree[node] * max_score -
+                          self._scores_tree[node]) * self.WEIGHT_MULTIPLIER
+                if cumulative + weight < threshold:
+                    position = node
+                    cumulative += weight
+            step >>= 1
+        return self._members[position]
+
+    def choose(self, exclude=None, uniform=random.uniform):
+        """Elect a leader.
+
+        :param exclude: ID of a member who should not be elected, usually
+            the previous leader.
+        :param uniform: a function to generate random number in range,
+            `random.uniform` by default.
+        """
+        max_score = self.get_max_score(exclude) + 1
+        excluded = self._positions.get(exclude)
+        if excluded is not None:
+            # temporary drop the member from trees to make its weight zero
+            self._counts_tree.add(excluded, -1)
+            self._scores_tree.add(excluded, -self._scores[excluded])
+        try:
+            total = (self._counts_tree.prefix(len(self._counts_tree)) *
+                     max_score -
+                     self._scores_tree.prefix(len(self._scores_tree)))
+            r = uniform(0, total * self.WEIGHT_MULTIPLIER)
+            # cumulative weights are positive integers, so looking for the
+            # first one which is greater or equal to r picks the first
+            # member with non-zero weight even if r is 0
+            return self._search(max(r, 1), max_score)
+        finally:
+            if excluded is not None:
+                self._counts_tree.add(excluded, 1)
+                self._scores_tree.add(excluded, self._scores[excluded])
@@ -16,6 +16,7 @@
 Command-line interface to MLM
 """
 
+import importlib
 import inspect
 import pkgutil
 import sys
@@ -23,11 +24,37 @@ import sys
 import argparse
 
 import mlm
-from mlm import api
 from mlm import commands
 from mlm.commands import utils
 
 
+def _get_group_modules():
+    """Names of modules with commands, a module per group of commands."""
+    return sorted(name for _, name, _ in pkgutil.iter_modules(
+        commands.__path__) if name != "utils")
+
+
+def _find_group(input_args, modules):
+    """Find the group of commands which is requested by the user."""
+    args = iter(input_args)
+    for arg in args:
+        if arg == "--config-file":
+            next(args, None)
+        elif not arg.startswith("-"):
+            return arg if arg in modules else None
+    return None
+
+
+def _load_groups(modules):
+    groups = []
+    for modname in modules:
+        module = importlib.import_module("mlm.commands.%s" % modname)
+        groups.extend(
+            cls for cls in utils.BaseCommand.__subclasses__()
+            if cls.__module__ == module.__name__)
+    return groups
+
+
 def main(input_args=None):
     if input_args is None:
         input_args = sys.argv[1:]
@@ -46,12 +73,13 @@ def main(input_args=None):
     parser.add_argument('--config-file', type=str, metavar="<file>",
                         help="Path to configuration file.")
 
-    # all subcommands
+    # load only the requested group of commands if it is known, otherwise
+    # all of them are needed for help message
+    modules = _get_group_modules()
+    group = _find_group(input_args, modules)
+
     subcommands = parser.add_subparsers(help='<subcommands>')
-    for importer, modname, _ in pkgutil.iter_modules(commands.__path__):
-        # load all submodules
-        importer.find_module(modname).load_module(modname)
-    for group_cls in utils.BaseCommand.__subclasses__():
+    for group_cls in _load_groups([group] if group else modules):
         group_parser = subcommands.add_parser(
             group_cls.__name__.lower(),
             help=group_cls.__doc__)
@@ -59,7 +87,8 @@ def main(input_args=None):
 
         for name, callback in inspect.getmembers(
                 group_cls(), predicate=inspect.ismethod):
-            command = name.replace('_', '-')
+            # a trailing underscore allows to name commands by keywords
+            command = name.rstrip('_').replace('_', '-')
             desc = callback.__doc__ or ''
             help_message = desc.strip().split('\n')[0]
             arguments = getattr(callback, 'args', [])
@@ -72,6 +101,9 @@ def main(input_args=None):
 
     # parse and run
     args = parser.parse_args(input_args)
+    # API pulls SQLAlchemy in, so it is imported only when it is needed
+    from mlm import api
+
     args.func(api.API(args.config_file), args)
 
 
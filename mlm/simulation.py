@@ -0,0 +1,220 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Monte Carlo simulation of elections to compare selection policies.
+
+Many independent histories (trials) of one team are simulated at once: the
+state of all trials is a matrix of leader scores with a row per trial, so
+every election is a few array operations over all trials instead of a loop
+over them.
+"""
+
+import time
+
+import numpy as np
+
+from mlm import selection
+
+
+class Policy(object):
+    """A way to elect a leader.
+
+    :param allow_repeats: whether the previous leader can be elected again
+    """
+
+    name = None
+
+    def __init__(self, allow_repeats=False):
+        self.allow_repeats = allow_repeats
+
+    def get_weights(self, scores, eligible):
+        """Relative chances of members to be elected.
+
+        :param scores: (trials, members) matrix of leader scores
+        :param eligible: boolean matrix of the same shape, False for members
+            who can not be elected
+        :returns: matrix of weights, non-negative for eligible members with
+            at least one positive in every row; weights of other members
+            are ignored
+        """
+        raise NotImplementedError()
+
+    def __str__(self):
+        return self.name + (" (repeats)" if self.allow_repeats else "")
+
+
+class ScorePolicy(Policy):
+    """The policy of LeaderSelector.
+
+    The weight is `(max_score + 1 - leader_score) * 10`, where max_score is
+    the maximum score among eligible members. With power other than 1 the
+    difference of scores is raised to that power.
+    """
+
+    name = "score"
+
+    def __init__(self, allow_repeats=False, power=1):
+        super(ScorePolicy, self).__init__(allow_repeats)
+        self.power = power
+
+    def get_weights(self, scores, eligible):
+        max_scores = np.where(eligible, scores, -1)
+        max_scores = max_scores.max(axis=1, keepdims=True)
+        weights = (max_scores + 1 - scores).astype(float)
+        if self.power != 1:
+            weights **= self.power
+        return weights * selection.LeaderSelector.WEIGHT_MULTIPLIER
+
+    def __str__(self):
+        name = super(ScorePolicy, self).__str__()
+        if self.power == 1:
+            return name
+        return "%s, power %s" % (name, self.power)
+
+
+class UniformPolicy(Policy):
+    """Every eligible member has the same chance."""
+
+    name = "uniform"
+
+    def get_weights(self, scores, eligible):
+        return np.ones(scores.shape)
+
+
+class LeastElectedPolicy(Policy):
+    """A random member among ones with the lowest score."""
+
+    name = "least"
+
+    def get_weights(self, scores, eligible):
+        min_scores = np.where(eligible, scores, np.iinfo(scores.dtype).max)
+        min_scores = min_scores.min(axis=1, keepdims=True)
+        return (scores == min_scores).astype(float)
+
+
+POLICIES = dict((cls.name, cls)
+                for cls in (ScorePolicy, UniformPolicy, LeastElectedPolicy))
+
+
+def parse_policy(spec):
+    """Make a policy by its spec, e.g. 'uniform' or 'score:power=2,repeats'.
+
+    Options are arguments of the policy class, an option without value is
+    True, 'repeats' stands for 'allow_repeats'.
+    """
+    name, _, options = spec.partition(":")
+    if name not in POLICIES:
+        raise ValueError("Unknown policy '%s', use one of: %s." %
+                         (name, ", ".join(sorted(POLICIES))))
+    kwargs = {}
+    for option in filter(None, options.split(",")):
+        key, sep, value = option.partition("=")
+        key = "allow_repeats" if key == "repeats" else key
+        try:
+            kwargs[key] = float(value) if sep else True
+        except ValueError:
+            raise ValueError("Wrong value of option '%s' of policy '%s'." %
+                             (key, name))
+    try:
+        return POLICIES[name](**kwargs)
+    except TypeError:
+        raise ValueError("Wrong options of policy '%s': %s." %
+                         (name, options))
+
+
+class Result(object):
+    """Fairness metrics of a simulation, averaged over trials.
+
+    :ivar score_variance: variance of leader scores within a team at the end
+    :ivar score_spread: difference between the maximum and minimum scores
+    :ivar longest_gap: the longest number of elections a member waited to be
+        elected (till the end, if the member was not elected again)
+    :ivar max_gap: the longest gap among all trials
+    :ivar repeat_rate: share of elections which elected the previous leader
+    """
+
+    def __init__(self, policy, members, elections, trials, duration,
+                 scores, longest_gaps, repeats):
+        self.policy = policy
+        self.members = members
+        self.elections = elections
+        self.trials = trials
+        self.duration = duration
+        self.score_variance = float(scores.var(axis=1).mean())
+        self.score_spread = float(
+            (scores.max(axis=1) - scores.min(axis=1)).mean())
+        self.longest_gap = float(longest_gaps.mean())
+        self.max_gap = int(longest_gaps.max())
+        self.repeat_rate = float(repeats.sum()) / (trials * elections)
+
+    @property
+    def trials_per_second(self):
+        return self.trials / self.duration if self.duration else 0.0
+
+
+def simulate(policy, members, elections, trials=1000, scores=None,
+             seed=None):
+    """Simulate elections of many teams at once.
+
+    :param policy: an instance of Policy
+    :param members: size of the team
+    :param elections: number of elections in every trial
+    :param trials: number of independent trials
+    :param scores: initial leader scores of members, zeros by default
+    :param seed: a seed to make the result reproducible
+    :returns: an instance of Result
+    """
+    if members < (1 if policy.allow_repeats else 2):
+        raise ValueError("There are not enough members to elect.")
+    started_at = time.time()
+    # RandomState, since NumPy of Python 2 has no default_rng()
+    rng = np.random.RandomState(seed)
+    state = np.zeros((trials, members), dtype=np.int64)
+    if scores is not None:
+        state += np.asarray(scores, dtype=np.int64)
+    rows = np.arange(trials)
+    previous = np.full(trials, -1)
+    # the last election of every member, -1 stands for the start
+    last_elected = np.full((trials, members), -1)
+    longest_gaps = np.zeros(trials, dtype=np.int64)
+    repeats = np.zeros(trials, dtype=np.int64)
+    eligible = np.ones((trials, members), dtype=bool)
+
+    for step in range(elections):
+        eligible[:] = True
+        if not policy.allow_repeats:
+            eligible[rows[previous >= 0], previous[previous >= 0]] = False
+        weights = np.where(eligible, policy.get_weights(state, eligible), 0)
+        cumulative = weights.cumsum(axis=1)
+        thresholds = rng.random_sample(trials) * cumulative[:, -1]
+        # the first member whose cumulative weight is above the threshold,
+        # members with zero weight are never chosen
+        chosen = (cumulative <= thresholds[:, None]).sum(axis=1)
+        # rounding could make a threshold equal to the total weight
+        overflow = chosen == members
+        if overflow.any():
+            chosen[overflow] = cumulative[overflow].argmax(axis=1)
+
+        state[rows, chosen] += 1
+        np.maximum(longest_gaps, step - last_elected[rows, chosen] - 1,
+                   out=longest_gaps)
+        last_elected[rows, chosen] = step
+        repeats += chosen == previous
+        previous = chosen
+
+    np.maximum(longest_gaps, (elections - 1 - last_elected).max(axis=1),
+               out=longest_gaps)
+    return Result(policy, members, elections, trials,
+                  time.time() - started_at, state, longest_gaps, repeats)
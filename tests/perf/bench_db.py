@@ -0,0 +1,79 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Queries per second of DBAPI with and without pooling and SQLite tuning.
+
+Usage: python -m tests.perf.bench_db
+"""
+
+import contextlib
+import datetime as dt
+import itertools
+import shutil
+import tempfile
+
+from mlm.commands import utils
+from tests.perf import utils as perf_utils
+
+
+# settings which were used before connection pooling and tuning
+UNTUNED = {"pool_size": 0, "journal_mode": "DELETE", "synchronous": "FULL",
+           "cache_size": -2000, "mmap_size": 0}
+
+
+@contextlib.contextmanager
+def _no_scope():
+    yield
+
+
+def _read_request(db_api, scoped):
+    with db_api.session_scope() if scoped else _no_scope():
+        db_api.get_last_election()
+        db_api.get_members(only_active=True)
+        db_api.get_members_version()
+
+
+def run(duration=1.0):
+    results = []
+    for title, options, scoped in (("untuned", UNTUNED, False),
+                                   ("tuned", {}, True)):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            db_api = perf_utils.make_db_api(tmp_dir, **options)
+            meeting = db_api.get_meetings()[0]
+            member = db_api.get_members()[0]
+            dates = (dt.datetime(2100, 1, 4, 10, 0) + dt.timedelta(days=7 * i)
+                     for i in itertools.count())
+
+            # each read request executes 3 queries
+            read_qps = 3 * perf_utils.measure(
+                lambda: _read_request(db_api, scoped), duration)
+            write_qps = perf_utils.measure(
+                lambda: db_api.save_election(meeting, next(dates), member.id),
+                duration)
+            results.append((title, "%.0f" % read_qps, "%.0f" % write_qps))
+        finally:
+            shutil.rmtree(tmp_dir)
+    return results
+
+
+def main():
+    print(utils.make_table(run(),
+                           headers=["Settings", "Read QPS", "Write QPS"],
+                           title="DBAPI throughput"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Top 10 members and a rank of a member: sorting of all active members in
+Python vs. queries over the (active, leader_score) index vs. the cached
+leaderboard of API.
+
+Usage: python -m tests.perf.bench_leaderboard
+"""
+
+import random
+import shutil
+import tempfile
+
+from mlm import api
+from mlm.commands import utils
+from mlm.db import api as dbapi
+from mlm.db import models
+from tests.perf import utils as perf_utils
+
+
+MEMBERS = (100, 1000, 10000, 100000)
+TOP = 10
+
+
+def sorted_top(db_api):
+    """The implementation of the index page before the leaderboard."""
+    return sorted(db_api.get_members(only_active=True),
+                  key=lambda o: o.leader_score, reverse=True)[:TOP]
+
+
+def _make_api(tmp_dir, count):
+    db_api = dbapi.DBAPI(perf_utils.make_config(tmp_dir))
+    rnd = random.Random(count)
+    with db_api.get_session().bind.begin() as conn:
+        conn.execute(models.Member.__table__.insert(), [
+            {"name": "member-%s" % i,
+             "contacts": {"email": "member-%s@example.com" % i},
+             "active": rnd.random() > 0.1,
+             "leader_score": rnd.randrange(100)}
+            for i in range(count)])
+    mlm_api = api.API.__new__(api.API)
+    mlm_api._config = db_api._cfg
+    mlm_api._db_api = db_api
+    return mlm_api
+
+
+def run(duration=1.0):
+    results = []
+    for count in MEMBERS:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            mlm_api = _make_api(tmp_dir, count)
+            db_api = mlm_api._db_api
+            member_id = db_api.get_top_members()[count // 20].id
+            # the leaderboard is built once after every change of members
+            mlm_api.get_leaderboard()
+            rates = [
+                perf_utils.measure(lambda: sorted_top(db_api), duration),
+                perf_utils.measure(lambda: db_api.get_top_members(TOP),
+                                   duration),
+                perf_utils.measure(
+                    lambda: list(mlm_api.get_leaderboard().top(TOP)),
+                    duration),
+                perf_utils.measure(lambda: db_api.get_member_rank(member_id),
+                                   duration),
+                perf_utils.measure(
+                    lambda: mlm_api.get_leaderboard().get_rank(member_id),
+                    duration)]
+        finally:
+            shutil.rmtree(tmp_dir)
+        results.append([count] + ["%.0f" % rate for rate in rates])
+    return results
+
+
+def main():
+    print(utils.make_table(
+        run(), headers=["Members", "Sorted top", "Indexed top",
+                        "Cached top", "Indexed rank", "Cached rank"],
+        title="Leaderboard queries per second"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Messages per second delivered to a local SMTP stand-in.
+
+Usage: python -m tests.perf.bench_mail
+"""
+
+import smtplib
+
+from mlm.app import mail
+from mlm.commands import utils
+from tests.perf import utils as perf_utils
+from tests.unit.app import fake_smtp
+
+
+MESSAGE = ("mlm@example.com", "jdoe@example.com",
+           "Subject: [mlm] you are the chosen one\n\nHello, John")
+BATCH = 10
+
+
+def _send_with_new_connection(server_url):
+    server = smtplib.SMTP(server_url)
+    server.login("user", "secret")
+    server.sendmail(*MESSAGE)
+    server.quit()
+
+
+def run(duration=1.0):
+    server = fake_smtp.SMTPServer().start()
+    mailer = mail.Mailer(server.url, login="user", password="secret",
+                         use_tls=False)
+    try:
+        per_message = perf_utils.measure(
+            lambda: _send_with_new_connection(server.url), duration)
+        persistent = perf_utils.measure(
+            lambda: mailer.send(*MESSAGE), duration)
+        batched = BATCH * perf_utils.measure(
+            lambda: mailer.send_many([MESSAGE] * BATCH), duration)
+    finally:
+        mailer.close()
+        server.stop()
+    return [("connection per message", "%.0f" % per_message),
+            ("persistent connection", "%.0f" % persistent),
+            ("persistent, batches of %s" % BATCH, "%.0f" % batched)]
+
+
+def main():
+    print(utils.make_table(run(), headers=["Delivery", "Messages/sec"],
+                           title="SMTP throughput"))
+
+
+if __name__ == "__main__":
+    main()
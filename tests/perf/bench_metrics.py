@@ -0,0 +1,80 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Overhead of metrics: the cost of recording a value and the throughput of
+DB queries with and without instrumentation of the engine.
+
+Usage: python -m tests.perf.bench_metrics
+"""
+
+import shutil
+import tempfile
+
+import sqlalchemy as sa
+
+from mlm.commands import utils
+from mlm import metrics
+from tests.perf import utils as perf_utils
+
+
+_LISTENERS = ("before_cursor_execute", "after_cursor_execute")
+
+
+def _instrument(db_api, enabled):
+    for name in _LISTENERS:
+        listener = getattr(db_api, "_%s_execute" % name.split("_")[0])
+        if enabled:
+            sa.event.listen(db_api._engine, name, listener)
+        elif sa.event.contains(db_api._engine, name, listener):
+            sa.event.remove(db_api._engine, name, listener)
+
+
+def run(duration=1.0):
+    registry = metrics.Registry()
+    counter = registry.counter("counter", "Counter.", ["label"])
+    histogram = registry.histogram("histogram", "Histogram.", ["label"])
+    results = [
+        ("Counter.labels().inc()",
+         perf_utils.measure(lambda: counter.labels("x").inc(), duration)),
+        ("Histogram.labels().observe()",
+         perf_utils.measure(lambda: histogram.labels("x").observe(0.003),
+                            duration)),
+    ]
+    rows = [(title, "%.0f" % (10 ** 9 / rate)) for title, rate in results]
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_api = perf_utils.make_db_api(tmp_dir)
+        rates = {True: 0, False: 0}
+        with db_api.session_scope():
+            # alternate rounds, so the difference is not a warm up
+            for enabled in (False, True) * 3:
+                _instrument(db_api, enabled)
+                rates[enabled] = max(rates[enabled], perf_utils.measure(
+                    db_api.get_members_version, duration / 3))
+    finally:
+        shutil.rmtree(tmp_dir)
+    rows.append(("SQL query, instrumented vs not",
+                 "%.0f" % (10 ** 9 / rates[True] - 10 ** 9 / rates[False])))
+    return rows
+
+
+def main():
+    print(utils.make_table(run(), headers=["Operation", "Cost, ns"],
+                           title="Overhead of metrics"))
+
+
+if __name__ == "__main__":
+    main()
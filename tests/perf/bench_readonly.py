@@ -0,0 +1,106 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Read requests per second of several reader processes, like prefork web
+workers, with read-write and read-only DBAPI, while one more process keeps
+saving elections or while nothing writes.
+
+Usage: python -m tests.perf.bench_readonly
+"""
+
+import datetime as dt
+import itertools
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+from mlm.commands import utils
+from mlm.db import api as dbapi
+from tests.perf import utils as perf_utils
+
+
+READERS = 4
+ELECTIONS = 10000
+
+
+def _read_request(db_api):
+    with db_api.session_scope():
+        db_api.get_last_election()
+        db_api.get_top_members(10)
+        db_api.get_leaderboard_version()
+
+
+def _reader(tmp_dir, read_only, deadline, requests):
+    db_api = dbapi.DBAPI(perf_utils.make_config(tmp_dir),
+                         read_only=read_only)
+    count = 0
+    while time.time() < deadline:
+        _read_request(db_api)
+        count += 1
+    with requests.get_lock():
+        requests.value += count
+
+
+def _writer(tmp_dir, deadline):
+    db_api = dbapi.DBAPI(perf_utils.make_config(tmp_dir))
+    meeting = db_api.get_meetings()[0]
+    member = db_api.get_members()[0]
+    start = db_api.get_last_election().datetime
+    for i in itertools.count(1):
+        if time.time() >= deadline:
+            break
+        db_api.save_election(meeting, start + dt.timedelta(hours=i),
+                             member.id)
+
+
+def _measure(tmp_dir, read_only, writing, duration):
+    requests = multiprocessing.Value("l", 0)
+    deadline = time.time() + duration
+    processes = [multiprocessing.Process(
+        target=_reader, args=(tmp_dir, read_only, deadline, requests))
+        for _ in range(READERS)]
+    if writing:
+        processes.append(multiprocessing.Process(
+            target=_writer, args=(tmp_dir, deadline)))
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    return requests.value / duration
+
+
+def run(duration=3.0):
+    results = []
+    for writing in (False, True):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            perf_utils.make_db_api(tmp_dir, members=100, elections=ELECTIONS)
+            results.append(["with writer" if writing else "no writer"] + [
+                "%.0f" % _measure(tmp_dir, read_only, writing, duration)
+                for read_only in (False, True)])
+        finally:
+            shutil.rmtree(tmp_dir)
+    return results
+
+
+def main():
+    print(utils.make_table(
+        run(), headers=["Load", "Read-write", "Read-only"],
+        title="Read requests per second of %s processes" % READERS))
+
+
+if __name__ == "__main__":
+    main()
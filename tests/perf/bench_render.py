@@ -0,0 +1,81 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Per-message latency of notification mail rendering.
+
+Usage: python -m tests.perf.bench_render
+"""
+
+import os
+import shutil
+import tempfile
+
+import jinja2
+
+import mlm
+from mlm.app import render
+from mlm.commands import utils
+from tests.perf import utils as perf_utils
+
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(mlm.__file__), "app",
+                            "templates")
+TEMPLATE = "email_template.html"
+CONTEXT = {"username": "John Doe", "date": "02.05.16 (Monday) - 10:00 UTC",
+           "email_from": "mlm@example.com", "email_to": "jdoe@example.com"}
+
+
+def _render_uncached():
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+                             trim_blocks=True)
+    return env.get_template(TEMPLATE).render(**CONTEXT)
+
+
+def _render_new_process(cache_dir):
+    # a new process starts with empty in-memory cache
+    render.reset()
+    return render.render(TEMPLATE_DIR, TEMPLATE, bytecode_cache_dir=cache_dir,
+                         **CONTEXT)
+
+
+def run(duration=1.0):
+    cache_dir = tempfile.mkdtemp()
+    try:
+        results = [
+            ("new environment per message",
+             perf_utils.measure(_render_uncached, duration)),
+            ("new process, bytecode cache",
+             perf_utils.measure(lambda: _render_new_process(cache_dir),
+                                duration)),
+        ]
+        render.reset()
+        results.append(
+            ("shared environment",
+             perf_utils.measure(lambda: render.render(TEMPLATE_DIR, TEMPLATE,
+                                                      **CONTEXT),
+                                duration)))
+    finally:
+        render.reset()
+        shutil.rmtree(cache_dir)
+    return [(title, "%.1f" % (10 ** 6 / rate)) for title, rate in results]
+
+
+def main():
+    print(utils.make_table(run(), headers=["Rendering", "Latency, us"],
+                           title="Notification mail rendering"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Bytes sent and latency of REST endpoints for a polling client.
+
+Usage: python -m tests.perf.bench_rest
+"""
+
+import shutil
+import tempfile
+
+from mlm import api
+from mlm.app import rest
+from mlm.commands import utils
+from tests.perf import utils as perf_utils
+
+
+ELECTIONS = 1000
+
+
+def make_client(tmp_dir, elections=ELECTIONS):
+    db_api = perf_utils.make_db_api(tmp_dir, elections=elections)
+    mlm_api = api.API.__new__(api.API)
+    mlm_api._config = db_api._cfg
+    mlm_api._db_api = db_api
+    server = rest.WebServer(mlm_api, db_api._cfg)
+    return server, server.make_app().test_client()
+
+
+def _poll(client, url, headers, conditional, sizes):
+    response = client.get(url, headers=headers)
+    sizes.append(len(response.data))
+    if conditional and response.status_code == 200:
+        headers["If-None-Match"] = response.headers["ETag"]
+
+
+def run(duration=1.0):
+    tmp_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        server, client = make_client(tmp_dir)
+        for url in ("/", "/last_election"):
+            for title, encoding, conditional in (
+                    ("uncompressed", "identity", False),
+                    ("gzip", "gzip", False),
+                    ("conditional, gzip", "gzip", True)):
+                sizes = []
+                headers = {"Accept-Encoding": encoding}
+                rate = perf_utils.measure(
+                    lambda: _poll(client, url, headers, conditional, sizes),
+                    duration)
+                results.append((url, title,
+                                "%.0f" % (sum(sizes) / len(sizes)),
+                                "%.2f" % (1000.0 / rate)))
+    finally:
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def main():
+    print(utils.make_table(
+        run(), headers=["URL", "Client", "Bytes/response", "Latency, ms"],
+        title="Polling of REST endpoints (%s elections)" % ELECTIONS))
+
+
+if __name__ == "__main__":
+    main()
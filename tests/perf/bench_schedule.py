@@ -0,0 +1,112 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Lookup of the next meeting: linear scan over all meetings loaded from the
+database vs. the cached schedule index.
+
+Usage: python -m tests.perf.bench_schedule
+"""
+
+import datetime as dt
+import functools
+import itertools
+import random
+import shutil
+import tempfile
+
+from mlm import api
+from mlm.commands import utils
+from mlm.db import api as dbapi
+from mlm.db import models
+from mlm import schedule
+from tests.perf import utils as perf_utils
+
+
+MEETINGS = (10, 100, 1000, 10000)
+
+
+def linear_next_meeting(meetings, now):
+    """The implementation of API.get_next_meeting before the index."""
+    meetings = sorted(meetings, key=lambda m: m.datetime)
+    current_day = now.weekday()
+    next_meeting = meetings[0]
+    for meeting in meetings:
+        if meeting.datetime.weekday() == current_day:
+            if now.time() < meeting.datetime.time():
+                next_meeting = meeting
+                break
+        elif current_day < meeting.datetime.weekday():
+            next_meeting = meeting
+            break
+    date = now + dt.timedelta(
+        days=(7 - current_day + next_meeting.datetime.weekday()) % 7)
+    date = date.replace(hour=next_meeting.datetime.hour,
+                        minute=next_meeting.datetime.minute,
+                        second=0, microsecond=0)
+    if date <= now:
+        date += dt.timedelta(days=7)
+    return next_meeting, date
+
+
+def _make_api(tmp_dir, count):
+    db_api = dbapi.DBAPI(perf_utils.make_config(tmp_dir))
+    minutes = random.Random(count).sample(range(7 * 24 * 60), count)
+    with db_api.get_session().bind.begin() as conn:
+        conn.execute(models.Event.__table__.insert(), [
+            {"type": "meeting",
+             "datetime": dt.datetime(1970, 1, 5) + dt.timedelta(minutes=m)}
+            for m in minutes])
+    mlm_api = api.API.__new__(api.API)
+    mlm_api._config = db_api._cfg
+    mlm_api._db_api = db_api
+    return mlm_api
+
+
+def run(duration=1.0):
+    results = []
+    rnd = random.Random(0)
+    moments = [dt.datetime(2016, 5, 2) + dt.timedelta(
+        seconds=rnd.randrange(7 * 24 * 3600)) for _ in range(1000)]
+    for count in MEETINGS:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            mlm_api = _make_api(tmp_dir, count)
+            meetings = mlm_api.get_meetings()
+            index = schedule.ScheduleIndex(meetings)
+            now = functools.partial(next, itertools.cycle(moments))
+            rates = [
+                perf_utils.measure(
+                    lambda: linear_next_meeting(meetings, now()), duration),
+                perf_utils.measure(lambda: index.next_after(now()),
+                                   duration),
+                perf_utils.measure(
+                    lambda: linear_next_meeting(
+                        mlm_api._db_api.get_meetings(), now()), duration),
+                perf_utils.measure(mlm_api.get_next_meeting, duration)]
+        finally:
+            shutil.rmtree(tmp_dir)
+        results.append([count] + ["%.0f" % rate for rate in rates])
+    return results
+
+
+def main():
+    print(utils.make_table(
+        run(), headers=["Meetings", "Linear scan", "Index lookup",
+                        "Linear with DB", "Index with DB"],
+        title="Next meeting lookups per second"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Monte Carlo trials per second: replaying LeaderSelector trial by trial vs.
+the vectorized simulation of many trials at once.
+
+Usage: python -m tests.perf.bench_simulation
+"""
+
+import random
+
+from mlm.commands import utils
+from mlm.db import models
+from mlm import selection
+from mlm import simulation
+from tests.perf import utils as perf_utils
+
+
+TEAMS = (5, 10, 50)
+# five years of weekly meetings
+ELECTIONS = 260
+TRIALS = 1000
+
+
+def _selector_trial(members, rnd):
+    selector = selection.LeaderSelector(
+        [models.Member(id=i, name="member-%s" % i, leader_score=0)
+         for i in range(members)])
+    previous = None
+    for _ in range(ELECTIONS):
+        previous = selector.choose(exclude=previous,
+                                   uniform=rnd.uniform).id
+        selector.increment(previous)
+
+
+def run(duration=1.0):
+    results = []
+    rnd = random.Random(0)
+    policy = simulation.ScorePolicy()
+    for members in TEAMS:
+        selector_rate = perf_utils.measure(
+            lambda: _selector_trial(members, rnd), duration)
+        vectorized_rate = TRIALS * perf_utils.measure(
+            lambda: simulation.simulate(policy, members, ELECTIONS, TRIALS),
+            duration)
+        results.append((members, "%.0f" % selector_rate,
+                        "%.0f" % vectorized_rate))
+    return results
+
+
+def main():
+    print(utils.make_table(
+        run(), headers=["Members", "LeaderSelector", "Vectorized"],
+        title="Trials of %s elections per second" % ELECTIONS))
+
+
+if __name__ == "__main__":
+    main()
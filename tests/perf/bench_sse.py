@@ -0,0 +1,131 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Fan-out latency of /events stream to idle clients.
+
+Usage: python -m tests.perf.bench_sse
+"""
+
+import datetime as dt
+import os
+import resource
+import shutil
+import socket
+import tempfile
+import threading
+import timeit
+
+try:
+    import selectors
+except ImportError:
+    # Python 2
+    import selectors2 as selectors
+
+from mlm import api
+from mlm.app import events
+from mlm.app import sse
+from mlm.commands import utils
+from tests.perf import utils as perf_utils
+
+
+CLIENTS = (10, 100, 1000)
+
+
+def _connect(port, count):
+    clients = []
+    for _ in range(count):
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.sendall(b"GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        clients.append(sock)
+    for sock in clients:
+        # skip headers
+        sock.recv(4096)
+        sock.setblocking(False)
+    return clients
+
+
+def _wait_all(clients):
+    selector = selectors.DefaultSelector()
+    for sock in clients:
+        selector.register(sock, selectors.EVENT_READ)
+    left = len(clients)
+    while left:
+        for key, _ in selector.select():
+            if b"event: election" in key.fileobj.recv(4096):
+                selector.unregister(key.fileobj)
+                left -= 1
+    selector.close()
+
+
+def run(duration=1.0):
+    tmp_dir = tempfile.mkdtemp()
+    # each client needs two descriptors in this process
+    limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    results = []
+    try:
+        db_api = perf_utils.make_db_api(tmp_dir)
+        conf = db_api._cfg
+        conf.app._options["events_socket"] = os.path.join(tmp_dir, "sock")
+        mlm_api = api.API.__new__(api.API)
+        mlm_api._config = conf
+        mlm_api._db_api = db_api
+        meeting = db_api.get_meetings()[0]
+        member = db_api.get_members()[0]
+
+        broker = events.Broker(conf.app.events_socket).start()
+        stop = threading.Event()
+        server = sse.EventStream(mlm_api, conf, stop, host="127.0.0.1",
+                                 port=0)
+        server.listen()
+        thread = threading.Thread(target=server.run)
+        thread.start()
+        date = dt.datetime(2100, 1, 4, 10, 0)
+        try:
+            for count in CLIENTS:
+                if count * 2 + 50 > limit:
+                    continue
+                clients = _connect(server.port, count)
+                latencies = []
+                started_at = timeit.default_timer()
+                while timeit.default_timer() - started_at < duration:
+                    date += dt.timedelta(days=7)
+                    t = timeit.default_timer()
+                    mlm_api.save_election(meeting, date, member.id)
+                    _wait_all(clients)
+                    latencies.append(timeit.default_timer() - t)
+                for sock in clients:
+                    sock.close()
+                results.append((count, len(latencies),
+                                "%.2f" % (1000.0 * sum(latencies) /
+                                          len(latencies)),
+                                "%.2f" % (1000.0 * max(latencies))))
+        finally:
+            stop.set()
+            thread.join()
+            broker.stop()
+    finally:
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def main():
+    print(utils.make_table(
+        run(), headers=["Clients", "Elections", "Avg latency, ms",
+                        "Max latency, ms"],
+        title="Delivery of a new election to all /events clients"))
+
+
+if __name__ == "__main__":
+    main()
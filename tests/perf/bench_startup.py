@@ -0,0 +1,116 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Startup time of 'mlm' commands.
+
+Each command is executed in a fresh interpreter, the time of an empty
+interpreter is subtracted. Import overhead is the time of importing MLM
+modules themselves, excluding third-party libraries.
+
+Usage: python -m tests.perf.bench_startup
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+from mlm.commands import utils
+from tests.perf import utils as perf_utils
+
+
+HEAVY_MODULES = ("flask", "jinja2", "sqlalchemy", "tabulate")
+
+COMMANDS = (["--help"], ["members", "list"], ["meeting", "list"])
+
+_SCRIPT = """
+import sys
+from mlm import shell
+try:
+    shell.main(sys.argv[1:])
+except SystemExit:
+    pass
+sys.stderr.write("\\nheavy:" +
+                 ",".join(m for m in %r if m in sys.modules))
+""" % (HEAVY_MODULES,)
+
+
+def _run(args, env, importtime=False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else [])
+    result = subprocess.run(cmd + ["-c", _SCRIPT] + args, env=env,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, check=True)
+    return result.stderr.decode("utf-8")
+
+
+def _get_import_overhead(importtime_output):
+    """Sum of self times of mlm modules, in ms."""
+    total = 0
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_time, _, name = line[len("import time:"):].split("|")
+        if name.strip().split(".")[0] == "mlm":
+            total += int(self_time)
+    return total / 1000.0
+
+
+def _measure(func, repeat):
+    """The best time of func in ms."""
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def run(duration=1.0):
+    tmp_dir = tempfile.mkdtemp()
+    repeat = max(3, int(duration * 5))
+    results = []
+    try:
+        perf_utils.make_db_api(tmp_dir)
+        config_file = os.path.join(tmp_dir, "mlm.ini")
+        with open(config_file, "w") as f:
+            f.write("[db]\nsqlite_file = %s\n" %
+                    os.path.join(tmp_dir, "db.sql"))
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        env = dict(os.environ, PYTHONPATH=root)
+
+        baseline = _measure(
+            lambda: subprocess.run([sys.executable, "-c", "pass"],
+                                   check=True), repeat)
+        for args in COMMANDS:
+            args = ["--config-file", config_file] + args
+            total = _measure(lambda: _run(args, env), repeat)
+            output = _run(args, env, importtime=True)
+            heavy = output.rsplit("heavy:", 1)[1].strip()
+            results.append((" ".join(args[2:]),
+                            "%.1f" % (total - baseline),
+                            "%.1f" % _get_import_overhead(output),
+                            heavy or "-"))
+    finally:
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def main():
+    print(utils.make_table(
+        run(), headers=["Command", "Startup, ms", "MLM imports, ms",
+                        "Heavy modules loaded"],
+        title="Startup of mlm commands"))
+
+
+if __name__ == "__main__":
+    main()
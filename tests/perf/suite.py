@@ -0,0 +1,268 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark suite of the main code paths on synthetic databases.
+
+Every case is timed on databases with different numbers of elections.
+Results are saved as JSON, so runs of different commits can be compared:
+
+    python -m tests.perf.suite run --output before.json
+    git checkout <other commit>
+    python -m tests.perf.suite run --output after.json
+    python -m tests.perf.suite compare before.json after.json
+
+The bench_* modules compare alternative implementations of one path and
+print tables instead.
+"""
+
+import argparse
+import datetime as dt
+import fnmatch
+import itertools
+import json
+import math
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import timeit
+
+from mlm import api
+from mlm.app import rest
+from mlm.app import tasks
+from mlm.commands import utils
+from tests.perf import bench_render
+from tests.perf import utils as perf_utils
+
+
+SIZES = (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+# loading all elections of the largest databases takes minutes
+DEFAULT_SIZES = SIZES[:3]
+MEMBERS = 20
+FORMAT_VERSION = 1
+
+
+class Environment(object):
+    """A synthetic database with all objects which are benchmarked."""
+
+    def __init__(self, tmp_dir, elections):
+        self.db_api = perf_utils.make_db_api(tmp_dir, members=MEMBERS,
+                                             elections=elections)
+        self.api = api.API.__new__(api.API)
+        self.api._config = self.db_api._cfg
+        self.api._db_api = self.db_api
+        self.tasks = tasks.Tasks(self.api, self.db_api._cfg,
+                                 threading.Event())
+        self.server = rest.WebServer(self.api, self.db_api._cfg)
+        self.client = self.server.make_app().test_client()
+        self.meeting = self.db_api.get_meetings()[0]
+        self.member_id = self.db_api.get_members()[0].id
+        # synthetic elections end before 2200
+        self._dates = (dt.datetime(2200, 1, 6, 10, 0) +
+                       dt.timedelta(days=7 * i) for i in itertools.count())
+
+    def save_election(self):
+        self.db_api.save_election(self.meeting, next(self._dates),
+                                  self.member_id)
+
+    def draw(self):
+        """The choice of a leader by Tasks, without saving it."""
+        with self.api.session_scope():
+            selector = self.tasks._get_selector()
+            previous_leader = self.api.get_last_leader()
+            selector.choose(
+                exclude=previous_leader.id if previous_leader else None)
+
+    def render_index(self):
+        self.server._cache.clear()
+        return self.client.get("/")
+
+    def render_html(self):
+        return self.tasks._render_html(bench_render.TEMPLATE_DIR,
+                                       bench_render.TEMPLATE,
+                                       **bench_render.CONTEXT)
+
+
+def get_cases(env):
+    """Pairs of names of benchmarks and functions to time."""
+    return [
+        ("db.get_members", env.db_api.get_members),
+        ("db.get_elections", env.db_api.get_elections),
+        ("db.save_election", env.save_election),
+        ("api.get_next_meeting", env.api.get_next_meeting),
+        ("tasks.draw", env.draw),
+        ("tasks.render_html", env.render_html),
+        ("rest.index", lambda: env.client.get("/")),
+        ("rest.index_uncached", env.render_index),
+    ]
+
+
+def measure(func, duration=1.0, repeat=5):
+    """Time func in `repeat` rounds, at least one call per round.
+
+    :returns: a dict with mean, min and stdev of seconds per call over
+        rounds and the total number of calls
+    """
+    timings = []
+    calls = 0
+    for _ in range(repeat):
+        round_calls = 0
+        started_at = timeit.default_timer()
+        elapsed = 0
+        while elapsed < duration / repeat or not round_calls:
+            func()
+            round_calls += 1
+            elapsed = timeit.default_timer() - started_at
+        timings.append(elapsed / round_calls)
+        calls += round_calls
+    mean = sum(timings) / len(timings)
+    stdev = math.sqrt(sum((t - mean) ** 2 for t in timings) / len(timings))
+    return {"mean": mean, "min": min(timings), "stdev": stdev,
+            "calls": calls}
+
+
+def _get_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes=DEFAULT_SIZES, duration=1.0, patterns=("*",), log=None):
+    """Run benchmarks which match any of patterns.
+
+    :returns: a JSON-serializable dict of results and the environment
+    """
+    results = []
+    for size in sizes:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            env = Environment(tmp_dir, size)
+            for name, func in get_cases(env):
+                if not any(fnmatch.fnmatch(name, p) for p in patterns):
+                    continue
+                result = measure(func, duration)
+                result.update(case=name, elections=size)
+                results.append(result)
+                if log:
+                    log("%-22s %8s elections: %10.3f ms" % (
+                        name, size, result["min"] * 1000))
+        finally:
+            shutil.rmtree(tmp_dir)
+    return {"version": FORMAT_VERSION,
+            "commit": _get_commit(),
+            "created_at": dt.datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "duration": duration,
+            "results": results}
+
+
+def compare(before, after, threshold=0.1):
+    """Compare minimal timings of two runs.
+
+    :returns: rows of the comparison and whether there are regressions,
+        i.e. cases which became slower by more than threshold
+    """
+    old = dict(((r["case"], r["elections"]), r) for r in before["results"])
+    rows = []
+    regressed = False
+    for r in after["results"]:
+        previous = old.get((r["case"], r["elections"]))
+        if previous is None:
+            continue
+        change = r["min"] / previous["min"] - 1
+        status = ""
+        if change > threshold:
+            status = "slower"
+            regressed = True
+        elif change < -threshold:
+            status = "faster"
+        rows.append((r["case"], r["elections"],
+                     "%.3f" % (previous["min"] * 1000),
+                     "%.3f" % (r["min"] * 1000),
+                     "%+.1f%%" % (change * 100), status))
+    return rows, regressed
+
+
+def _load(path):
+    with open(path) as f:
+        results = json.load(f)
+    if results.get("version") != FORMAT_VERSION:
+        raise ValueError("%s has unsupported format." % path)
+    return results
+
+
+def main(input_args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m tests.perf.suite",
+        description=__doc__.strip().split("\n")[0])
+    subparsers = parser.add_subparsers(dest="action")
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser("run", help="Run benchmarks.")
+    run_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+        metavar="<elections>",
+        help="Numbers of elections in databases, up to %s." % SIZES[-1])
+    run_parser.add_argument("--duration", type=float, default=1.0,
+                            metavar="<seconds>",
+                            help="Time to spend on every case.")
+    run_parser.add_argument("--cases", nargs="+", default=["*"],
+                            metavar="<pattern>",
+                            help="Run only cases which match the patterns, "
+                                 "e.g. 'db.*'.")
+    run_parser.add_argument("--output", type=str, metavar="<file>",
+                            help="Save results to JSON file.")
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare results of two runs.")
+    compare_parser.add_argument("before", type=str, metavar="<file>")
+    compare_parser.add_argument("after", type=str, metavar="<file>")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=10, metavar="<percent>",
+        help="Slowdown to report as regression.")
+
+    args = parser.parse_args(input_args)
+    if args.action == "run":
+        results = run(args.sizes, args.duration, args.cases,
+                      log=lambda line: sys.stderr.write(line + "\n"))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+        rows = [(r["case"], r["elections"], "%.3f" % (r["mean"] * 1000),
+                 "%.3f" % (r["min"] * 1000), "%.3f" % (r["stdev"] * 1000),
+                 r["calls"]) for r in results["results"]]
+        print(utils.make_table(
+            rows, headers=["Case", "Elections", "Mean, ms", "Min, ms",
+                           "Stdev, ms", "Calls"],
+            title="Benchmarks of %s" % (results["commit"] or "working tree")))
+        return 0
+
+    before, after = _load(args.before), _load(args.after)
+    rows, regressed = compare(before, after, args.threshold / 100.0)
+    print(utils.make_table(
+        rows, headers=["Case", "Elections", "Before, ms", "After, ms",
+                       "Change", ""],
+        title="%s vs %s" % (before["commit"], after["commit"])))
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime as dt
+import os
+import timeit
+
+from mlm import config
+from mlm.db import api as dbapi
+from mlm.db import models
+
+
+def measure(func, duration=1.0):
+    """Call func for about `duration` seconds, return calls per second."""
+    calls = 0
+    started_at = timeit.default_timer()
+    elapsed = 0
+    while elapsed < duration:
+        func()
+        calls += 1
+        elapsed = timeit.default_timer() - started_at
+    return calls / elapsed
+
+
+def make_config(tmp_dir, **db_options):
+    conf = config.Config()
+    conf.db._options["sqlite_file"] = os.path.join(tmp_dir, "db.sql")
+    conf.db._options.update(db_options)
+    return conf
+
+
+def populate(db_api, members=10, elections=100, chunk_size=10000):
+    """Fill the database with synthetic members and elections."""
+    engine = db_api.get_session().bind
+    first_monday = dt.datetime(1970, 1, 5, 10, 0)
+    start = dt.datetime(2000, 1, 3, 10, 0)
+    # weekly elections of millions would not fit into datetime
+    step = (dt.timedelta(days=7) if elections <= 4000 else
+            dt.timedelta(hours=1))
+    with engine.begin() as conn:
+        conn.execute(models.Event.__table__.insert(),
+                     [{"type": "meeting", "datetime": first_monday}])
+        meeting_id = conn.execute(
+            models.Event.__table__.select()).first().id
+        conn.execute(models.Member.__table__.insert(), [
+            {"name": "member-%s" % i,
+             "contacts": {"email": "member-%s@example.com" % i},
+             "active": True,
+             "leader_score": elections // members}
+            for i in range(members)])
+        for offset in range(0, elections, chunk_size):
+            conn.execute(models.Election.__table__.insert(), [
+                {"datetime": start + step * i,
+                 "lucky_man_name": "member-%s" % (i % members),
+                 "meeting_id": meeting_id}
+                for i in range(offset, min(offset + chunk_size, elections))])
+
+
+def make_db_api(tmp_dir, members=10, elections=100, **db_options):
+    db_api = dbapi.DBAPI(make_config(tmp_dir, **db_options))
+    populate(db_api, members, elections)
+    return db_api
@@ -0,0 +1,118 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Local SMTP stand-in which keeps all received messages in memory."""
+
+import socket
+import threading
+
+from six.moves import socketserver
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(("%s\r\n" % line).encode("utf-8"))
+
+    def _read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline().decode("utf-8").rstrip("\r\n")
+            if line == ".":
+                return "\n".join(lines)
+            lines.append(line[1:] if line.startswith("..") else line)
+
+    def handle(self):
+        self.server.register(self.connection)
+        self._reply("220 localhost fake ESMTP")
+        mail_from, rcpt_to = None, []
+        for line in iter(self.rfile.readline, b""):
+            line = line.decode("utf-8").rstrip("\r\n")
+            command = line[:4].upper()
+            if command == "EHLO":
+                self._reply("250-localhost")
+                self._reply("250 AUTH PLAIN")
+            elif command == "HELO":
+                self._reply("250 localhost")
+            elif command == "AUTH":
+                self._reply("235 Authentication successful")
+            elif command == "MAIL":
+                mail_from = line.split(":", 1)[1].strip().strip("<>")
+                self._reply("250 OK")
+            elif command == "RCPT":
+                address = line.split(":", 1)[1].strip().strip("<>")
+                if address in self.server.refused:
+                    self._reply("550 No such user")
+                else:
+                    rcpt_to.append(address)
+                    self._reply("250 OK")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                self.server.messages.append(
+                    (mail_from, rcpt_to, self._read_data()))
+                mail_from, rcpt_to = None, []
+                self._reply("250 OK")
+            elif command == "RSET":
+                mail_from, rcpt_to = None, []
+                self._reply("250 OK")
+            elif command == "NOOP":
+                self._reply("250 OK")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        socketserver.ThreadingTCPServer.__init__(self, ("127.0.0.1", 0),
+                                                 SMTPHandler)
+        self.messages = []
+        self.refused = set()
+        self.connections = []
+        self._thread = None
+
+    @property
+    def url(self):
+        return "%s:%s" % self.server_address
+
+    def register(self, connection):
+        self.connections.append(connection)
+
+    def drop_connections(self):
+        """Emulate server which closes idle connections."""
+        for connection in self.connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        kwargs={"poll_interval": 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.drop_connections()
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+        self._thread = None
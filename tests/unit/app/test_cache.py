@@ -0,0 +1,63 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import zlib
+
+from mlm.app import cache
+from tests.unit import test
+
+
+class LRUCacheTestCase(test.TestCase):
+    def test_eviction(self):
+        lru = cache.LRUCache(2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        self.assertEqual(1, lru.get("a"))
+
+        lru.set("c", 3)
+
+        self.assertEqual(2, len(lru))
+        self.assertIn("a", lru)
+        self.assertNotIn("b", lru)
+        self.assertIsNone(lru.get("b"))
+
+
+class CachedResponseTestCase(test.TestCase):
+    def test_get_variant(self):
+        body = "<p>%s</p>" % ("leader " * 100)
+        response = cache.CachedResponse(body, state=(1, 2))
+
+        encoding, data = response.get_variant(lambda e: e == "gzip")
+
+        self.assertEqual("gzip", encoding)
+        self.assertEqual(body.encode("utf-8"),
+                         zlib.decompress(data, 16 + zlib.MAX_WBITS))
+        self.assertIs(data, response.get_variant(lambda e: e == "gzip")[1])
+        self.assertEqual((cache.IDENTITY, body.encode("utf-8")),
+                         response.get_variant(lambda e: False))
+
+    def test_tiny_body_is_not_compressed(self):
+        response = cache.CachedResponse("John", state=(1, 2))
+
+        self.assertEqual((cache.IDENTITY, b"John"),
+                         response.get_variant(lambda e: True))
+
+    def test_etag(self):
+        response = cache.CachedResponse("John", state=(1, 2))
+
+        self.assertEqual(response.get_etag(),
+                         cache.CachedResponse("Jane", (1, 2)).get_etag())
+        self.assertNotEqual(response.get_etag(),
+                            cache.CachedResponse("John", (1, 3)).get_etag())
+        self.assertNotEqual(response.get_etag(), response.get_etag("gzip"))
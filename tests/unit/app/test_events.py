@@ -0,0 +1,89 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+import time
+
+from six.moves import queue
+
+from mlm.app import events
+from tests.unit import test
+
+
+class EventsTestCase(test.TestCase):
+    def setUp(self):
+        super(EventsTestCase, self).setUp()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.path = os.path.join(tmp_dir, "events.sock")
+
+    def _start_broker(self):
+        broker = events.Broker(self.path).start()
+        self.addCleanup(lambda: broker._stopped.is_set() or broker.stop())
+        return broker
+
+    def _subscribe(self):
+        received = queue.Queue()
+        subscriber = events.Subscriber(self.path, received.put,
+                                       retry_interval=0.05).start()
+        self.addCleanup(subscriber.stop)
+        self.assertEqual({"event": "connected"}, received.get(timeout=5))
+        return subscriber, received
+
+    def test_publish_without_broker(self):
+        self.assertFalse(events.publish(self.path, "election_created"))
+        self.assertFalse(events.Publisher(self.path).publish("foo"))
+
+    def test_relay(self):
+        self._start_broker()
+        subscriber, received = self._subscribe()
+        other, other_received = self._subscribe()
+        self.assertTrue(subscriber.connected)
+
+        publisher = events.Publisher(self.path)
+        self.addCleanup(publisher.close)
+        self.assertTrue(publisher.publish("election_created", id=1))
+        self.assertTrue(events.publish(self.path, "members_changed"))
+
+        for q in (received, other_received):
+            # messages from different connections could be reordered
+            self.assertEqual(
+                sorted(["election_created", "members_changed"]),
+                sorted(q.get(timeout=5)["event"] for _ in range(2)))
+
+    def test_reconnect(self):
+        broker = self._start_broker()
+        subscriber, received = self._subscribe()
+        publisher = events.Publisher(self.path)
+        self.addCleanup(publisher.close)
+        self.assertTrue(publisher.publish("foo"))
+        self.assertEqual({"event": "foo"}, received.get(timeout=5))
+
+        broker.stop()
+        deadline = time.time() + 5
+        while subscriber.connected and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(subscriber.connected)
+
+        self._start_broker()
+        self.assertEqual({"event": "connected"}, received.get(timeout=5))
+        # publisher reconnects to the new broker as well
+        self.assertTrue(publisher.publish("bar"))
+        self.assertEqual({"event": "bar"}, received.get(timeout=5))
+
+    def test_second_broker(self):
+        self._start_broker()
+        self.assertRaises(RuntimeError, events.Broker(self.path).start)
@@ -0,0 +1,91 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from mlm.app import mail
+from tests.unit.app import fake_smtp
+from tests.unit import test
+
+
+class MailerTestCase(test.TestCase):
+    def setUp(self):
+        super(MailerTestCase, self).setUp()
+        self.server = fake_smtp.SMTPServer().start()
+        self.addCleanup(self.server.stop)
+        self.sleep = mock.Mock()
+        self.mailer = mail.Mailer(self.server.url, login="user",
+                                  password="secret", use_tls=False,
+                                  sleep=self.sleep)
+        self.addCleanup(self.mailer.close)
+
+    def _messages(self, *recipients):
+        return [("mlm@example.com", r, "Hello, %s" % r) for r in recipients]
+
+    def test_send_many_through_one_session(self):
+        failed = self.mailer.send_many(
+            self._messages("a@example.com", "b@example.com"))
+        self.assertEqual([], failed)
+        self.assertTrue(self.mailer.send(*self._messages("c@example.com")[0]))
+
+        self.assertEqual(1, len(self.server.connections))
+        self.assertEqual(
+            [["a@example.com"], ["b@example.com"], ["c@example.com"]],
+            [rcpt_to for _, rcpt_to, _ in self.server.messages])
+        self.assertEqual("Hello, a@example.com", self.server.messages[0][2])
+
+    def test_reconnect_after_server_drops_connection(self):
+        self.mailer.send_many(self._messages("a@example.com"))
+        self.server.drop_connections()
+
+        failed = self.mailer.send_many(self._messages("b@example.com"))
+
+        self.assertEqual([], failed)
+        self.assertEqual(2, len(self.server.connections))
+        self.assertEqual(2, len(self.server.messages))
+
+    @mock.patch("mlm.app.mail.timeit.default_timer")
+    def test_health_check_of_idle_connection(self, mock_timer):
+        mock_timer.return_value = 0
+        self.mailer.send_many(self._messages("a@example.com"))
+        self.server.drop_connections()
+        mock_timer.return_value = mail.Mailer.HEALTH_CHECK_INTERVAL + 1
+
+        failed = self.mailer.send_many(self._messages("b@example.com"))
+
+        self.assertEqual([], failed)
+        self.assertEqual(2, len(self.server.connections))
+        self.assertFalse(self.sleep.called)
+
+    def test_refused_recipient_does_not_break_batch(self):
+        self.server.refused.add("bad@example.com")
+        messages = self._messages("a@example.com", "bad@example.com",
+                                  "b@example.com")
+
+        failed = self.mailer.send_many(messages)
+
+        self.assertEqual([messages[1]], failed)
+        self.assertEqual(2, len(self.server.messages))
+        self.assertEqual(1, len(self.server.connections))
+
+    def test_retries_with_backoff(self):
+        self.server.stop()
+        self.mailer.max_retries = 3
+        messages = self._messages("a@example.com", "b@example.com")
+
+        failed = self.mailer.send_many(messages)
+
+        self.assertEqual(messages, failed)
+        self.assertEqual([mock.call(1), mock.call(2), mock.call(4)],
+                         self.sleep.call_args_list)
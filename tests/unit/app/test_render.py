@@ -0,0 +1,61 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+
+from mlm.app import render
+from tests.unit import test
+
+
+class RenderTestCase(test.TestCase):
+    def setUp(self):
+        super(RenderTestCase, self).setUp()
+        self.addCleanup(render.reset)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.template_dir = os.path.join(self.tmp_dir, "templates")
+        os.mkdir(self.template_dir)
+
+    def _write_template(self, content, mtime):
+        path = os.path.join(self.template_dir, "mail.html")
+        with open(path, "w") as f:
+            f.write(content)
+        os.utime(path, (mtime, mtime))
+
+    def test_environment_is_shared(self):
+        env = render.get_environment(self.template_dir)
+
+        self.assertIs(env, render.get_environment(self.template_dir))
+        self.assertIsNot(env, render.get_environment(self.tmp_dir))
+
+    def test_template_is_reloaded_on_change(self):
+        self._write_template("Hello, {{ name }}", mtime=1000)
+        self.assertEqual("Hello, John", render.render(
+            self.template_dir, "mail.html", name="John"))
+
+        self._write_template("Bye, {{ name }}", mtime=2000)
+        self.assertEqual("Bye, John", render.render(
+            self.template_dir, "mail.html", name="John"))
+
+    def test_bytecode_cache(self):
+        cache_dir = os.path.join(self.tmp_dir, "cache")
+        self._write_template("Hello, {{ name }}", mtime=1000)
+
+        message = render.render(self.template_dir, "mail.html",
+                                bytecode_cache_dir=cache_dir, name="John")
+
+        self.assertEqual("Hello, John", message)
+        self.assertEqual(1, len(os.listdir(cache_dir)))
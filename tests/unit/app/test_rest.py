@@ -0,0 +1,265 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime as dt
+import json
+import os
+import re
+import time
+import zlib
+
+import mock
+from six.moves import queue
+
+from mlm.app import events
+from mlm.app import rest
+from mlm.db import models
+from tests.unit import test
+
+
+class WebServerTestCase(test.DBTestCase):
+    def setUp(self):
+        super(WebServerTestCase, self).setUp()
+        self.server = rest.WebServer(self.api, self.config)
+        self.addCleanup(lambda: self.server._subscriber and
+                        self.server._subscriber.stop())
+        self.client = self.server.make_app().test_client()
+        self.meeting = self._create(
+            models.Event(type="meeting", datetime=dt.datetime(1970, 1, 5)))
+        self.john = self._create_member("John")
+        self.jane = self._create_member("Jane")
+
+    def _elect(self, member, weeks=0):
+        return self.db_api.save_election(
+            self.meeting,
+            dt.datetime(2016, 5, 2, 10, 0) + dt.timedelta(days=7 * weeks),
+            member.id)
+
+    def test_index_without_elections(self):
+        response = self.client.get("/")
+
+        self.assertEqual(200, response.status_code)
+        self.assertIn(b"There is no elections", response.data)
+
+    def test_index(self):
+        self._elect(self.john)
+        self._elect(self.jane, weeks=1)
+
+        response = self.client.get("/")
+
+        self.assertEqual(200, response.status_code)
+        self.assertIn(b"09.05.16 (Monday) - 10:00 UTC", response.data)
+        self.assertIn(b"<b>Jane</b>", response.data)
+
+    def test_index_cache(self):
+        self._elect(self.john)
+        with mock.patch.object(self.server, "_render_index",
+                               wraps=self.server._render_index) as render:
+            first = self.client.get("/").data
+            self.assertEqual(first, self.client.get("/").data)
+            self.assertEqual(1, render.call_count)
+
+            self._elect(self.jane, weeks=1)
+            self.assertNotEqual(first, self.client.get("/").data)
+            self.assertEqual(2, render.call_count)
+
+            self.db_api.deactivate_member(self.john.id)
+            self.client.get("/")
+            self.assertEqual(3, render.call_count)
+
+    def test_state_version_with_events(self):
+        broker = events.Broker(self.config.app.events_socket).start()
+        self.addCleanup(broker.stop)
+        received = queue.Queue()
+        # the second subscriber tells when events are delivered
+        witness = events.Subscriber(self.config.app.events_socket,
+                                    received.put).start()
+        self.addCleanup(witness.stop)
+        self.assertEqual("connected", received.get(timeout=5)["event"])
+        subscriber = self.server._subscribe()
+        deadline = time.time() + 5
+        while not subscriber.connected and time.time() < deadline:
+            time.sleep(0.01)
+
+        with mock.patch.object(self.api, "get_last_election_id",
+                               wraps=self.api.get_last_election_id) as get:
+            self.client.get("/")
+            self.client.get("/")
+            self.assertEqual(1, get.call_count)
+
+            self.api.save_election(self.meeting, dt.datetime(2016, 5, 2),
+                                   self.john.id)
+            self.assertEqual("election_created",
+                             received.get(timeout=5)["event"])
+            # the subscriber of the web server could be a bit slower
+            time.sleep(0.1)
+            self.assertIn(b"John", self.client.get("/").data)
+            self.assertEqual(2, get.call_count)
+
+    def test_metrics(self):
+        self._elect(self.john)
+        self.client.get("/")
+        self.client.get("/api/v1/elections?limit=0")
+
+        response = self.client.get("/metrics")
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        text = response.data.decode()
+        for sample in ('mlm_http_request_seconds_count{handler="index",'
+                       'code="200"} ',
+                       'mlm_http_request_seconds_count{'
+                       'handler="api_elections",code="400"} ',
+                       'mlm_page_render_seconds_count{page="index"} ',
+                       'mlm_db_query_seconds_count{statement="select"} '):
+            self.assertRegex(text, re.escape(sample) + "[1-9]")
+        # the first request starts saving metrics of the process
+        self.assertTrue(os.listdir(self.config.app.metrics_dir))
+
+    def test_last_election(self):
+        self._elect(self.john)
+
+        response = self.client.get("/last_election")
+
+        self.assertIn(b"leader: John", response.data)
+
+    def test_conditional_get(self):
+        self._elect(self.john)
+        etag = self.client.get("/").headers["ETag"]
+
+        response = self.client.get("/", headers={"If-None-Match": etag})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b"", response.data)
+
+        self._elect(self.jane, weeks=1)
+        response = self.client.get("/", headers={"If-None-Match": etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers["ETag"])
+
+    def test_compressed_response(self):
+        self._elect(self.john)
+        plain = self.client.get("/")
+
+        response = self.client.get("/", headers={"Accept-Encoding": "gzip"})
+
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertNotEqual(plain.headers["ETag"], response.headers["ETag"])
+        self.assertEqual(
+            plain.data, zlib.decompress(response.data, 16 + zlib.MAX_WBITS))
+
+    def _get_json(self, url):
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        return json.loads(response.data.decode("utf-8"))
+
+    def test_api_elections_pagination(self):
+        for week in range(5):
+            self._elect(self.john if week % 2 else self.jane, weeks=week)
+
+        page = self._get_json("/api/v1/elections?limit=2")
+        self.assertEqual(["2016-05-30T10:00:00", "2016-05-23T10:00:00"],
+                         [e["datetime"] for e in page["elections"]])
+        self.assertEqual("Jane", page["elections"][0]["leader"])
+
+        dates = []
+        url = "/api/v1/elections?limit=2"
+        while url:
+            page = self._get_json(url)
+            dates.extend(e["datetime"] for e in page["elections"])
+            url = page["next_cursor"] and (
+                "/api/v1/elections?limit=2&cursor=%s" % page["next_cursor"])
+        self.assertEqual(5, len(dates))
+        self.assertEqual(sorted(dates, reverse=True), dates)
+
+    def test_api_elections_since(self):
+        for week in range(3):
+            self._elect(self.john, weeks=week)
+
+        page = self._get_json("/api/v1/elections?since=2016-05-09")
+
+        self.assertEqual(2, len(page["elections"]))
+        self.assertIsNone(page["next_cursor"])
+
+    def test_api_leaderboard(self):
+        self._elect(self.jane)
+        self._elect(self.jane, weeks=1)
+        self._elect(self.john, weeks=2)
+
+        page = self._get_json("/api/v1/leaderboard?limit=1")
+        self.assertEqual({"members": [{"rank": 1, "id": self.jane.id,
+                                       "name": "Jane", "leader_score": 2}],
+                          "max_score": 2, "total": 2}, page)
+        self.assertEqual({"rank": 2, "id": self.john.id, "name": "John",
+                          "leader_score": 1},
+                         self._get_json("/api/v1/members/%s/rank" %
+                                        self.john.id))
+
+        self.db_api.deactivate_member(self.john.id)
+        response = self.client.get("/api/v1/members/%s/rank" % self.john.id)
+        self.assertEqual(404, response.status_code)
+
+    def test_api_wrong_arguments(self):
+        for url in ("/api/v1/elections?limit=0",
+                    "/api/v1/elections?limit=abc",
+                    "/api/v1/elections?since=yesterday",
+                    "/api/v1/elections?cursor=abc",
+                    "/api/v1/members?cursor=WzEsIDJd"):
+            self.assertEqual(400, self.client.get(url).status_code, url)
+
+    def test_api_members(self):
+        self.db_api.deactivate_member(self.john.id)
+
+        page = self._get_json("/api/v1/members?limit=1")
+        self.assertEqual(["John"], [m["name"] for m in page["members"]])
+        page = self._get_json("/api/v1/members?limit=1&cursor=%s" %
+                              page["next_cursor"])
+        self.assertEqual([{"id": self.jane.id, "name": "Jane",
+                           "active": True, "leader_score": 0}],
+                         page["members"])
+        self.assertIsNone(page["next_cursor"])
+
+        page = self._get_json("/api/v1/members?active=true")
+        self.assertEqual(["Jane"], [m["name"] for m in page["members"]])
+
+    def test_history(self):
+        for week in range(7):
+            self._elect(self.john if week % 2 else self.jane, weeks=week)
+
+        response = self.client.get("/history?limit=3")
+
+        self.assertTrue(response.is_streamed)
+        body = response.data.decode("utf-8")
+        self.assertEqual(3, body.count("<tr><td>"))
+        self.assertLess(body.index("13.06.16"), body.index("06.06.16"))
+        self.assertNotIn("23.05.16", body)
+
+        # the link keeps the page size
+        for dates in (["23.05.16", "16.05.16", "09.05.16"], ["02.05.16"]):
+            link = re.search(r'href="(/history\?[^"]*cursor=[^"]+)"',
+                             body).group(1).replace("&amp;", "&")
+            body = self.client.get(link).data.decode("utf-8")
+            self.assertEqual(dates,
+                             re.findall(r"<tr><td>([\d.]+)</td>", body))
+        self.assertNotIn("cursor=", body)
+
+    def test_index_shows_first_page_of_history(self):
+        self.config.app._options["page_size"] = 2
+        for week in range(3):
+            self._elect(self.john, weeks=week)
+
+        body = self.client.get("/").data.decode("utf-8")
+
+        self.assertEqual(2, body.count("<tr><td>"))
+        self.assertIn("/history?limit=2&amp;cursor=", body)
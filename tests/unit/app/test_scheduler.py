@@ -0,0 +1,84 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import threading
+
+from mlm.app import scheduler
+from tests.unit import test
+
+
+class SchedulerTestCase(test.TestCase):
+    def setUp(self):
+        super(SchedulerTestCase, self).setUp()
+        self.scheduler = scheduler.Scheduler()
+        self.now = datetime.datetime.utcnow()
+
+    def _run(self):
+        thread = threading.Thread(target=self.scheduler.run)
+        thread.start()
+        return thread
+
+    def test_run_in_deadline_order(self):
+        calls = []
+        self.scheduler.schedule(self.now + datetime.timedelta(seconds=0.02),
+                                calls.append, "second")
+        self.scheduler.schedule(self.now, calls.append, "first")
+        self.scheduler.schedule(self.now + datetime.timedelta(seconds=0.04),
+                                self.scheduler.stop)
+
+        self.scheduler.run()
+
+        self.assertEqual(["first", "second"], calls)
+
+    def test_failed_job_does_not_stop_worker(self):
+        calls = []
+        self.scheduler.schedule(self.now, int, "not a number")
+        self.scheduler.schedule(self.now, calls.append, "next")
+        self.scheduler.schedule(self.now, self.scheduler.stop)
+
+        self.scheduler.run()
+
+        self.assertEqual(["next"], calls)
+
+    def test_cancel(self):
+        calls = []
+        job = self.scheduler.schedule(self.now, calls.append, "cancelled")
+        self.scheduler.schedule(self.now, self.scheduler.stop)
+        self.scheduler.cancel(job)
+
+        self.scheduler.run()
+
+        self.assertEqual([], calls)
+
+    def test_new_nearest_job_wakes_up_worker(self):
+        done = threading.Event()
+        self.scheduler.schedule(self.now + datetime.timedelta(days=1),
+                                done.set)
+        thread = self._run()
+
+        self.scheduler.schedule(self.now, done.set)
+
+        self.assertTrue(done.wait(5))
+        self.scheduler.stop()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def test_stop_wakes_up_idle_worker(self):
+        thread = self._run()
+
+        self.scheduler.stop()
+
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
@@ -0,0 +1,161 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime as dt
+import json
+import socket
+import threading
+import time
+
+from mlm.app import events
+from mlm.app import sse
+from mlm.db import models
+from tests.unit import test
+
+
+class EventStreamTestCase(test.DBTestCase):
+    def setUp(self):
+        super(EventStreamTestCase, self).setUp()
+        self.meeting = self._create(
+            models.Event(type="meeting", datetime=dt.datetime(1970, 1, 5)))
+        self.john = self._create_member("John")
+
+    def _elect(self, weeks=0):
+        return self.api.save_election(
+            self.meeting,
+            dt.datetime(2016, 5, 2, 10, 0) + dt.timedelta(days=7 * weeks),
+            self.john.id)
+
+    def _start(self, with_broker=True):
+        if with_broker:
+            broker = events.Broker(self.config.app.events_socket).start()
+            self.addCleanup(broker.stop)
+        stop = threading.Event()
+        server = sse.EventStream(self.api, self.config, stop,
+                                 host="127.0.0.1", port=0)
+        server.listen()
+        if with_broker:
+            deadline = time.time() + 5
+            while not server._subscriber.connected:
+                self.assertLess(time.time(), deadline)
+                time.sleep(0.01)
+        thread = threading.Thread(target=server.run)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop.set)
+        return server
+
+    def _connect(self, server, path="/events", headers=""):
+        sock = socket.create_connection(("127.0.0.1", server.port), 5)
+        self.addCleanup(sock.close)
+        sock.sendall(("GET %s HTTP/1.1\r\nHost: localhost\r\n%s\r\n" %
+                      (path, headers)).encode("latin-1"))
+        return sock
+
+    @staticmethod
+    def _read_events(sock, count):
+        data = b""
+        while data.count(b"event: election") < count:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        result = []
+        for block in data.decode("utf-8").split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in block.split("\n")
+                          if line.startswith(("id:", "data:")))
+            if "data" in fields:
+                result.append((int(fields["id"]), json.loads(fields["data"])))
+        return data, result
+
+    def test_new_election(self):
+        server = self._start()
+        sock = self._connect(server)
+        headers = sock.recv(4096)
+        self.assertTrue(headers.startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.assertIn(b"Content-Type: text/event-stream", headers)
+
+        election = self._elect()
+        _, result = self._read_events(sock, 1)
+
+        self.assertEqual([(election.id, {"id": election.id,
+                                         "datetime": "2016-05-02T10:00:00",
+                                         "leader": "John",
+                                         "meeting_id": self.meeting.id})],
+                         result)
+
+    def test_resume(self):
+        first = self._elect()
+        second = self._elect(weeks=1)
+        server = self._start()
+        sock = self._connect(server)
+        sock.recv(4096)
+        third = self._elect(weeks=2)
+        # wait until the server receives the event
+        self._read_events(sock, 1)
+
+        # missed elections are loaded from the database
+        sock = self._connect(server,
+                             headers="Last-Event-ID: %s\r\n" % first.id)
+        _, result = self._read_events(sock, 2)
+        self.assertEqual([second.id, third.id], [i for i, _ in result])
+
+        # recent ones are replayed from memory
+        sock = self._connect(server,
+                             headers="Last-Event-ID: %s\r\n" % second.id)
+        _, result = self._read_events(sock, 1)
+        self.assertEqual([third.id], [i for i, _ in result])
+
+    def test_resume_far_behind(self):
+        elections = [self._elect(weeks=week) for week in range(6)]
+        server = self._start()
+        server.REPLAY_LIMIT = 2
+        sock = self._connect(server)
+        sock.recv(4096)
+        elections.append(self._elect(weeks=6))
+        self._read_events(sock, 1)
+
+        # elections between loaded ones and the history are not skipped
+        sock = self._connect(
+            server, headers="Last-Event-ID: %s\r\n" % elections[0].id)
+        _, result = self._read_events(sock, 6)
+        self.assertEqual([e.id for e in elections[1:]],
+                         [i for i, _ in result])
+
+        # too many of them close the stream, so the client reconnects
+        server.MAX_REPLAY_SIZE = 1
+        sock = self._connect(
+            server, headers="Last-Event-ID: %s\r\n" % elections[0].id)
+        _, result = self._read_events(sock, 6)
+        self.assertEqual([e.id for e in elections[1:3]],
+                         [i for i, _ in result])
+
+    def test_polling_without_broker(self):
+        server = sse.EventStream
+        self.addCleanup(setattr, server, "POLL_INTERVAL",
+                        server.POLL_INTERVAL)
+        server.POLL_INTERVAL = 0.05
+        server = self._start(with_broker=False)
+        sock = self._connect(server)
+        sock.recv(4096)
+
+        election = self._elect()
+        _, result = self._read_events(sock, 1)
+        self.assertEqual([election.id], [i for i, _ in result])
+
+    def test_not_found(self):
+        server = self._start(with_broker=False)
+        sock = self._connect(server, path="/foo")
+        self.assertTrue(sock.recv(4096).startswith(b"HTTP/1.1 404"))
+        self.assertEqual(b"", sock.recv(4096))
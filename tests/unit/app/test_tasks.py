@@ -16,6 +16,7 @@ import datetime
 
 import mock
 
+from mlm.app import render
 from mlm.app import tasks
 from mlm import config
 from mlm.db import models
@@ -27,22 +28,23 @@ class TasksTestCase(test.TestCase):
         super(TasksTestCase, self).setUp()
         self.config = config.Config()
 
-    @mock.patch('mlm.app.tasks.FileSystemLoader.get_source')
+    @mock.patch('mlm.app.render.jinja2.FileSystemLoader.get_source')
     def test_render_template(self, get_source_mock):
+        self.addCleanup(render.reset)
         task = tasks.Tasks(None, self.config, None)
 
         name = "Doe"
         date = "12/12/12"
         filename = "templates/email_template.html"
         get_source_mock.return_value = ("{{ username }} {{ date }}",
-                                        filename, 9999)
+                                        filename, lambda: True)
 
         message = task._render_html("templates", "", username=name, date=date)
         self.assertIn(name, message)
         self.assertIn(date, message)
 
     @mock.patch('mlm.app.tasks.Tasks._render_html')
-    @mock.patch('mlm.app.tasks.smtplib.SMTP')
+    @mock.patch('mlm.app.mail.smtplib.SMTP')
     def test_send_email_notification(self, mock_smtp,
                                      render_template_mock):
         self.config.mail_notification._options["enabled"] = True
@@ -69,3 +71,42 @@ class TasksTestCase(test.TestCase):
         mock_smtp.return_value.sendmail.assert_called_with(
             self.config.mail_notification.email_from,
             lucky_man.contacts["email"], message)
+
+    def test_elect_schedules_next_run(self):
+        api = mock.MagicMock()
+        meeting = models.Event(id=1, type="meeting",
+                               datetime=datetime.datetime(1970, 1, 5, 10))
+        date = datetime.datetime(2016, 5, 2, 10, 0)
+        api.get_next_meeting.return_value = (meeting, date)
+        api.get_election.return_value = None
+        john = models.Member(id=1, name="John", leader_score=1)
+        api.get_members.return_value = [john]
+        api.get_members_version.return_value = (1, 1, 1)
+        api.get_last_leader.return_value = None
+
+        task = tasks.Tasks(api, self.config, None)
+        task.elect()
+
+        api.save_election.assert_called_once_with(meeting, date, john.id)
+        self.assertEqual([api.save_election.return_value],
+                         list(task.election_queue))
+        self.assertEqual((1, 1, 2), task._members_version)
+        self.assertEqual(1, len(task.scheduler))
+        deadline, _, job = task.scheduler._heap[0]
+        self.assertEqual(date + datetime.timedelta(minutes=5), deadline)
+
+    def test_elect_retries_after_failure(self):
+        api = mock.MagicMock()
+        api.get_next_meeting.side_effect = ValueError(
+            "There are no upcoming meetings.")
+
+        task = tasks.Tasks(api, self.config, None)
+        task._selector = mock.Mock()
+        before = datetime.datetime.utcnow()
+        task.elect()
+
+        self.assertIsNone(task._selector)
+        self.assertEqual(1, len(task.scheduler))
+        deadline, _, job = task.scheduler._heap[0]
+        self.assertGreaterEqual(deadline, before + tasks.RETRY_DELAY)
+        self.assertEqual(task.elect, job.func)
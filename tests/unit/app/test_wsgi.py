@@ -0,0 +1,107 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import multiprocessing
+import os
+
+from six.moves import http_client
+
+from mlm.app import wsgi
+from tests.unit import test
+
+
+def application(environ, start_response):
+    if environ["PATH_INFO"] == "/stream":
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return iter([b"first ", b"second"])
+    if environ["PATH_INFO"] == "/echo":
+        body = environ["wsgi.input"].read()
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [body]
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [str(os.getpid()).encode("ascii")]
+
+
+class PreforkServerTestCase(test.TestCase):
+    def _start(self, **kwargs):
+        listener = wsgi.listen("127.0.0.1", 0)
+        self.port = listener.getsockname()[1]
+        server = wsgi.PreforkServer(application, listener, **kwargs)
+        process = multiprocessing.Process(target=server.run)
+        process.start()
+        listener.close()
+        self.addCleanup(process.join, 10)
+        self.addCleanup(process.terminate)
+        return process
+
+    def _connect(self):
+        return http_client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+
+    def _get(self, connection, url="/", **kwargs):
+        connection.request("GET", url, **kwargs)
+        response = connection.getresponse()
+        return response, response.read()
+
+    def test_keepalive(self):
+        self._start(workers=1, keepalive=5)
+        connection = self._connect()
+
+        response, first_pid = self._get(connection)
+        self.assertEqual(200, response.status)
+        sock = connection.sock
+        response, second_pid = self._get(connection)
+
+        self.assertIs(sock, connection.sock)
+        self.assertEqual(first_pid, second_pid)
+        self.assertEqual(str(len(first_pid)),
+                         response.getheader("Content-Length"))
+
+    def test_chunked_response(self):
+        self._start(workers=1)
+        connection = self._connect()
+
+        response, body = self._get(connection, "/stream")
+
+        self.assertEqual("chunked", response.getheader("Transfer-Encoding"))
+        self.assertEqual(b"first second", body)
+        # the connection is still usable
+        self.assertEqual(200, self._get(connection)[0].status)
+
+    def test_request_body(self):
+        self._start(workers=1)
+        connection = self._connect()
+
+        connection.request("POST", "/echo", body=b"hello")
+        self.assertEqual(b"hello", connection.getresponse().read())
+
+    def test_workers_are_recycled(self):
+        self._start(workers=1, max_requests=2)
+
+        pids = []
+        for _ in range(4):
+            response, pid = self._get(self._connect())
+            pids.append(pid)
+
+        self.assertEqual(pids[0], pids[1])
+        self.assertEqual(pids[2], pids[3])
+        self.assertNotEqual(pids[0], pids[2])
+
+    def test_graceful_stop(self):
+        process = self._start(workers=2)
+        self.assertEqual(200, self._get(self._connect())[0].status)
+
+        process.terminate()
+        process.join(10)
+
+        self.assertEqual(0, process.exitcode)
@@ -0,0 +1,270 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime as dt
+
+import mock
+from sqlalchemy import exc
+
+from mlm.db import api as dbapi
+from mlm.db import models
+from tests.unit import test
+
+
+class DBAPITestCase(test.DBTestCase):
+    def setUp(self):
+        super(DBAPITestCase, self).setUp()
+        self.meeting = self._create(
+            models.Event(type="meeting", datetime=dt.datetime(1970, 1, 5)))
+        self.date = dt.datetime(2016, 5, 2, 10, 0)
+
+    def test_get_election(self):
+        member = self._create_member("John")
+        self.db_api.save_election(self.meeting, self.date, member.id)
+
+        election = self.db_api.get_election(self.meeting.id, self.date)
+        self.assertEqual(self.date, election.datetime)
+        self.assertEqual("John", election.lucky_man.name)
+        self.assertIsNone(self.db_api.get_election(
+            self.meeting.id, self.date + dt.timedelta(days=7)))
+
+    def test_get_election_load(self):
+        member = self._create_member("John")
+        self.db_api.save_election(self.meeting, self.date, member.id)
+
+        election = self.db_api.get_election(
+            self.meeting.id, self.date,
+            load={"lucky_man": "raise", "meeting": "joined"})
+        self.assertEqual(self.meeting.id, election.meeting.id)
+        self.assertRaises(exc.InvalidRequestError, getattr, election,
+                          "lucky_man")
+
+        self.assertEqual([(self.date, "John")], self.db_api.get_elections(
+            columns=["datetime", "lucky_man_name"]))
+        self.assertRaises(ValueError, self.db_api.get_elections,
+                          columns=["leader"])
+        self.assertRaises(ValueError, self.db_api.get_elections,
+                          load={"lucky_man": "eager"})
+        self.assertRaises(ValueError, self.db_api.get_elections,
+                          load={"leader": "joined"})
+
+    def test_save_election_twice(self):
+        member = self._create_member("John")
+        self.db_api.save_election(self.meeting, self.date, member.id)
+
+        self.assertRaises(exc.IntegrityError, self.db_api.save_election,
+                          self.meeting, self.date, member.id)
+
+    def test_get_last_leader(self):
+        self.assertIsNone(self.db_api.get_last_leader())
+
+        john, jane = self._create_member("John"), self._create_member("Jane")
+        self.db_api.save_election(self.meeting, self.date, jane.id)
+        self.db_api.save_election(
+            self.meeting, self.date + dt.timedelta(days=7), john.id)
+
+        self.assertEqual(john.id, self.db_api.get_last_leader().id)
+
+    def test_get_members_version(self):
+        self.assertEqual((0, None, 0), self.db_api.get_members_version())
+
+        john = self._create_member("John")
+        self._create_member("Jane", active=False, leader_score=3)
+        version = self.db_api.get_members_version()
+        self.assertEqual((1, john.id, 0), version)
+
+        self.db_api.save_election(self.meeting, self.date, john.id)
+        self.assertEqual((1, john.id, 1), self.db_api.get_members_version())
+
+    def test_leaderboard(self):
+        self.assertEqual([], self.db_api.get_top_members())
+        self.assertIsNone(self.db_api.get_max_score())
+
+        john, jane, jack = [self._create_member(name)
+                            for name in ("John", "Jane", "Jack")]
+        for i, member in enumerate((jane, jack, jack)):
+            self.db_api.save_election(self.meeting,
+                                      self.date + dt.timedelta(days=7 * i),
+                                      member.id)
+        self.db_api.deactivate_member(john.id)
+
+        self.assertEqual([(jack.id, "Jack", 2), (jane.id, "Jane", 1)],
+                         self.db_api.get_top_members())
+        self.assertEqual([jack.id],
+                         [m.id for m in self.db_api.get_top_members(1)])
+        self.assertEqual(2, self.db_api.get_max_score())
+        self.assertEqual(2, self.db_api.get_member_rank(jane.id))
+        last_election_id = self.db_api.get_last_election_id()
+        self.assertEqual((last_election_id, jack.id, 1),
+                         self.db_api.get_leaderboard_version())
+        self.assertIsNone(self.db_api.get_member_rank(john.id))
+
+    def test_add_member(self):
+        self.db_api.add_member("John", {"email": "jdoe@example.com"})
+
+        members = self.db_api.get_members()
+        self.assertEqual(["John"], [m.name for m in members])
+        self.assertEqual({"email": "jdoe@example.com"}, members[0].contacts)
+
+    def test_import_members(self):
+        self._create_member("John")
+        rows = [(1, "Jane", {"email": "jane@example.com"}),
+                (2, "John", {"email": "other@example.com"}),
+                (3, "Bob", {"email": "John@example.com"}),
+                (4, "Ann", {"email": "jane@example.com"}),
+                (5, "Jane", {"email": "jane2@example.com"}),
+                (6, "Bob", {"email": "bob@example.com"})]
+
+        inserted, failed = self.db_api.import_members(iter(rows),
+                                                      batch_size=2)
+
+        self.assertEqual(2, inserted)
+        self.assertEqual([2, 3, 4, 5], sorted(key for key, _ in failed))
+        members = dict((m.name, m) for m in self.db_api.get_members())
+        self.assertEqual(["Bob", "Jane", "John"], sorted(members))
+        self.assertEqual({"email": "bob@example.com"},
+                         members["Bob"].contacts)
+        self.assertEqual(0, members["Bob"].leader_score)
+        self.assertTrue(members["Bob"].active)
+
+    def test_import_members_race(self):
+        rows = [(1, "Jane", {"email": "jane@example.com"}),
+                (2, "John", {"email": "john@example.com"})]
+        insert = self.db_api._insert_members
+
+        def insert_members(accepted, failed):
+            # another process adds a member between the check and insert
+            self._create_member("John")
+            return insert(accepted, failed)
+
+        self.db_api._insert_members = insert_members
+        inserted, failed = self.db_api.import_members(rows)
+
+        self.assertEqual(1, inserted)
+        self.assertEqual([2], [key for key, _ in failed])
+        self.assertIn("UNIQUE", failed[0][1])
+
+    def test_iter_all_elections(self):
+        member = self._create_member("John")
+        for weeks in (2, 0, 1):
+            self.db_api.save_election(
+                self.meeting, self.date + dt.timedelta(days=7 * weeks),
+                member.id)
+
+        rows = list(self.db_api.iter_all_elections(batch_size=2))
+
+        self.assertEqual([self.date + dt.timedelta(days=7 * weeks)
+                          for weeks in range(3)],
+                         [row.datetime for row in rows])
+        self.assertEqual(["John"] * 3, [row.lucky_man_name for row in rows])
+
+    def test_iter_members(self):
+        self._create_member("John")
+        self._create_member("Jane", active=False)
+
+        rows = list(self.db_api.iter_members(batch_size=1))
+
+        self.assertEqual([("John", {"email": "John@example.com"}, True),
+                          ("Jane", {"email": "Jane@example.com"}, False)],
+                         [(r.name, r.contacts, r.active) for r in rows])
+
+    def test_get_meetings_version(self):
+        version = self.db_api.get_meetings_version()
+        self.assertEqual((1, self.meeting.id, 0), version)
+
+        meeting = self.db_api.add_meeting(dt.datetime(1970, 1, 6, 10, 0))
+        self.assertNotEqual(version, self.db_api.get_meetings_version())
+        version = self.db_api.get_meetings_version()
+
+        self.db_api.update_meeting(meeting.id, {"recurrence": {
+            "freq": "weekly", "interval": 1, "exdates": ["1970-01-13"]}})
+        self.assertNotEqual(version, self.db_api.get_meetings_version())
+        self.assertEqual(["1970-01-13"], self.db_api.get_meeting(
+            meeting.id).extrafield["recurrence"]["exdates"])
+
+    def test_update_missing_meeting(self):
+        self.assertRaises(ValueError, self.db_api.update_meeting, 42, {})
+        self.assertRaises(ValueError, self.db_api.get_meeting, 42)
+
+    def test_session_scope(self):
+        with self.db_api.session_scope() as session:
+            self.assertIs(session, self.db_api.get_session())
+            with self.db_api.session_scope() as nested_session:
+                self.assertIs(session, nested_session)
+            self.assertIs(session, self.db_api.get_session())
+
+        self.assertIsNot(session, self.db_api.get_session())
+
+    @mock.patch("mlm.db.api.print", create=True)
+    def test_session_scope_query_budget(self, mock_print):
+        self.config.db._options["debug"] = True
+        self.config.db._options["query_budget"] = 3
+        db_api = dbapi.DBAPI(self.config)
+        members = [self._create_member(name)
+                   for name in ("John", "Jane", "Jack")]
+        for i, member in enumerate(members):
+            db_api.save_election(self.meeting,
+                                 self.date + dt.timedelta(days=7 * i),
+                                 member.id)
+
+        with db_api.session_scope("index"):
+            db_api.get_elections()
+            self.assertEqual(1, db_api.get_query_stats().count)
+        self.assertIsNone(db_api.get_query_stats())
+        self.assertFalse(mock_print.called)
+
+        # N+1 queries
+        with db_api.session_scope("index"):
+            elections = db_api.get_elections(load={"lucky_man": "lazy"})
+            self.assertEqual(["John", "Jane", "Jack"],
+                             [e.lucky_man.name for e in elections])
+        self.assertEqual(2, mock_print.call_count)
+        budget, repeated = [c[0][0] for c in mock_print.call_args_list]
+        self.assertEqual("Warning: index executed 4 SQL statements, "
+                         "the budget is 3.", budget)
+        self.assertIn("executed the same SQL statement 3 times", repeated)
+
+    def test_read_only(self):
+        member = self._create_member("John")
+        ro_api = dbapi.DBAPI(self.config, read_only=True)
+
+        with ro_api.session_scope() as session:
+            self.assertEqual(1, session.execute("PRAGMA query_only").scalar())
+            self.assertEqual(["John"], [m.name for m in ro_api.get_members()])
+            self.assertRaises(exc.OperationalError, ro_api.save_election,
+                              self.meeting, self.date, member.id)
+        # changes of the writer are visible
+        self.db_api.save_election(self.meeting, self.date, member.id)
+        self.assertEqual("John", ro_api.get_last_election().lucky_man.name)
+
+    @mock.patch("mlm.db.api.six.PY2", True)
+    def test_read_only_py2(self):
+        member = self._create_member("John")
+        ro_api = dbapi.DBAPI(self.config, read_only=True)
+
+        self.assertEqual(self.db_api.connection_str, str(ro_api._engine.url))
+        with ro_api.session_scope() as session:
+            self.assertEqual(1, session.execute("PRAGMA query_only").scalar())
+            self.assertRaises(exc.OperationalError, ro_api.save_election,
+                              self.meeting, self.date, member.id)
+
+    def test_sqlite_pragmas(self):
+        with self.db_api.session_scope() as session:
+            self.assertEqual("wal", session.execute(
+                "PRAGMA journal_mode").scalar())
+            # NORMAL
+            self.assertEqual(1, session.execute(
+                "PRAGMA synchronous").scalar())
+            self.assertEqual(self.config.db.cache_size, session.execute(
+                "PRAGMA cache_size").scalar())
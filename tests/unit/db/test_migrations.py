@@ -0,0 +1,93 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime as dt
+
+import mock
+import sqlalchemy as sa
+from sqlalchemy import schema
+
+from mlm.db import api as dbapi
+from mlm.db import migrations
+from mlm.db import models
+from tests.unit import test
+
+
+class MigrationsTestCase(test.DBTestCase):
+    def setUp(self):
+        super(MigrationsTestCase, self).setUp()
+        self.config.db._options["sqlite_file"] += ".old"
+        # tables of the first release, without indexes and versions
+        engine = sa.create_engine("sqlite:///%s" %
+                                  self.config.db.sqlite_file)
+        with engine.begin() as conn:
+            for name in ("member", "event", "election"):
+                conn.execute(schema.CreateTable(
+                    models.BASE.metadata.tables[name]))
+            conn.execute("INSERT INTO member (name, contacts) VALUES "
+                         "('John', '{}'), ('Jane', '[]')")
+        engine.dispose()
+
+    def _get_indexes(self, db_api, table):
+        return set(row[1] for row in db_api.get_session().execute(
+            "PRAGMA index_list(%s)" % table) if row[1].endswith("_idx"))
+
+    def test_new_database_is_stamped(self):
+        self.assertEqual(migrations.LATEST_VERSION,
+                         self.db_api.get_schema_version())
+        self.assertEqual([], self.db_api.upgrade())
+
+    @mock.patch("mlm.db.models.BASE.metadata.create_all")
+    def test_existing_database_is_not_created(self, mock_create_all):
+        dbapi.DBAPI(self.config)
+
+        self.assertFalse(mock_create_all.called)
+
+    def test_upgrade(self):
+        db_api = dbapi.DBAPI(self.config)
+        self.assertEqual(0, db_api.get_schema_version())
+        log = mock.Mock()
+
+        applied = db_api.upgrade(batch_size=1, log=log)
+
+        self.assertEqual([m.version for m in migrations.MIGRATIONS],
+                         [m.version for m in applied])
+        self.assertEqual(len(applied), log.call_count)
+        self.assertEqual(migrations.LATEST_VERSION,
+                         db_api.get_schema_version())
+        self.assertEqual(set(["election_meeting_id_datetime_idx",
+                              "election_datetime_id_idx"]),
+                         self._get_indexes(db_api, "election"))
+        self.assertEqual(set(["member_active_leader_score_idx"]),
+                         self._get_indexes(db_api, "member"))
+        self.assertEqual([("John", 0), ("Jane", 0)],
+                         [(m.name, m.leader_score)
+                          for m in db_api.get_top_members()])
+        self.assertEqual([], db_api.upgrade())
+
+    def test_upgrade_duplicate_elections(self):
+        db_api = dbapi.DBAPI(self.config)
+        session = db_api.get_session()
+        with session.begin():
+            meeting = models.Event(type="meeting",
+                                   datetime=dt.datetime(1970, 1, 5))
+            session.add(meeting)
+            session.flush()
+            for _ in range(2):
+                session.add(models.Election(datetime=dt.datetime(2016, 5, 2),
+                                            lucky_man_name="John",
+                                            meeting_id=meeting.id))
+
+        self.assertRaises(ValueError, db_api.upgrade)
+        self.assertEqual(0, db_api.get_schema_version())
@@ -12,10 +12,52 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import mock
+import os
+import shutil
+import tempfile
 import unittest
 
+import mock
+
+from mlm import api
+from mlm import config
+from mlm.db import api as dbapi
+from mlm.db import models
+
 
 class TestCase(unittest.TestCase):
     def setUp(self):
         self.addCleanup(mock.patch.stopall)
+
+
+class DBTestCase(TestCase):
+    """Test case with DBAPI bound to a temporary sqlite file."""
+
+    def setUp(self):
+        super(DBTestCase, self).setUp()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+
+        self.config = config.Config()
+        self.config.db._options["sqlite_file"] = os.path.join(tmp_dir,
+                                                              "db.sql")
+        self.config.app._options["events_socket"] = os.path.join(
+            tmp_dir, "events.sock")
+        self.config.app._options["metrics_dir"] = os.path.join(tmp_dir,
+                                                               "metrics")
+        # exporters of tests should not save into removed directories
+        self.config.app._options["metrics_interval"] = 3600
+        self.db_api = dbapi.DBAPI(self.config)
+        self.api = api.API.__new__(api.API)
+        self.api._config = self.config
+        self.api._db_api = self.db_api
+
+    def _create(self, *objects):
+        session = self.db_api.get_session()
+        with session.begin():
+            session.add_all(objects)
+        return objects[0] if len(objects) == 1 else objects
+
+    def _create_member(self, name, **kwargs):
+        kwargs.setdefault("contacts", {"email": "%s@example.com" % name})
+        return self._create(models.Member(name=name, **kwargs))
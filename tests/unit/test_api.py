@@ -12,8 +12,182 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime as dt
+
+import mock
+
+from mlm import api
+from mlm.db import migrations
+from mlm.db import models
 from tests.unit import test
 
 
 class APITestCase(test.TestCase):
-    pass
+    def setUp(self):
+        super(APITestCase, self).setUp()
+        self.api = api.API.__new__(api.API)
+        self.api._db_api = mock.MagicMock()
+
+    def _set_meetings(self, *meetings):
+        self.api._db_api.get_meetings.return_value = [
+            models.Event(type="meeting",
+                         datetime=dt.datetime(1970, 1, 5 + weekday, h, m))
+            for weekday, h, m in meetings]
+
+    @mock.patch("mlm.api.dt")
+    def test_get_next_meeting(self, mock_dt):
+        mock_dt.timedelta = dt.timedelta
+        self._set_meetings((0, 10, 0), (2, 10, 0))
+        # Monday
+        mock_dt.datetime.utcnow.return_value = dt.datetime(2016, 5, 2, 9, 0)
+
+        meeting, date = self.api.get_next_meeting()
+
+        self.assertEqual(0, meeting.datetime.weekday())
+        self.assertEqual(dt.datetime(2016, 5, 2, 10, 0), date)
+
+        mock_dt.datetime.utcnow.return_value = dt.datetime(2016, 5, 2, 11, 0)
+
+        meeting, date = self.api.get_next_meeting()
+
+        self.assertEqual(2, meeting.datetime.weekday())
+        self.assertEqual(dt.datetime(2016, 5, 4, 10, 0), date)
+
+    @mock.patch("mlm.api.dt")
+    def test_get_next_meeting_next_week(self, mock_dt):
+        mock_dt.timedelta = dt.timedelta
+        self._set_meetings((0, 10, 0))
+        mock_dt.datetime.utcnow.return_value = dt.datetime(2016, 5, 2, 11, 0)
+
+        meeting, date = self.api.get_next_meeting()
+
+        self.assertEqual(dt.datetime(2016, 5, 9, 10, 0), date)
+
+    def test_save_election_publishes_event(self):
+        self.api._publisher = mock.Mock()
+        self.api._db_api.save_election.return_value = mock.Mock(id=42)
+        meeting = mock.Mock()
+
+        election = self.api.save_election(meeting, dt.datetime(2016, 5, 2),
+                                          7)
+
+        self.assertEqual(42, election.id)
+        self.api._publisher.publish.assert_called_once_with(
+            "election_created", id=42, datetime="2016-05-02T00:00:00",
+            member_id=7)
+
+    def test_get_leaderboard(self):
+        db_api = self.api._db_api
+        db_api.get_leaderboard_version.return_value = (None, 2, 0)
+        db_api.get_top_members.return_value = [
+            mock.Mock(id=1, leader_score=0), mock.Mock(id=2, leader_score=0)]
+
+        board = self.api.get_leaderboard()
+        self.assertIs(board, self.api.get_leaderboard())
+        db_api.get_top_members.assert_called_once_with()
+
+        # changed by another process
+        db_api.get_top_members.return_value = [
+            mock.Mock(id=1, leader_score=0), mock.Mock(id=2, leader_score=1)]
+        db_api.get_leaderboard_version.return_value = (42, 2, 0)
+        board = self.api.get_leaderboard()
+        self.assertEqual(1, board.get_max_score())
+        self.assertEqual(2, db_api.get_top_members.call_count)
+
+    @mock.patch("mlm.api.sys.stderr")
+    def test_check_schema(self, mock_stderr):
+        self.api._db_api.get_schema_version.return_value = (
+            migrations.LATEST_VERSION)
+        self.api._check_schema()
+        self.assertFalse(mock_stderr.write.called)
+
+        self.api._db_api.get_schema_version.return_value = 0
+        self.api._check_schema()
+        self.assertIn("mlm db upgrade", mock_stderr.write.call_args[0][0])
+
+    def test_import_members(self):
+        self.api._publisher = mock.Mock()
+        self.api._db_api.import_members.side_effect = (
+            lambda rows, batch_size: (len(list(rows)), [(4, "conflict")]))
+        records = [(1, {"name": "John", "email": "john@example.com"}),
+                   (2, {"name": " ", "email": "x@example.com"}),
+                   (3, {"name": "Jane", "contacts": {"phone": "123"}}),
+                   (4, {"name": "Bob", "contacts": {"email": "b@x.com"}})]
+
+        inserted, failed = self.api.import_members(records, batch_size=10)
+
+        self.assertEqual(2, inserted)
+        self.assertEqual([2, 3, 4], [key for key, _ in failed])
+        self.api._publisher.publish.assert_called_once_with(
+            "members_changed")
+
+    @mock.patch("mlm.api.dt")
+    def test_schedule_is_rebuilt_on_changes(self, mock_dt):
+        mock_dt.datetime.utcnow.return_value = dt.datetime(2016, 5, 2, 9, 0)
+        self._set_meetings((0, 10, 0))
+        self.api._db_api.get_meetings_version.return_value = (1, 1)
+
+        self.api.get_next_meeting()
+        self.api.get_next_meeting()
+        self.assertEqual(1, self.api._db_api.get_meetings.call_count)
+
+        self._set_meetings((0, 8, 0), (0, 9, 30))
+        self.api._db_api.get_meetings_version.return_value = (2, 2)
+        meeting, date = self.api.get_next_meeting()
+        self.assertEqual(dt.datetime(2016, 5, 2, 9, 30), date)
+
+    def test_add_meeting(self):
+        self.api._publisher = mock.Mock()
+        self.api.add_meeting(1, "10:30")
+        self.api._db_api.add_meeting.assert_called_once_with(
+            dt.datetime(1970, 1, 6, 10, 30))
+
+        self.api._db_api.add_meeting.reset_mock()
+        # 2016-05-02 is Monday, the 3rd Tuesday of May is 2016-05-17
+        self.api.add_meeting(1, "10:30", freq="monthly", setpos=3,
+                             start=dt.date(2016, 5, 2))
+        self.api._db_api.add_meeting.assert_called_once_with(
+            dt.datetime(2016, 5, 17, 10, 30),
+            {"freq": "monthly", "interval": 1, "setpos": 3})
+        self.api._publisher.publish.assert_called_with("meetings_changed")
+
+    def test_skip_meeting(self):
+        self.api._publisher = mock.Mock()
+        meeting = models.Event(type="meeting",
+                               datetime=dt.datetime(2016, 5, 3, 10, 0),
+                               extrafield={"recurrence": {"freq": "weekly",
+                                                          "interval": 2}})
+        self.api._db_api.get_meeting.return_value = meeting
+
+        self.assertRaises(ValueError, self.api.skip_meeting, 1,
+                          dt.date(2016, 5, 10))
+        self.api.skip_meeting(1, dt.date(2016, 5, 17))
+
+        self.api._db_api.update_meeting.assert_called_once_with(
+            1, {"recurrence": {"freq": "weekly", "interval": 2,
+                               "exdates": ["2016-05-17"]}})
+        self.api._publisher.publish.assert_called_once_with(
+            "meetings_changed")
+
+    @mock.patch("mlm.api.dt")
+    def test_get_next_meeting_with_rules(self, mock_dt):
+        mock_dt.datetime.utcnow.return_value = dt.datetime(2016, 5, 2, 9, 0)
+        self.api._db_api.get_meetings.return_value = [
+            models.Event(type="meeting",
+                         datetime=dt.datetime(1970, 1, 9, 10, 0)),
+            models.Event(type="meeting",
+                         datetime=dt.datetime(2016, 4, 26, 10, 0),
+                         extrafield={"recurrence": {
+                             "freq": "weekly", "interval": 2,
+                             "exdates": ["2016-05-10"]}})]
+
+        meeting, date = self.api.get_next_meeting()
+        self.assertEqual(dt.datetime(2016, 5, 6, 10, 0), date)
+
+        mock_dt.datetime.utcnow.return_value = dt.datetime(2016, 5, 7)
+        meeting, date = self.api.get_next_meeting()
+        self.assertEqual(dt.datetime(2016, 5, 13, 10, 0), date)
+
+        mock_dt.datetime.utcnow.return_value = dt.datetime(2016, 5, 20, 11, 0)
+        meeting, date = self.api.get_next_meeting()
+        self.assertEqual(dt.datetime(2016, 5, 24, 10, 0), date)
@@ -14,6 +14,7 @@
 
 import os
 import re
+import tempfile
 
 import mlm
 from mlm import config
@@ -61,3 +62,29 @@ class ConfigSampleTestCase(test.TestCase):
         self.assertEqual(sample, conf,
                          msg="Sample config file is ourdated. You need execute"
                              " `tox -egenconfig` to update it.")
+
+
+class ConfigTestCase(test.TestCase):
+    def test_options_are_decoded_by_type(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".ini") as f:
+            f.write("[app]\nport = 8080\n"
+                    "[mail_notification]\nenabled = False\n")
+            f.flush()
+            conf = config.Config(f.name)
+
+            self.assertEqual(8080, conf.app.port)
+            self.assertIs(False, conf.mail_notification.enabled)
+            self.assertEqual("WAL", conf.db.journal_mode)
+
+    def test_invalid_option(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".ini") as f:
+            f.write("[db]\njournal_mode = WAL; DROP TABLE member\n"
+                    "synchronous = normal\n")
+            f.flush()
+            conf = config.Config(f.name)
+
+            self.assertEqual("normal", conf.db.synchronous)
+            with self.assertRaises(ValueError) as ctx:
+                conf.db.journal_mode
+            self.assertIn("'journal_mode' option in 'db' section",
+                          str(ctx.exception))
@@ -0,0 +1,71 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import random
+
+from mlm import leaderboard
+from tests.unit import test
+
+
+Member = collections.namedtuple("Member", ["id", "name", "leader_score"])
+
+
+def _members(*scores):
+    return [Member(i, "m%s" % i, score) for i, score in enumerate(scores)]
+
+
+class LeaderboardTestCase(test.TestCase):
+    def test_empty(self):
+        board = leaderboard.Leaderboard()
+
+        self.assertEqual(0, len(board))
+        self.assertIsNone(board.get_max_score())
+        self.assertIsNone(board.get_rank(1))
+        self.assertEqual([], list(board.top()))
+
+    def test_top(self):
+        board = leaderboard.Leaderboard(_members(1, 3, 0, 3))
+
+        self.assertEqual([(1, 1, "m1", 3), (1, 3, "m3", 3), (3, 0, "m0", 1),
+                          (4, 2, "m2", 0)], list(board.top()))
+        self.assertEqual([1, 3], [e.id for e in board.top(2)])
+        self.assertEqual(3, board.get_max_score())
+
+    def test_update(self):
+        board = leaderboard.Leaderboard(_members(1, 3, 0))
+
+        board.increment(0, 3)
+        self.assertEqual((1, 0, "m0", 4), board.get_rank(0))
+        self.assertEqual(2, board.get_rank(1).rank)
+        board.remove(0)
+        self.assertEqual(3, board.get_max_score())
+        self.assertEqual(1, board.get_rank(1).rank)
+        self.assertNotIn(0, board)
+        self.assertRaises(ValueError, board.add, 1, "m1", 0)
+
+    def test_rank_matches_sorting(self):
+        rnd = random.Random(42)
+        members = _members(*[rnd.randint(0, 20) for _ in range(100)])
+        board = leaderboard.Leaderboard(members)
+        for member in rnd.sample(members, 30):
+            board.increment(member.id, rnd.randint(1, 5))
+
+        entries = list(board.top())
+        scores = [e.leader_score for e in entries]
+        self.assertEqual(sorted(scores, reverse=True), scores)
+        for entry in entries:
+            self.assertEqual(entry, board.get_rank(entry.id))
+            self.assertEqual(1 + sum(s > entry.leader_score for s in scores),
+                             entry.rank)
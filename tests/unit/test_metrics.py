@@ -0,0 +1,160 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from mlm import metrics
+from tests.unit import test
+
+
+class RegistryTestCase(test.TestCase):
+    def setUp(self):
+        super(RegistryTestCase, self).setUp()
+        self.registry = metrics.Registry()
+
+    def test_format_text(self):
+        requests = self.registry.counter("requests_total", "Requests.",
+                                         ["path"])
+        requests.labels("/").inc()
+        requests.labels("/").inc(2)
+        requests.labels('"x"').inc()
+        self.registry.gauge("depth", "Queue depth.").set(3)
+        latency = self.registry.histogram("latency_seconds", "Latency.",
+                                          buckets=[0.1, 1])
+        for value in (0.05, 0.5, 0.7, 5):
+            latency.observe(value)
+
+        self.assertEqual(
+            "# HELP depth Queue depth.\n"
+            "# TYPE depth gauge\n"
+            "depth 3\n"
+            "# HELP latency_seconds Latency.\n"
+            "# TYPE latency_seconds histogram\n"
+            'latency_seconds_bucket{le="0.1"} 1\n'
+            'latency_seconds_bucket{le="1"} 3\n'
+            'latency_seconds_bucket{le="+Inf"} 4\n'
+            "latency_seconds_sum 6.25\n"
+            "latency_seconds_count 4\n"
+            "# HELP requests_total Requests.\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{path="\\"x\\""} 1\n'
+            'requests_total{path="/"} 3\n',
+            metrics.format_text(self.registry.snapshot()))
+
+    def test_register(self):
+        counter = self.registry.counter("foo", "Foo.", ["a"])
+        self.assertIs(counter, self.registry.counter("foo", "Foo.", ["a"]))
+        self.assertRaises(ValueError, self.registry.gauge, "foo", "Foo.")
+        self.assertRaises(ValueError, counter.labels, "x", "y")
+
+    def test_reset(self):
+        counter = self.registry.counter("foo", "Foo.")
+        value = counter.labels()
+        value.inc()
+        self.registry.reset()
+        # values are reset in place, so references to them stay valid
+        value.inc()
+        self.assertEqual([[[], 1]], counter.dump())
+
+    def test_merge(self):
+        first = metrics.Registry()
+        first.counter("foo", "Foo.", ["a"]).labels("x").inc()
+        first.histogram("bar", "Bar.", buckets=[1]).observe(0.5)
+        first.gauge("baz", "Baz.").set(2)
+        second = metrics.Registry()
+        second.counter("foo", "Foo.", ["a"]).labels("x").inc(2)
+        second.counter("foo", "Foo.", ["a"]).labels("y").inc()
+        second.histogram("bar", "Bar.", buckets=[1]).observe(2)
+
+        merged = metrics.merge([first.snapshot(), second.snapshot()])
+
+        self.assertEqual([[["x"], 3], [["y"], 1]],
+                         sorted(merged["foo"]["samples"]))
+        self.assertEqual([[[], [1, 1, 2.5]]], merged["bar"]["samples"])
+        self.assertEqual([[[], 2]], merged["baz"]["samples"])
+        self.assertNotIn("baz", metrics.merge([first.snapshot()],
+                                              gauges=False))
+
+
+class ExporterTestCase(test.TestCase):
+    def setUp(self):
+        super(ExporterTestCase, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.registry = metrics.Registry()
+        self.counter = self.registry.counter("foo", "Foo.")
+        self.gauge = self.registry.gauge("depth", "Depth.")
+
+    def _write_snapshot(self, name, pid, foo, depth):
+        registry = metrics.Registry()
+        registry.counter("foo", "Foo.").inc(foo)
+        registry.gauge("depth", "Depth.").set(depth)
+        with open(os.path.join(self.path, "%s-%s.json" % (name, pid)),
+                  "w") as f:
+            json.dump({"pid": pid, "metrics": registry.snapshot()}, f)
+
+    def _get_dead_pid(self):
+        process = subprocess.Popen([sys.executable, "-c", ""])
+        process.wait()
+        return process.pid
+
+    def test_collect(self):
+        self.counter.inc(5)
+        exporter = metrics.Exporter(self.path, "web", interval=60,
+                                    registry=self.registry).start()
+        self.addCleanup(exporter.stop)
+        # values inherited from the parent process are dropped
+        self.assertEqual([[[], 0]], self.counter.dump())
+        self.counter.inc()
+        self.gauge.set(1)
+
+        # the parent process is alive
+        self._write_snapshot("tasks", os.getppid(), foo=10, depth=2)
+        self._write_snapshot("web", self._get_dead_pid(), foo=100, depth=4)
+        self._write_snapshot("web", self._get_dead_pid(), foo=1000, depth=8)
+
+        for _ in range(2):
+            collected = exporter.collect()
+            self.assertEqual([[[], 1111]], collected["foo"]["samples"])
+            # gauges of dead processes are dropped
+            self.assertEqual([[[], 3]], collected["depth"]["samples"])
+
+        # the current process is merged from its saved snapshot and
+        # snapshots of dead processes are archived
+        self.assertEqual(
+            sorted(["archive.json", ".lock", os.path.basename(
+                exporter.filename), "tasks-%s.json" % os.getppid()]),
+            sorted(os.listdir(self.path)))
+        with open(exporter.filename) as f:
+            self.assertEqual([[[], 1]],
+                             json.load(f)["metrics"]["foo"]["samples"])
+
+    def test_save(self):
+        exporter = metrics.Exporter(self.path, "tasks", interval=0.01,
+                                    registry=self.registry).start()
+        self.counter.inc(7)
+        exporter.stop()
+
+        with open(exporter.filename) as f:
+            data = json.load(f)
+        self.assertEqual(os.getpid(), data["pid"])
+        self.assertEqual([[[], 7]], data["metrics"]["foo"]["samples"])
+
+        metrics.remove_snapshots(self.path)
+        self.assertEqual([], os.listdir(self.path))
@@ -0,0 +1,115 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime as dt
+import gzip
+import io
+import os
+import shutil
+import tempfile
+
+from mlm import records
+from tests.unit import test
+
+
+class RecordsTestCase(test.TestCase):
+    def test_detect_format(self):
+        self.assertEqual("csv", records.detect_format("members.CSV"))
+        self.assertEqual("jsonl", records.detect_format("members.jsonl"))
+        self.assertEqual("csv", records.detect_format("-", "csv"))
+        self.assertRaises(ValueError, records.detect_format, "members.txt")
+        self.assertRaises(ValueError, records.detect_format, "-", "xml")
+
+    def test_read_csv(self):
+        errors = []
+        f = io.StringIO(u"name,email\nJohn, john@example.com \n"
+                        u"Jane,\nBob,bob@example.com,extra\n")
+
+        result = list(records.read_records(f, "csv", errors))
+
+        self.assertEqual([(2, {"name": "John", "email": "john@example.com"}),
+                          (3, {"name": "Jane"})], result)
+        self.assertEqual([4], [line for line, _ in errors])
+
+    def test_read_jsonl(self):
+        errors = []
+        f = io.StringIO(u'{"name": "John"}\n\n{"name": \n[1]\n'
+                        u'{"name": "Jane", "contacts": {"email": "j@x"}}\n')
+
+        result = list(records.read_records(f, "jsonl", errors))
+
+        self.assertEqual([(1, {"name": "John"}),
+                          (5, {"name": "Jane",
+                               "contacts": {"email": "j@x"}})], result)
+        self.assertEqual([3, 4], [line for line, _ in errors])
+
+    def test_write_records(self):
+        rows = [(1, dt.datetime(2016, 5, 2, 10, 0), {"email": "j@x"}, True)]
+        fields = ["id", "datetime", "contacts", "active"]
+
+        f = io.StringIO()
+        self.assertEqual(1, records.write_records(f, "csv", fields,
+                                                  iter(rows)))
+        self.assertEqual(u'id,datetime,contacts,active\r\n'
+                         u'1,2016-05-02T10:00:00,"{""email"": ""j@x""}",'
+                         u'True\r\n', f.getvalue())
+
+        f = io.StringIO()
+        records.write_records(f, "jsonl", fields, iter(rows))
+        self.assertEqual(u'{"id": 1, "datetime": "2016-05-02T10:00:00", '
+                         u'"contacts": {"email": "j@x"}, "active": true}\n',
+                         f.getvalue())
+
+    def test_write_file(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, "members")
+        rows = [(u"Jos\xe9", {"email": u"jos\xe9@x"})]
+
+        for fmt, expected in (
+                ("csv", b'name,contacts\r\nJos\xc3\xa9,'
+                        b'"{""email"": ""jos\\u00e9@x""}"\r\n'),
+                ("jsonl", b'{"name": "Jos\\u00e9", '
+                          b'"contacts": {"email": "jos\\u00e9@x"}}\n')):
+            with records.open_output(path) as f:
+                records.write_records(f, fmt, ["name", "contacts"], rows)
+            with open(path, "rb") as f:
+                self.assertEqual(expected, f.read())
+
+    def test_read_file(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, "members.csv")
+        with open(path, "wb") as f:
+            f.write(b'name,email\r\nJos\xc3\xa9,"jos\xc3\xa9@x"\r\n')
+
+        with records.open_input(path) as f:
+            self.assertEqual(
+                [(2, {"name": u"Jos\xe9", "email": u"jos\xe9@x"})],
+                list(records.read_records(f, "csv", [])))
+
+    def test_compressed_file(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, "members.jsonl.gz")
+        self.assertEqual("jsonl", records.detect_format(path))
+
+        with records.open_output(path, compress=True) as f:
+            records.write_records(f, "jsonl", ["name"], [("John",)])
+
+        with gzip.open(path, "rb") as f:
+            self.assertEqual(b'{"name": "John"}\n', f.read())
+        with records.open_input(path) as f:
+            self.assertEqual([(1, {"name": "John"})],
+                             list(records.read_records(f, "jsonl", [])))
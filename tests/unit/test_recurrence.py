@@ -0,0 +1,99 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime as dt
+import itertools
+
+from mlm.db import models
+from mlm import recurrence
+from tests.unit import test
+
+
+def _take(rule, after, count=4):
+    return list(itertools.islice(rule.iter_after(after), count))
+
+
+class RecurrenceTestCase(test.TestCase):
+    def test_weekly(self):
+        rule = recurrence.Recurrence(dt.datetime(2016, 5, 3, 10, 0),
+                                     interval=2)
+        self.assertEqual(
+            [dt.datetime(2016, 5, 3, 10, 0), dt.datetime(2016, 5, 17, 10, 0)],
+            _take(rule, dt.datetime(2000, 1, 1), 2))
+        # the meeting which is starting right now is not the next one
+        self.assertEqual(
+            [dt.datetime(2016, 5, 31, 10, 0), dt.datetime(2016, 6, 14, 10, 0)],
+            _take(rule, dt.datetime(2016, 5, 17, 10, 0), 2))
+
+    def test_monthly(self):
+        # the 2nd Tuesday
+        rule = recurrence.Recurrence(dt.datetime(2016, 5, 10, 10, 0),
+                                     freq="monthly")
+        self.assertEqual(2, rule.setpos)
+        self.assertEqual([dt.date(2016, 6, 14), dt.date(2016, 7, 12),
+                          dt.date(2016, 8, 9), dt.date(2016, 9, 13)],
+                         [d.date() for d in _take(
+                             rule, dt.datetime(2016, 5, 10, 11, 0))])
+
+        # the last Tuesday of every 3rd month
+        rule = recurrence.Recurrence(dt.datetime(2016, 5, 31, 10, 0),
+                                     freq="monthly", interval=3)
+        self.assertEqual(-1, rule.setpos)
+        self.assertEqual([dt.date(2016, 8, 30), dt.date(2016, 11, 29),
+                          dt.date(2017, 2, 28)],
+                         [d.date() for d in _take(
+                             rule, dt.datetime(2016, 6, 1), 3)])
+
+    def test_until_and_exdates(self):
+        rule = recurrence.Recurrence(dt.datetime(2016, 5, 2, 10, 0),
+                                     until="2016-05-23",
+                                     exdates=["2016-05-16"])
+        self.assertEqual([dt.date(2016, 5, 2), dt.date(2016, 5, 9),
+                          dt.date(2016, 5, 23)],
+                         [d.date() for d in _take(
+                             rule, dt.datetime(2016, 5, 1), 10)])
+        self.assertTrue(rule.occurs_on(dt.date(2016, 5, 16)))
+        self.assertFalse(rule.occurs_on(dt.date(2016, 5, 17)))
+        self.assertFalse(rule.occurs_on(dt.date(2016, 5, 30)))
+
+    def test_serialization(self):
+        event = models.Event(
+            type="meeting", datetime=dt.datetime(2016, 5, 31, 10, 0),
+            extrafield={"recurrence": {"freq": "monthly", "interval": 1,
+                                       "setpos": -1, "until": "2017-01-01",
+                                       "exdates": ["2016-07-26"]}})
+        self.assertTrue(recurrence.has_rule(event))
+        rule = recurrence.Recurrence.from_event(event)
+
+        self.assertEqual(event.extrafield["recurrence"], rule.to_dict())
+        self.assertEqual("monthly, last Tuesday until 2017-01-01 "
+                         "(1 skipped)", rule.describe())
+
+        event.extrafield = None
+        self.assertFalse(recurrence.has_rule(event))
+        self.assertEqual("weekly",
+                         recurrence.Recurrence.from_event(event).describe())
+
+    def test_validation(self):
+        start = dt.datetime(2016, 5, 2)
+        self.assertRaises(ValueError, recurrence.Recurrence, start,
+                          freq="daily")
+        self.assertRaises(ValueError, recurrence.Recurrence, start,
+                          interval=0)
+        self.assertRaises(ValueError, recurrence.Recurrence, start,
+                          freq="monthly", setpos=5)
+        self.assertRaises(ValueError, recurrence.Recurrence, start,
+                          setpos=1)
+        self.assertRaises(ValueError, recurrence.Recurrence, start,
+                          until="tomorrow")
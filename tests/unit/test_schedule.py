@@ -0,0 +1,128 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime as dt
+import random
+
+from mlm.db import models
+from mlm import schedule
+from tests.unit import test
+
+
+def _meeting(weekday, hour, minute):
+    return models.Event(type="meeting",
+                        datetime=dt.datetime(1970, 1, 5 + weekday, hour,
+                                             minute))
+
+
+class ScheduleIndexTestCase(test.TestCase):
+    def test_next_after(self):
+        index = schedule.ScheduleIndex([_meeting(2, 10, 0),
+                                        _meeting(0, 10, 0)])
+        # Monday
+        now = dt.datetime(2016, 5, 2, 9, 0)
+
+        meeting, date = index.next_after(now)
+        self.assertEqual(0, meeting.datetime.weekday())
+        self.assertEqual(dt.datetime(2016, 5, 2, 10, 0), date)
+
+        # the meeting which is starting right now is not the next one
+        meeting, date = index.next_after(dt.datetime(2016, 5, 2, 10, 0))
+        self.assertEqual(dt.datetime(2016, 5, 4, 10, 0), date)
+
+        meeting, date = index.next_after(dt.datetime(2016, 5, 6, 12, 30))
+        self.assertEqual(0, meeting.datetime.weekday())
+        self.assertEqual(dt.datetime(2016, 5, 9, 10, 0), date)
+
+    def test_empty(self):
+        index = schedule.ScheduleIndex()
+        self.assertEqual(0, len(index))
+        self.assertRaises(ValueError, index.next_after,
+                          dt.datetime(2016, 5, 2))
+
+    def test_matches_brute_force(self):
+        rnd = random.Random(42)
+        slots = rnd.sample(range(7 * 24 * 60), 20)
+        meetings = [_meeting(s // 1440, s // 60 % 24, s % 60) for s in slots]
+        index = schedule.ScheduleIndex(meetings)
+
+        for _ in range(500):
+            now = dt.datetime(2016, 5, 2) + dt.timedelta(
+                seconds=rnd.randrange(14 * 24 * 3600),
+                microseconds=rnd.choice([0, rnd.randrange(10 ** 6)]))
+            week_start = dt.datetime(2016, 5, 2) + dt.timedelta(
+                days=(now - dt.datetime(2016, 5, 2)).days // 7 * 7)
+            expected = min(
+                (week_start + schedule.get_week_offset(m.datetime) +
+                 schedule.WEEK * k, i)
+                for i, m in enumerate(meetings) for k in (0, 1)
+                if week_start + schedule.get_week_offset(m.datetime) +
+                schedule.WEEK * k > now)
+
+            meeting, date = index.next_after(now)
+            self.assertEqual(expected[0], date)
+            self.assertIs(meetings[expected[1]], meeting)
+
+
+class ScheduleTestCase(test.TestCase):
+    def _rule(self, date, **rule):
+        return models.Event(type="meeting", datetime=date,
+                            extrafield={"recurrence": rule})
+
+    def test_next_after(self):
+        weekly = _meeting(4, 10, 0)
+        biweekly = self._rule(dt.datetime(2016, 5, 3, 10, 0),
+                              freq="weekly", interval=2)
+        monthly = self._rule(dt.datetime(2016, 5, 31, 9, 0),
+                             freq="monthly", interval=1, setpos=-1)
+        index = schedule.Schedule([weekly, biweekly, monthly],
+                                  horizon=dt.timedelta(days=20))
+        self.assertEqual(3, len(index))
+
+        dates = []
+        now = dt.datetime(2016, 5, 2)
+        for _ in range(12):
+            meeting, now = index.next_after(now)
+            dates.append((meeting, now))
+
+        self.assertEqual(
+            [(biweekly, dt.datetime(2016, 5, 3, 10, 0)),
+             (weekly, dt.datetime(2016, 5, 6, 10, 0)),
+             (weekly, dt.datetime(2016, 5, 13, 10, 0)),
+             (biweekly, dt.datetime(2016, 5, 17, 10, 0)),
+             (weekly, dt.datetime(2016, 5, 20, 10, 0)),
+             (weekly, dt.datetime(2016, 5, 27, 10, 0)),
+             (monthly, dt.datetime(2016, 5, 31, 9, 0)),
+             (biweekly, dt.datetime(2016, 5, 31, 10, 0)),
+             (weekly, dt.datetime(2016, 6, 3, 10, 0)),
+             (weekly, dt.datetime(2016, 6, 10, 10, 0)),
+             (biweekly, dt.datetime(2016, 6, 14, 10, 0)),
+             (weekly, dt.datetime(2016, 6, 17, 10, 0))], dates)
+        # the cache does not grow beyond the horizon
+        self.assertLessEqual(len(index._dates), 4)
+
+        # moving back in time restarts generation
+        self.assertEqual((biweekly, dt.datetime(2016, 5, 17, 10, 0)),
+                         index.next_after(dt.datetime(2016, 5, 16)))
+
+    def test_no_upcoming_meetings(self):
+        index = schedule.Schedule([self._rule(
+            dt.datetime(2016, 5, 3, 10, 0), freq="weekly", interval=1,
+            until="2016-05-10")])
+        self.assertEqual(dt.datetime(2016, 5, 10, 10, 0),
+                         index.next_after(dt.datetime(2016, 5, 4))[1])
+        self.assertRaises(ValueError, index.next_after,
+                          dt.datetime(2016, 5, 10, 10, 0))
+        self.assertRaises(ValueError, schedule.Schedule().next_after,
+                          dt.datetime(2016, 5, 4))
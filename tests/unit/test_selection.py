@@ -0,0 +1,101 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import random
+
+from mlm.db import models
+from mlm import selection
+from tests.unit import test
+
+
+def linear_choice(members, previous_leader_id, rnd):
+    """The reference implementation of the election."""
+    members = [m for m in members if m.id != previous_leader_id]
+    choices = []
+    max_score = max(m.leader_score for m in members) + 1
+    for m in members:
+        choices.append((m, (max_score - m.leader_score) * 10))
+    total = sum(w for c, w in choices)
+    r = rnd.uniform(0, total)
+    upto = 0
+    for c, w in choices:
+        if upto + w >= r:
+            return c
+        upto += w
+
+
+class FenwickTreeTestCase(test.TestCase):
+    def test_prefix(self):
+        values = [3, 0, 7, 1, 5, 2, 9, 4, 6]
+        tree = selection.FenwickTree()
+        for value in values:
+            tree.append(value)
+
+        tree.add(4, 10)
+        values[4] += 10
+
+        self.assertEqual(len(values), len(tree))
+        for i in range(len(values) + 1):
+            self.assertEqual(sum(values[:i]), tree.prefix(i))
+
+
+class LeaderSelectorTestCase(test.TestCase):
+    def _make_members(self, scores):
+        return [models.Member(id=i, name="member-%s" % i, leader_score=s)
+                for i, s in enumerate(scores, 1)]
+
+    def test_choose_is_the_same_as_linear_scan(self):
+        rnd = random.Random(42)
+        for _ in range(50):
+            members = self._make_members(
+                [rnd.randint(0, 10) for _ in range(rnd.randint(2, 40))])
+            selector = selection.LeaderSelector(members)
+
+            previous_leader_id = None
+            for seed in range(30):
+                expected = linear_choice(members, previous_leader_id,
+                                         random.Random(seed))
+                chosen = selector.choose(
+                    exclude=previous_leader_id,
+                    uniform=random.Random(seed).uniform)
+                self.assertIs(expected, chosen)
+
+                selector.increment(chosen.id)
+                chosen.leader_score += 1
+                previous_leader_id = chosen.id
+
+    def test_choose_with_zero_random_value(self):
+        members = self._make_members([0, 1, 2])
+        selector = selection.LeaderSelector(members)
+
+        self.assertIs(members[1],
+                      selector.choose(exclude=1, uniform=lambda a, b: 0.0))
+
+    def test_remove(self):
+        members = self._make_members([0, 5, 1])
+        selector = selection.LeaderSelector(members)
+        selector.remove(1)
+
+        self.assertNotIn(1, selector)
+        self.assertEqual(5, selector.get_max_score())
+        self.assertEqual(1, selector.get_max_score(exclude=2))
+        for seed in range(20):
+            self.assertIn(
+                selector.choose(uniform=random.Random(seed).uniform),
+                members[1:])
+
+    def test_choose_without_members(self):
+        selector = selection.LeaderSelector(self._make_members([3]))
+
+        self.assertRaises(ValueError, selector.choose, exclude=1)
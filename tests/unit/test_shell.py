@@ -0,0 +1,45 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from mlm import shell
+from tests.unit import test
+
+
+class ShellTestCase(test.TestCase):
+    def test_find_group(self):
+        modules = ["app", "members"]
+        self.assertEqual("members",
+                         shell._find_group(["members", "list"], modules))
+        self.assertEqual("app", shell._find_group(
+            ["--config-file", "members", "app", "start"], modules))
+        self.assertIsNone(shell._find_group(["--help"], modules))
+        self.assertIsNone(shell._find_group(["foo", "bar"], modules))
+
+    @mock.patch("mlm.api.API")
+    def test_main_loads_only_requested_group(self, mock_api):
+        with mock.patch.object(shell, "_load_groups",
+                               wraps=shell._load_groups) as load_groups:
+            mock_api.return_value.get_members.return_value = []
+            shell.main(["--config-file", "foo.ini", "members", "list"])
+
+        load_groups.assert_called_once_with(["members"])
+        mock_api.assert_called_once_with("foo.ini")
+        mock_api.return_value.get_members.assert_called_once_with()
+
+    @mock.patch("mlm.api.API")
+    def test_help_does_not_create_api(self, mock_api):
+        self.assertRaises(SystemExit, shell.main, ["--help"])
+        self.assertFalse(mock_api.called)
@@ -0,0 +1,88 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import numpy as np
+
+from mlm.db import models
+from mlm import selection
+from mlm import simulation
+from tests.unit import test
+
+
+class PolicyTestCase(test.TestCase):
+    def test_score_policy_is_the_same_as_selector(self):
+        scores = [0, 3, 1, 2, 0]
+        selector = selection.LeaderSelector(
+            [models.Member(id=i, name="member-%s" % i, leader_score=s)
+             for i, s in enumerate(scores)])
+        for previous in range(len(scores)):
+            eligible = np.ones((1, len(scores)), dtype=bool)
+            eligible[0, previous] = False
+            weights = simulation.ScorePolicy().get_weights(
+                np.array([scores]), eligible)
+            cumulative = np.where(eligible, weights, 0).cumsum()
+
+            for r in range(1, int(cumulative[-1]) + 1):
+                member = selector.choose(exclude=previous,
+                                         uniform=lambda a, b: r)
+                # simulate() chooses the first member whose cumulative
+                # weight is above the threshold
+                self.assertEqual(member.id, (cumulative <= r - 0.5).sum())
+
+    def test_least_elected(self):
+        weights = simulation.LeastElectedPolicy().get_weights(
+            np.array([[2, 1, 1, 3]]), np.array([[True, False, True, True]]))
+        # weights of not eligible members are ignored by simulate()
+        self.assertEqual([[0, 1, 1, 0]], weights.tolist())
+
+    def test_parse_policy(self):
+        policy = simulation.parse_policy("score:power=2,repeats")
+        self.assertIsInstance(policy, simulation.ScorePolicy)
+        self.assertEqual(2, policy.power)
+        self.assertTrue(policy.allow_repeats)
+        self.assertFalse(simulation.parse_policy("uniform").allow_repeats)
+
+        for spec in ("random", "uniform:power=2", "score:power=high"):
+            self.assertRaises(ValueError, simulation.parse_policy, spec)
+
+
+class SimulateTestCase(test.TestCase):
+    def test_simulate(self):
+        result = simulation.simulate(simulation.ScorePolicy(), members=4,
+                                     elections=100, trials=50, seed=1)
+        self.assertEqual(0, result.repeat_rate)
+        self.assertGreater(result.score_spread, 0)
+        self.assertGreaterEqual(result.max_gap, result.longest_gap)
+
+        same = simulation.simulate(simulation.ScorePolicy(), members=4,
+                                   elections=100, trials=50, seed=1)
+        self.assertEqual(result.score_variance, same.score_variance)
+
+    def test_least_elected_is_round_robin(self):
+        result = simulation.simulate(simulation.LeastElectedPolicy(),
+                                     members=5, elections=100, trials=20,
+                                     scores=[0, 0, 0, 0, 3], seed=1)
+        # the member with score 3 waits until others catch up, then
+        # members are elected in rounds
+        self.assertGreaterEqual(result.longest_gap, 12)
+        self.assertLessEqual(result.max_gap, 16)
+        self.assertEqual(1, result.score_spread)
+
+    def test_repeats(self):
+        result = simulation.simulate(simulation.UniformPolicy(True),
+                                     members=2, elections=1000, trials=10,
+                                     seed=1)
+        self.assertAlmostEqual(0.5, result.repeat_rate, delta=0.05)
+        self.assertRaises(ValueError, simulation.simulate,
+                          simulation.UniformPolicy(), 1, 10)